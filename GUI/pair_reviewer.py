@@ -1,21 +1,74 @@
 import tkinter as tk
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.ticker as tick
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from PIL import Image, ImageTk
 from Utils.retrieve_files import resource_path
+from graph_plotter import Graph_Template
 
 class GraphItem:
-    """Hold a (figure, label, included?) triple."""
-    def __init__(self, fig, label):
-        self.fig = fig
+    """Hold a (figure factory, label, included?) triple.
+    fig_factory is called to plot the figure only when PairReviewer is about to show it,
+    a ready made figure may also be given instead.
+    source is an optional (Measurement_Plane, channel signal type, scan point index)
+    of the graph, used for the live average preview.
+    graph is the optional graph object plotted by the factory, when every item has one
+    PairReviewer reuses two figures and only swaps their line data on each page."""
+    def __init__(self, fig_factory, label, source=None, graph=None):
+        if callable(fig_factory):
+            self.fig_factory = fig_factory
+            self.fig = None
+        else:
+            self.fig_factory = None
+            self.fig = fig_factory
         self.label = label
         self.included = True
+        self.source = source
+        self.graph = graph
+
+    def get_fig(self):
+        """Return the figure, plotting it on first use."""
+        if self.fig is None:
+            self.fig = self.fig_factory()
+        return self.fig
+
+    def release_fig(self):
+        """Close the figure to free its memory, it is plotted again by get_fig when needed."""
+        if self.fig is not None and self.fig_factory is not None:
+            plt.close(self.fig)
+            self.fig = None
+
+def seed_detected_anomalies(items):
+    """Untick the items whose scan point is flagged by Measurement_Plane.get_flagged_points,
+    so that the reviewer only has to confirm them. Detection is run once per (plane, channel)
+    of the item sources, items without a source are left included. The anomalous points of the
+    planes are not changed, they are only set from the reviewer's choice in on_submit.
+    Returns the number of flagged items."""
+    flagged_points = {}
+    number_flagged = 0
+    for item in items:
+        if item.source is None:
+            continue
+        plane, key, point_index = item.source
+        if (id(plane), key) not in flagged_points:
+            flagged_points[(id(plane), key)] = set(plane.get_flagged_points(key))
+        if plane.scan_point_numbers[point_index] in flagged_points[(id(plane), key)]:
+            item.included = False
+            item.label = f"{item.label} (auto-flagged)"
+            number_flagged += 1
+    return number_flagged
 
 class PairReviewer(tk.Frame):
-    def __init__(self, master, items, on_submit):
+    def __init__(self, master, items, on_submit, seed_anomalies=True):
+        """With seed_anomalies the points flagged by seed_detected_anomalies start unticked."""
         super().__init__(master, bg="white")
         self.items = items
         self.on_submit = on_submit
+        self.number_flagged = seed_detected_anomalies(self.items) if seed_anomalies else 0
         self.page = 0  # 0, 2, 4, …
+        self._prefetch_job = None
         left_arrow = Image.open(resource_path("Left_Arrow.png"))
         left_arrow_resized = left_arrow.resize((75, 75), Image.LANCZOS)  
         self.left_arrow_img = ImageTk.PhotoImage(left_arrow_resized)   
@@ -44,10 +97,19 @@ class PairReviewer(tk.Frame):
         # Graph canvases placeholder, grid row 1
         self.canvas = [None, None]
 
+        # Graph templates of the persistent canvases, see _update_slot
+        self.template = [None, None]
+
+        # With a graph on every item the two canvases are kept for all pages and only their data is updated
+        self.persistent = all(item.graph is not None for item in self.items)
+
         # Make columns expand evenly
         self.content_frame.grid_columnconfigure(0, weight=1)
         self.content_frame.grid_columnconfigure(1, weight=1)
 
+        # Live average preview of the items that have a source, updated on every toggle
+        self._build_preview()
+
         # Navigation and submit buttons frame
         nav = tk.Frame(self, bg="white")
         nav.pack(fill="x", pady=8)
@@ -77,20 +139,119 @@ class PairReviewer(tk.Frame):
         self.bind_all("<Return>", lambda e: self._submit())  
         self.bind_all("<space>", lambda e: self._submit())   
 
+        # Close the figures still open when the reviewer is destroyed
+        self.bind("<Destroy>", lambda e: self._close_figures() if e.widget is self else None)
 
         self._draw()
 
+    def _build_preview(self):
+        # One preview line per (plane, channel) of the items, each a running average on the plane
+        self.preview_lines = {}
+        self.preview_canvas = None
+
+        sources = [item.source for item in self.items if item.source is not None]
+        if not sources:
+            return
+
+        fig = Figure(figsize=(8, 2.5))
+        ax = fig.add_subplot()
+        tick_locations = [100, 200, 500, 1000, 2000, 5000, 10000]
+
+        for plane, key, _ in sources:
+            if (id(plane), key) in self.preview_lines:
+                continue
+            excluded = [item.source[2] for item in self.items
+                        if item.source is not None and item.source[0] is plane and item.source[1] == key and not item.included]
+            y_data = plane.start_running_average(key, np.array(excluded, dtype=int))
+            if y_data is None:
+                y_data = np.full(len(plane.frequencies), np.nan)
+            line, = ax.plot(plane.frequencies, y_data, label=f"{plane.scan_name[:-4]} {key}")
+            self.preview_lines[(id(plane), key)] = line
+
+        ax.set_xscale("log", base=2)
+        ax.xaxis.set_major_locator(tick.FixedLocator(tick_locations))
+        ax.xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
+        ax.set_xlim([sources[0][0].frequencies[0], 10000])
+        ax.set_title("Live Average Preview", fontsize=10)
+        ax.grid(which="major", color="dimgrey", linewidth=0.5)
+        if len(self.preview_lines) <= 8:
+            ax.legend(loc="best", fontsize=8)
+        fig.tight_layout()
+
+        self.preview_ax = ax
+        self.preview_canvas = FigureCanvasTkAgg(fig, master=self)
+        self.preview_canvas.draw()
+        self.preview_canvas.get_tk_widget().pack(fill="x")
+
+    def _update_preview(self, item):
+        # Add or remove one scan point from the running average of its plane, O(bins)
+        if item.source is None or self.preview_canvas is None:
+            return
+        plane, key, point_index = item.source
+        y_data = plane.set_point_included(key, point_index, item.included)
+        line = self.preview_lines[(id(plane), key)]
+        line.set_ydata(y_data if y_data is not None else np.full(len(plane.frequencies), np.nan))
+        self.preview_ax.relim()
+        self.preview_ax.autoscale_view(scalex=False)
+        self.preview_canvas.draw_idle()
+
     def _toggle(self, which):
         idx = self.page + which
         if idx < len(self.items):
             self.items[idx].included = self.chk_var[which].get()
+            self._update_preview(self.items[idx])
+
+    def _prefetch(self):
+        # Plot the figures of the next page while the app is idle so that the next click is quick
+        self._prefetch_job = None
+        next_page = self.page + 2 if self.page + 2 < len(self.items) else 0
+        for idx in range(next_page, min(next_page + 2, len(self.items))):
+            self.items[idx].get_fig()
+
+    def _release_figures(self, keep=()):
+        # Close the figures of items that are neither shown nor prefetched
+        for idx, item in enumerate(self.items):
+            if idx not in keep:
+                item.release_fig()
+
+    def _close_figures(self):
+        self._release_figures()
+        if self.persistent:
+            for c in self.canvas:
+                if c:
+                    plt.close(c.figure)
+
+    def _update_slot(self, slot, item):
+        # Show item on the canvas of this slot, creating the canvas only on first use
+        if self.canvas[slot] is None:
+            # Plot the first item of the slot with the usual styling, its figure is then kept for every page
+            # as a Graph_Template, drawn by the Tk canvas so zooming and the cursor keep working
+            fig = item.fig_factory() if item.fig_factory is not None else item.fig
+            self.template[slot] = Graph_Template(item.graph, figure=fig)
+            can = FigureCanvasTkAgg(fig, master=self.content_frame)
+            can.draw()
+            self.canvas[slot] = can
+            return can
+
+        # Swap the line data, title, labels and limits instead of building a new figure
+        self.template[slot].show(item.graph)
+        return self.canvas[slot]
 
     def _draw(self):
-        # Clear old canvases and hide checkboxes
+        # Stop prefetching for the previous page
+        if self._prefetch_job is not None:
+            self.after_cancel(self._prefetch_job)
+            self._prefetch_job = None
+
+        # Hide the persistent canvases, or clear old canvases, and hide checkboxes
         for c in self.canvas:
             if c:
-                c.get_tk_widget().destroy()
-        self.canvas = [None, None]
+                if self.persistent:
+                    c.get_tk_widget().grid_remove()
+                else:
+                    c.get_tk_widget().destroy()
+        if not self.persistent:
+            self.canvas = [None, None]
 
         for chk in self.chk:
             chk.grid_remove()
@@ -119,10 +280,13 @@ class PairReviewer(tk.Frame):
                 self.chk_var[i].set(item.included)
                 self.chk[i].config(text=item.label, state="normal")
                 # Graph widget in row 0
-                can = FigureCanvasTkAgg(item.fig, master=self.content_frame)
-                can.draw()
+                if self.persistent:
+                    can = self._update_slot(i, item)
+                else:
+                    can = FigureCanvasTkAgg(item.get_fig(), master=self.content_frame)
+                    can.draw()
+                    self.canvas[i] = can
                 can.get_tk_widget().grid(row=0, column=col, sticky="nsew")
-                self.canvas[i] = can
                 # Checkbox in row 1, centered under graph
                 self.chk[i].grid(row=1, column=col, pady=(10,0))
 
@@ -132,7 +296,14 @@ class PairReviewer(tk.Frame):
         # Page numbers
         total_pages = (len(self.items) + 1) // 2
         current_page = self.page // 2 + 1
-        self.page_label.config(text=f"Page {current_page} / {total_pages}")
+        flagged_text = f"  ({self.number_flagged} auto-flagged)" if self.number_flagged else ""
+        self.page_label.config(text=f"Page {current_page} / {total_pages}{flagged_text}")
+
+        # Keep only the figures of this page and the next page
+        if not self.persistent:
+            next_page = self.page + 2 if self.page + 2 < len(self.items) else 0
+            self._release_figures(keep={self.page, self.page + 1, next_page, next_page + 1})
+            self._prefetch_job = self.after_idle(self._prefetch)
 
     def prev(self):
         if self.page >= 2:
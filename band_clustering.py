@@ -0,0 +1,249 @@
+import numpy as np
+
+
+#clustering methods supported by get_cluster_labels
+CLUSTERING_METHODS = ("kmeans", "agglomerative", "spatial")
+
+#agglomerative clustering of more points than this first groups them into this many small k-means clusters,
+#so that the merging stays fast for thousands of points
+MAX_MICRO_CLUSTERS = 200
+
+#number of nearest neighbours in position that count as touching for spatially constrained clustering
+SPATIAL_NEIGHBOURS = 6
+
+#get_principal_scores computes the components exactly when the data has at most this many rows or columns,
+#larger data uses a randomized range finder for the few components that are kept
+MAX_EXACT_COMPONENTS_SIZE = 500
+
+#extra random directions and power iterations of the randomized range finder, enough for the leading components to be exact to rounding
+COMPONENTS_OVERSAMPLING = 10
+COMPONENTS_POWER_ITERATIONS = 2
+
+
+def get_squared_distances(points, centres):
+
+    '''Return the (points x centres) array of squared euclidean distances'''
+
+    distances = (points ** 2).sum(axis = 1)[:, None] - 2 * points @ centres.T + (centres ** 2).sum(axis = 1)[None, :]
+
+    #rounding can give tiny negative values
+    return np.maximum(distances, 0)
+
+
+def get_group_sums(labels, values, number_of_groups):
+
+    '''Return the (groups x columns) sums of the rows of values with the same label, one bincount per column'''
+
+    return np.column_stack([np.bincount(labels, weights = column, minlength = number_of_groups) for column in values.T])
+
+
+def get_principal_scores(data, number_of_components, seed = 0):
+
+    '''Return the (rows x number_of_components) projections of the centred rows of data onto its main principal components. 
+    Small data is decomposed exactly through the smaller of its two Gram matrices. 
+    Otherwise the components are found with a randomized range finder, which only multiplies data by thin matrices, 
+    so thousands of rows with thousands of columns take well under a second'''
+
+    number_of_rows, number_of_columns = data.shape
+    number_of_components = min(number_of_components, number_of_rows, number_of_columns)
+
+    if min(number_of_rows, number_of_columns) <= MAX_EXACT_COMPONENTS_SIZE:
+
+        #the eigenvectors of data @ data.T are the scores scaled to unit length, those of data.T @ data are the components
+        if number_of_rows <= number_of_columns:
+            eigenvalues, eigenvectors = np.linalg.eigh(data @ data.T)
+            return eigenvectors[:, ::-1][:, :number_of_components] * np.sqrt(np.maximum(eigenvalues[::-1][:number_of_components], 0))
+
+        eigenvalues, eigenvectors = np.linalg.eigh(data.T @ data)
+        return data @ eigenvectors[:, ::-1][:, :number_of_components]
+
+    rng = np.random.default_rng(seed)
+
+    #orthonormal basis of the directions data stretches the most, sharpened by power iterations
+    basis = np.linalg.qr(data @ rng.standard_normal((number_of_columns, number_of_components + COMPONENTS_OVERSAMPLING)))[0]
+
+    for _ in range(COMPONENTS_POWER_ITERATIONS):
+        basis = np.linalg.qr(data.T @ basis)[0]
+        basis = np.linalg.qr(data @ basis)[0]
+
+    #the singular value decomposition of the small projected matrix gives the leading components of data
+    left_vectors, singular_values, _ = np.linalg.svd(basis.T @ data, full_matrices = False)
+
+    return (basis @ left_vectors[:, :number_of_components]) * singular_values[:number_of_components]
+
+
+def kmeans(features, number_of_clusters, max_iterations = 100, seed = 0):
+
+    '''Return (labels, centroids) of k-means clustering of the rows of features, started with k-means++.
+    A fixed seed gives the same clusters every run. Labels are consecutive from 0'''
+
+    rng = np.random.default_rng(seed)
+    number_of_points = len(features)
+    number_of_clusters = min(number_of_clusters, number_of_points)
+
+    #k-means++ start, each new centre is picked with probability proportional to its squared distance from the closest centre
+    centroids = np.empty((number_of_clusters, features.shape[1]))
+    centroids[0] = features[rng.integers(number_of_points)]
+    closest = ((features - centroids[0]) ** 2).sum(axis = 1)
+
+    for index in range(1, number_of_clusters):
+
+        total = closest.sum()
+        chosen = rng.choice(number_of_points, p = closest / total) if total > 0 else rng.integers(number_of_points)
+
+        centroids[index] = features[chosen]
+        closest = np.minimum(closest, ((features - centroids[index]) ** 2).sum(axis = 1))
+
+    for _ in range(max_iterations):
+
+        labels = get_squared_distances(features, centroids).argmin(axis = 1)
+
+        #mean of the points of each cluster in one grouped reduction, empty clusters keep their centre
+        sums = get_group_sums(labels, features, number_of_clusters)
+        counts = np.bincount(labels, minlength = number_of_clusters)
+
+        new_centroids = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+
+        if np.allclose(new_centroids, centroids):
+            break
+
+        centroids = new_centroids
+
+    #drop empty clusters
+    used, labels = np.unique(labels, return_inverse = True)
+
+    return labels, centroids[used]
+
+
+def ward_merge(centroids, sizes, number_of_clusters, connectivity = None):
+
+    '''Merge clusters given by their centroids and sizes with Ward linkage until number_of_clusters are left.
+    connectivity is an optional (clusters x clusters) boolean array of the pairs that may be merged,
+    if it does not allow any more merges, more than number_of_clusters are returned.
+    Returns the label of the merged cluster of each input cluster, consecutive from 0'''
+
+    centroids = np.array(centroids, dtype = float)
+    sizes = np.array(sizes, dtype = float)
+    number_of_inputs = len(centroids)
+
+    if connectivity is None:
+        connectivity = np.ones((number_of_inputs, number_of_inputs), dtype = bool)
+
+    connectivity = np.array(connectivity, dtype = bool)
+    np.fill_diagonal(connectivity, False)
+
+    #increase in within cluster variance caused by merging each pair, only kept for pairs that may be merged
+    costs = sizes[:, None] * sizes[None, :] / (sizes[:, None] + sizes[None, :]) * get_squared_distances(centroids, centroids)
+    costs[~connectivity] = np.inf
+
+    labels = np.arange(number_of_inputs)
+    number_left = number_of_inputs
+
+    while number_left > number_of_clusters:
+
+        first, second = divmod(int(np.argmin(costs)), number_of_inputs)
+
+        if not np.isfinite(costs[first, second]):
+            break
+
+        #merge the second cluster into the first
+        centroids[first] = (sizes[first] * centroids[first] + sizes[second] * centroids[second]) / (sizes[first] + sizes[second])
+        sizes[first] += sizes[second]
+        labels[labels == second] = first
+
+        connectivity[first] |= connectivity[second]
+        connectivity[:, first] = connectivity[first]
+        connectivity[first, first] = False
+        connectivity[second] = False
+        connectivity[:, second] = False
+
+        #only the costs of the merged cluster change
+        row = sizes[first] * sizes / (sizes[first] + sizes) * ((centroids - centroids[first]) ** 2).sum(axis = 1)
+        row[~connectivity[first]] = np.inf
+
+        costs[first] = row
+        costs[:, first] = row
+        costs[second] = np.inf
+        costs[:, second] = np.inf
+
+        number_left -= 1
+
+    return np.unique(labels, return_inverse = True)[1]
+
+
+def get_neighbour_pairs(positions, number_of_neighbours = SPATIAL_NEIGHBOURS, chunk_size = 1024):
+
+    '''Return (first, second) arrays of point indices, pairing each point with its nearest neighbours in position.
+    Distances are computed in chunks of points so that memory stays small for many points'''
+
+    number_of_neighbours = min(number_of_neighbours, len(positions) - 1)
+
+    if number_of_neighbours < 1:
+        return np.array([], dtype = int), np.array([], dtype = int)
+
+    first, second = [], []
+
+    for start in range(0, len(positions), chunk_size):
+
+        distances = get_squared_distances(positions[start:start + chunk_size], positions)
+
+        #exclude each point itself
+        distances[np.arange(len(distances)), np.arange(start, start + len(distances))] = np.inf
+
+        neighbours = np.argpartition(distances, number_of_neighbours - 1, axis = 1)[:, :number_of_neighbours]
+
+        first.append(np.repeat(np.arange(start, start + len(distances)), number_of_neighbours))
+        second.append(neighbours.ravel())
+
+    return np.concatenate(first), np.concatenate(second)
+
+
+def get_cluster_labels(features, positions, number_of_clusters, method = "kmeans"):
+
+    '''Return a label from 0 for each row of features.
+    "kmeans" clusters the features directly, "agglomerative" merges clusters with Ward linkage,
+    "spatial" is Ward linkage that only merges clusters whose points are neighbours in positions,
+    so that every cluster is one connected area'''
+
+    if method not in CLUSTERING_METHODS:
+        raise ValueError(f"Unknown clustering method {method}, choose one of {', '.join(CLUSTERING_METHODS)}")
+
+    number_of_points = len(features)
+
+    if method == "kmeans":
+        return kmeans(features, number_of_clusters)[0]
+
+    if method == "agglomerative":
+
+        #start from small clusters of similar points, or from single points for small scans
+        if number_of_points > MAX_MICRO_CLUSTERS:
+            micro_labels, micro_centroids = kmeans(features, MAX_MICRO_CLUSTERS, max_iterations = 20)
+
+        else:
+            micro_labels, micro_centroids = np.arange(number_of_points), features
+
+        sizes = np.bincount(micro_labels, minlength = len(micro_centroids))
+
+        return ward_merge(micro_centroids, sizes, number_of_clusters)[micro_labels]
+
+    #spatial: small clusters are made from position only, so that each one is a single area
+    if number_of_points > MAX_MICRO_CLUSTERS:
+        micro_labels = kmeans(positions, MAX_MICRO_CLUSTERS, max_iterations = 20)[0]
+
+    else:
+        micro_labels = np.arange(number_of_points)
+
+    number_of_micro_clusters = micro_labels.max() + 1
+
+    #centroids of the small clusters in feature space and in position
+    sizes = np.bincount(micro_labels, minlength = number_of_micro_clusters)
+    micro_centroids = get_group_sums(micro_labels, features, number_of_micro_clusters) / sizes[:, None]
+    micro_positions = get_group_sums(micro_labels, positions, number_of_micro_clusters) / sizes[:, None]
+
+    #small clusters are areas split by position, neighbouring areas have neighbouring centres
+    first, second = get_neighbour_pairs(micro_positions)
+    connectivity = np.zeros((number_of_micro_clusters, number_of_micro_clusters), dtype = bool)
+    connectivity[first, second] = True
+    connectivity |= connectivity.T
+
+    return ward_merge(micro_centroids, sizes, number_of_clusters, connectivity)[micro_labels]
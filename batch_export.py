@@ -0,0 +1,282 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+#no windows are opened in batch mode, use the non-interactive backend before any module imports pyplot
+import matplotlib
+matplotlib.use("Agg")
+
+from device import Device, get_surface_type, get_device_name
+from scan_point_graph import AVERAGING_MODES, AGGREGATIONS, OCTAVE_REDUCTIONS
+from graph_renderer import RENDER_FORMATS
+
+
+#columns of the summary report, in order
+REPORT_COLUMNS = ["device", "folder", "status", "seconds", "number_of_files", "output", "error"]
+
+
+def find_devices(root_folder):
+
+    '''Walk root_folder and group the .uff files of each folder into devices, using the same surface names as Device.
+    Returns a dictionary mapping (folder, device name) to the list of filepaths of the device,
+    as well as a list of .uff filepaths that are not a recognised surface'''
+
+    devices = {}
+    skipped_filepaths = []
+
+    for folder, subfolders, filenames in os.walk(root_folder):
+
+        #walk in a fixed order so that the report is the same every run
+        subfolders.sort()
+
+        for filename in sorted(filenames):
+
+            if not filename.lower().endswith(".uff"):
+                continue
+
+            filepath = os.path.join(folder, filename)
+
+            if get_surface_type(filename) is None:
+                skipped_filepaths.append(filepath)
+                continue
+
+            devices.setdefault((folder, get_device_name(filename)), []).append(filepath)
+
+    return devices, skipped_filepaths
+
+
+def load_anomalous_points(filepath):
+
+    '''Read saved anomalous points from a JSON file.
+    Keys are scan filenames, or paths relative to the batch folder when the same filename is used in several folders.
+    Values are a list of point numbers for every channel signal type, or a dictionary of channel signal type to list of point numbers, e.g.
+    {"D11 Left.uff": [3, 7], "build_2/D11 Top.uff": {"vib_db": [2], "vibref1_db": [2, 5]}}'''
+
+    with open(filepath, "r", encoding="utf-8") as anomalies_file:
+        saved_points = json.load(anomalies_file)
+
+    #use forward slashes so that keys written on any platform match
+    return {key.replace("\\", "/"): value for key, value in saved_points.items()}
+
+
+def get_device_anomalous_points(root_folder, filepaths, saved_points):
+
+    '''Return the saved anomalous points of one device keyed by scan filename, as used by Device.export.
+    An entry for the path relative to root_folder is used before an entry for the filename only'''
+
+    device_points = {}
+
+    for filepath in filepaths:
+
+        relative_path = os.path.relpath(filepath, root_folder).replace("\\", "/")
+        filename = os.path.basename(filepath)
+
+        if relative_path in saved_points:
+            device_points[filename] = saved_points[relative_path]
+
+        elif filename in saved_points:
+            device_points[filename] = saved_points[filename]
+
+    return device_points
+
+
+def export_device(device_name, folder, filepaths, filename_hxml, anomalous_points, averaging_mode = "log", aggregation = "mean", octave_fraction = None, octave_reduction = "smooth",
+                  plot_formats = None):
+
+    '''Load one device and write its HXML export without any Tk windows.
+    If plot_formats are given, a plot of every exported graph is also rendered to a folder named after the HXML file.
+    Kept at module level so that it can run in a worker process.
+    Returns a row of the summary report, errors are caught and reported instead of stopping the batch'''
+
+    start_time = time.perf_counter()
+
+    result = {"device": device_name, "folder": folder, "number_of_files": len(filepaths), "output": filename_hxml, "error": ""}
+
+    try:
+
+        #Device keeps a single plane per surface type, so two files of the same surface would silently replace each other
+        surface_types = [get_surface_type(os.path.basename(filepath)) for filepath in filepaths]
+        duplicates = sorted({surface_type for surface_type in surface_types if surface_types.count(surface_type) > 1})
+
+        if duplicates:
+            raise ValueError(f"More than one file for surface {', '.join(duplicates)}")
+
+        #devices already run in parallel, so load the surfaces of each device one after another
+        device = Device(filepaths, max_workers = 1)
+
+        os.makedirs(os.path.dirname(filename_hxml) or ".", exist_ok = True)
+
+        device.export(filename_hxml = filename_hxml, anomalous_points = anomalous_points, averaging_mode = averaging_mode, aggregation = aggregation,
+                      octave_fraction = octave_fraction, octave_reduction = octave_reduction)
+
+        #devices already run in parallel, so render the plots of each device one after another
+        if plot_formats:
+            device.render_plots(f"{os.path.splitext(filename_hxml)[0]} plots", plot_formats, max_workers = 1)
+
+        result["status"] = "ok"
+
+    except Exception as e:
+
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+        #full traceback for the console, the report only keeps the last line
+        traceback.print_exc()
+
+    result["seconds"] = round(time.perf_counter() - start_time, 2)
+
+    return result
+
+
+def batch_export(root_folder, output_folder = None, anomalies_filepath = None, max_workers = None, progress_callback = None, averaging_mode = "log", aggregation = "mean",
+                 octave_fraction = None, octave_reduction = "smooth", plot_formats = None):
+
+    '''Export every device found under root_folder to its own HXML file named after the device.
+    Files are written to output_folder with the same subfolders as root_folder, or next to the scan files if output_folder is None.
+    Devices are exported in parallel by up to max_workers processes, by default one per CPU.
+    progress_callback(result) is called as each device finishes.
+    averaging_mode and aggregation are one of scan_point_graph.AVERAGING_MODES and AGGREGATIONS, used for every device.
+    octave_fraction and octave_reduction reduce every curve to fractional-octave bands, see scan_point_graph.Graph_octave.
+    plot_formats, e.g. ["png"], also render a plot of every exported graph, see graph_renderer.
+    Returns (list of report rows in the order the devices were found, list of skipped .uff filepaths)'''
+
+    devices, skipped_filepaths = find_devices(root_folder)
+
+    saved_points = load_anomalous_points(anomalies_filepath) if anomalies_filepath is not None else {}
+
+    #arguments for export_device, one tuple per device
+    jobs = []
+
+    for (folder, device_name), filepaths in devices.items():
+
+        #scan files without anything before the surface name are named after their folder
+        output_name = device_name or os.path.basename(os.path.abspath(folder))
+
+        if output_folder is None:
+            filename_hxml = os.path.join(folder, f"{output_name}.hxml")
+
+        else:
+            filename_hxml = os.path.join(output_folder, os.path.relpath(folder, root_folder), f"{output_name}.hxml")
+
+        jobs.append((output_name, folder, filepaths, os.path.normpath(filename_hxml), get_device_anomalous_points(root_folder, filepaths, saved_points), averaging_mode, aggregation,
+                     octave_fraction, octave_reduction, plot_formats))
+
+    results = [None] * len(jobs)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    #export in this process when there is nothing to run in parallel
+    if max_workers <= 1 or len(jobs) <= 1:
+
+        for index, job in enumerate(jobs):
+
+            results[index] = export_device(*job)
+
+            if progress_callback is not None:
+                progress_callback(results[index])
+
+    else:
+
+        with ProcessPoolExecutor(max_workers = min(max_workers, len(jobs))) as executor:
+
+            futures = {executor.submit(export_device, *job): index for index, job in enumerate(jobs)}
+
+            for future in as_completed(futures):
+
+                index = futures[future]
+
+                try:
+                    results[index] = future.result()
+
+                #the worker process itself died, e.g. ran out of memory
+                except Exception as e:
+                    device_name, folder, filepaths, filename_hxml = jobs[index][:4]
+                    results[index] = {"device": device_name, "folder": folder, "status": "failed", "seconds": "", "number_of_files": len(filepaths), "output": filename_hxml, "error": f"{type(e).__name__}: {e}"}
+
+                if progress_callback is not None:
+                    progress_callback(results[index])
+
+    return results, skipped_filepaths
+
+
+def write_report(results, report_filepath):
+
+    '''Write the summary report rows to a CSV file'''
+
+    with open(report_filepath, "w", newline = "", encoding = "utf-8") as report_file:
+
+        writer = csv.DictWriter(report_file, fieldnames = REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def print_summary(results, skipped_filepaths, total_seconds):
+
+    '''Print a summary of timing and failures of a batch export'''
+
+    failed = [result for result in results if result["status"] != "ok"]
+
+    print()
+    print(f"Exported {len(results) - len(failed)} of {len(results)} devices in {total_seconds:.1f} s")
+
+    for result in results:
+        print(f"  {result['status']:<6} {str(result['seconds']):>8} s  {result['device']}  ({result['folder']})")
+
+    if failed:
+        print()
+        print("Failures:")
+
+        for result in failed:
+            print(f"  {result['device']} ({result['folder']}): {result['error']}")
+
+    if skipped_filepaths:
+        print()
+        print("Skipped .uff files with no recognised surface name:")
+
+        for filepath in skipped_filepaths:
+            print(f"  {filepath}")
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = "Export every device in a folder of .uff scan files to HXML without any windows")
+    parser.add_argument("folder", help = "folder to search for .uff files, including subfolders")
+    parser.add_argument("-o", "--output", default = None, help = "folder to write the HXML files to, by default next to the scan files")
+    parser.add_argument("-a", "--anomalies", default = None, help = "JSON file of saved anomalous points, see load_anomalous_points")
+    parser.add_argument("-j", "--workers", type = int, default = None, help = "number of devices to export at the same time, by default one per CPU")
+    parser.add_argument("-r", "--report", default = None, help = "CSV file to write the summary report to")
+    parser.add_argument("-m", "--averaging", choices = AVERAGING_MODES, default = "log", help = "how surface averages are computed, log averages the dB values, linear the magnitudes and power the squared magnitudes (RMS)")
+    parser.add_argument("-s", "--aggregation", choices = AGGREGATIONS, default = "mean", help = "how scan points are combined in surface averages, median and trimmed limit the effect of bad points, weighted weights points by coherence")
+    parser.add_argument("--octave", type = int, default = None, help = "reduce every curve to 1/N-octave bands, e.g. 3 or 12, by default the full resolution is exported")
+    parser.add_argument("-p", "--plots", nargs = "+", choices = RENDER_FORMATS, default = None, help = "also render a plot of every exported graph in these formats, to a folder next to each HXML file")
+    parser.add_argument("--octave-reduction", choices = OCTAVE_REDUCTIONS, default = "smooth", help = "smooth averages the power in a fractional-octave window around each bin, energy sums the power in each band")
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+
+    results, skipped_filepaths = batch_export(args.folder, args.output, args.anomalies, args.workers,
+                                              progress_callback = lambda result: print(f"{result['status']}: {result['device']} ({result['folder']})"),
+                                              averaging_mode = args.averaging, aggregation = args.aggregation,
+                                              octave_fraction = args.octave, octave_reduction = args.octave_reduction, plot_formats = args.plots)
+
+    print_summary(results, skipped_filepaths, time.perf_counter() - start_time)
+
+    if args.report is not None:
+        write_report(results, args.report)
+
+    #non-zero exit code when any device failed so that build scripts can detect it
+    return 1 if any(result["status"] != "ok" for result in results) else 0
+
+
+if __name__ == "__main__":
+    # devices are exported in worker processes, which import this module again on windows
+    multiprocessing.freeze_support()
+
+    sys.exit(main())
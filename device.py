@@ -7,119 +7,118 @@ import glob
 import os
 import re
 from tkinter import filedialog, messagebox, Tk
-from measurement_plane import Measurement_Plane
-from scan_point_graph import Graph_average, Graph_average_all
+from measurement_plane import Measurement_Plane, load_measurement_planes, DEFAULT_LOAD_WORKERS
+from scan_point_graph import Graph_average, Graph_average_all, Graph_octave
 from surface_average_comparison import Compare_Surface_Average
 from hxml_writer import HXMLGenerator
+from graph_renderer import render_graphs
 import data_tools as dt
 
 
-class Device:
+#surface types in the order they are exported, also the order of self.all_surfaces in a Device
+SURFACE_TYPES = ["top", "top_upper", "top_lower", "left", "right", "ear_hook_top", "ear_hook_left", "ear_hook_right"]
 
-    def __init__(self, list_planes_filepaths):
-        
-        #attribute storing list of filepaths of planes
-        self.list_filepaths = list_planes_filepaths
 
-        #attribute storing list of filenames
-        self.list_filenames = [os.path.basename(filepath) for filepath  in self.list_filepaths]
+def get_surface_type(filename):
 
-        #attribute to store list of all the Measurement_Plane objects for the device in predefined order
-        self.all_surfaces = []
+    '''Return the surface type of a scan file from its filename, or None if the filename is not a recognised surface.
+    Filters from most complex names to simpler names to prevent falsely identifying ear_hook_top as top for example,
+    by checking for ear_hook_top first, if it does not get identified it can only be top upper/lower or top'''
 
-        #attribute to store list of surface types included in this device not in a particular order
-        self.surface_types = []
+    filename = filename.lower()
 
-        #initialise empty list for graphs
-        self.graph_list = []
+    if "ear_hook_top" in filename or "ear hook top" in filename:
+        return "ear_hook_top"
 
-        #intialise empty list for remarks
-        self.remarks_list = []
+    elif "ear_hook_left" in filename or "ear hook left" in filename:
+        return "ear_hook_left"
 
-        #iterate through all the measurement planes
-        #filters them and saves them as the respective attribute
-        #filter from most complex names to simpler names to prevent falsely identifying ear_hook_top as top for example
-        #by checking for ear_hook_top first, if it does not get identified it can only be top upper/lower or top
-        #assumes each filepath is a distinct surface of the same device
-        for index in range(len(self.list_filepaths)):
+    elif "ear_hook_right" in filename or "ear hook right" in filename:
+        return "ear_hook_right"
 
-            if "ear_hook_top" in self.list_filenames[index].lower() or "ear hook top" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.ear_hook_top = Measurement_Plane(self.list_filepaths[index])
+    elif "top_upper" in filename or "top upper" in filename:
+        return "top_upper"
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("ear_hook_top")
+    elif "top_lower" in filename or "top lower" in filename:
+        return "top_lower"
 
+    #note that this condition will only be possible if no variation of top upper was found in the filename
+    elif "top" in filename:
+        return "top"
 
-            elif "ear_hook_left" in self.list_filenames[index].lower() or "ear hook left" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.ear_hook_left = Measurement_Plane(self.list_filepaths[index])
+    elif "left" in filename:
+        return "left"
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("ear_hook_left")
+    elif "right" in filename:
+        return "right"
 
+    else:
+        return None
 
-            elif "ear_hook_right" in self.list_filenames[index].lower() or "ear hook right" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.ear_hook_right = Measurement_Plane(self.list_filepaths[index])
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("ear_hook_right")
-            
+def get_device_name(filename):
 
-            elif "top_upper" in self.list_filenames[index].lower() or "top upper" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.top_upper = Measurement_Plane(self.list_filepaths[index])
+    '''Return the device name from the filename of one of its scan files, e.g. "D11" for "D11 Top Upper.uff"'''
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("top_upper")
+    match_object = re.search("top|left|right|ear", filename.lower())
 
+    match_index = match_object.start()
 
-            elif "top_lower" in self.list_filenames[index].lower() or "top lower" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.top_lower = Measurement_Plane(self.list_filepaths[index])
+    #splice up to one less than the match part in order to remove the space or underscore before the match part as well
+    return str(filename)[:max(match_index-1, 0)]
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("top_lower")
 
+class Device:
 
-            #note that this condition will only be possible if no variation of top upper was found in the filename
-            elif "top" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.top = Measurement_Plane(self.list_filepaths[index])
+    def __init__(self, list_planes_filepaths, max_workers = DEFAULT_LOAD_WORKERS, progress_callback = None):
+        '''Surfaces are loaded in parallel by up to max_workers processes, see load_measurement_planes. 
+        progress_callback(number_loaded, number_of_files, filepath) is called after each surface is loaded'''
+        
+        #attribute storing list of filepaths of planes
+        self.list_filepaths = list_planes_filepaths
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("top")
+        #attribute storing list of filenames
+        self.list_filenames = [os.path.basename(filepath) for filepath  in self.list_filepaths]
 
-            
-            elif "left" in self.list_filenames[index].lower():
-                
-                #save attribute
-                self.left = Measurement_Plane(self.list_filepaths[index])
+        #attribute to store list of all the Measurement_Plane objects for the device in predefined order
+        self.all_surfaces = []
 
-                #append surface type to self.surface_types list
-                self.surface_types.append("left")
+        #attribute to store list of surface types included in this device not in a particular order
+        self.surface_types = []
 
-            
-            elif "right" in self.list_filenames[index].lower():
+        #initialise empty list for graphs
+        self.graph_list = []
+
+        #intialise empty list for remarks
+        self.remarks_list = []
+
+        #list of the graphs written by the last export, reduced to octave bands if the export was
+        self.exported_graphs = []
+
+        #list of filepaths of the recognised surfaces, in the same order as self.surface_types
+        surface_filepaths = []
+
+        #iterate through all the measurement planes and find the surface type of each one
+        #assumes each filepath is a distinct surface of the same device
+        for index in range(len(self.list_filepaths)):
+
+            surface_type = get_surface_type(self.list_filenames[index])
+
+            #skip files that are not a recognised surface
+            if surface_type is not None:
                 
-                #save attribute
-                self.right = Measurement_Plane(self.list_filepaths[index])
+                #save filepath to load later
+                surface_filepaths.append(self.list_filepaths[index])
 
                 #append surface type to self.surface_types list
-                self.surface_types.append("right")
-
+                self.surface_types.append(surface_type)
 
-            else:
 
-                pass
+        #load all the surfaces at once and save each one as the respective attribute
+        surface_planes = load_measurement_planes(surface_filepaths, max_workers = max_workers, progress_callback = progress_callback)
 
+        for surface_type, plane in zip(self.surface_types, surface_planes):
+            setattr(self, surface_type, plane)
 
 
         #append surface to self.all_surfaces list in correct order and based on what surfaces are provided
@@ -173,14 +172,8 @@ class Device:
         
          
 
-        #get device name from first scan file
-        match_object = re.search("top|left|right|ear", self.all_surfaces[0].scan_name.lower())
-
-        match_index = match_object.start()
-
-        #attribute for device name
-        #splice up to one less than the match part in order to remove the space or underscore before the match part as well
-        self.device_name = (str(self.all_surfaces[0].scan_name))[:match_index-1]
+        #attribute for device name, taken from first scan file
+        self.device_name = get_device_name(self.all_surfaces[0].scan_name)
 
         #attribute for ref1 device average, only computed when get_ref1_average method is called
         self.ref1_average = None
@@ -190,11 +183,12 @@ class Device:
 
 
 
-    def get_ref1_average(self):
+    def get_ref1_average(self, averaging_mode = "log"):
         '''Method to create ref1 device average based on all the planes provided. 
         Updates the attribute for ref1 average to a ref1 device average graph object, 
         and also returns the ref1 device average graph object. 
-        This averaging assumes no anomalous data for ref1 to save time'''
+        This averaging assumes no anomalous data for ref1 to save time. 
+        averaging_mode is one of scan_point_graph.AVERAGING_MODES'''
 
         #initialise empty list to store all ref1 surface averages
         average_list = []
@@ -207,14 +201,14 @@ class Device:
 
             #get ref1 average for the current plane
             #assume no anomalous data
-            plane_average = Graph_average(ref1_average_list, [])
+            plane_average = Graph_average(ref1_average_list, [], averaging_mode = averaging_mode)
 
             #add the ref1 average for the plane to the list of ref1 averages
             average_list.append(plane_average)
 
 
         #get a graph average object that is the average of ref1 for the whole device
-        ref1_device_average = Graph_average_all(average_list)
+        ref1_device_average = Graph_average_all(average_list, averaging_mode)
 
         #save device ref1 average graph object to attribute
         self.ref1_average = ref1_device_average
@@ -224,11 +218,12 @@ class Device:
     
 
     
-    def get_ref3_average(self):
+    def get_ref3_average(self, averaging_mode = "log"):
         '''Method to create ref3 device average based on all the planes provided. 
         Updates the attribute for ref3 average to a ref3 device average graph object, 
         and also returns the ref3 device average graph object. 
-        This averaging assumes no anomalous data for ref3 to save time'''
+        This averaging assumes no anomalous data for ref3 to save time. 
+        averaging_mode is one of scan_point_graph.AVERAGING_MODES'''
 
         #initialise empty list to store all ref3 surface averages
         average_list = []
@@ -241,14 +236,14 @@ class Device:
 
             #get ref3 average for the current plane
             #assume no anomalous data
-            plane_average = Graph_average(ref3_average_list, [])
+            plane_average = Graph_average(ref3_average_list, [], averaging_mode = averaging_mode)
 
             #add the ref3 average for the plane to the list of ref3 averages
             average_list.append(plane_average)
 
 
         #get a graph average object that is the average of ref3 for the whole device
-        ref3_device_average = Graph_average_all(average_list)
+        ref3_device_average = Graph_average_all(average_list, averaging_mode)
 
         #save device ref3 average graph object to attribute
         self.ref3_average = ref3_device_average
@@ -256,9 +251,9 @@ class Device:
         #return device ref3 average graph object
         return ref3_device_average
 
-    def calc_ref1_and_ref3(self):
+    def calc_ref1_and_ref3(self, averaging_mode = "log"):
         #create ref1 device average
-        ref1_average = self.get_ref1_average()
+        ref1_average = self.get_ref1_average(averaging_mode)
 
         #append ref1 device average to graphs list
         self.graph_list.append(ref1_average)
@@ -268,7 +263,7 @@ class Device:
 
 
         #create ref3 device average
-        ref3_average = self.get_ref3_average()
+        ref3_average = self.get_ref3_average(averaging_mode)
 
         #append ref3 device average to graphs list
         self.graph_list.append(ref3_average)
@@ -276,7 +271,26 @@ class Device:
         #append remarks for ref3 device average to remarks list
         self.remarks_list.append(ref3_average.remarks)
 
-    def export(self, is_GUI=False):
+    def get_saved_anomalous(self, surface, channel_signal_type, anomalous_points):
+
+        '''Return the saved anomalous point numbers of a surface for one channel signal type.
+        anomalous_points maps scan filenames to a list of point numbers for every channel signal type,
+        or to a dictionary of channel signal type to list of point numbers. 
+        Surfaces that are not in anomalous_points have no anomalous points.
+        Returns None if anomalous_points is None so that the user is asked instead'''
+
+        if anomalous_points is None:
+            return None
+
+        saved_points = anomalous_points.get(surface.scan_name, [])
+
+        if isinstance(saved_points, dict):
+            saved_points = saved_points.get(channel_signal_type, [])
+
+        return [int(point_no) for point_no in saved_points]
+
+
+    def export(self, is_GUI=False, filename_hxml=None, anomalous_points=None, averaging_mode="log", aggregation="mean", octave_fraction=None, octave_reduction="smooth"):
 
         '''
         Export into one HXML file with structure (each with anomalous points remarks):
@@ -307,17 +321,23 @@ class Device:
         21. VibRef3 (dB) surface average ear hook top
         22. VibRef3 (dB) surface average ear hook left
         23. VibRef3 (dB) surface average ear hook right
+
+        If filename_hxml is given the file is saved there without asking, so no Tk window is opened.
+        If anomalous_points is given the saved anomalous points are used instead of asking the user, see get_saved_anomalous
+        averaging_mode is one of scan_point_graph.AVERAGING_MODES, used for every average in the export
+        aggregation is one of scan_point_graph.AGGREGATIONS, used for the surface averages, "weighted" weights points by their coherence
+        If octave_fraction is given every curve is reduced to 1/octave_fraction-octave bands with octave_reduction, see scan_point_graph.Graph_octave
         '''
 
         if not is_GUI:
-            self.calc_ref1_and_ref3()
+            self.calc_ref1_and_ref3(averaging_mode)
 
             #create and add all the Vib Vel (dB) surface averages to graphs list and their respective remarks to remarks list
             #iterate through all the surfaces provided
             for surface in self.all_surfaces:
                 
                 #create vib (dB) surface average for the surface
-                surface_vib_average = surface.get_average("vib_db")
+                surface_vib_average = surface.get_average("vib_db", self.get_saved_anomalous(surface, "vib_db", anomalous_points), averaging_mode, aggregation)
 
                 #append vib (dB) surface average to graphs list
                 self.graph_list.append(surface_vib_average)
@@ -331,7 +351,7 @@ class Device:
             for surface in self.all_surfaces:
                 
                 #create vibref1 (dB) surface average for the surface
-                surface_vibref1_average = surface.get_average("vibref1_db")
+                surface_vibref1_average = surface.get_average("vibref1_db", self.get_saved_anomalous(surface, "vibref1_db", anomalous_points), averaging_mode, aggregation)
 
                 #append vibref1 (dB) surface average to graphs list
                 self.graph_list.append(surface_vibref1_average)
@@ -345,7 +365,7 @@ class Device:
             for surface in self.all_surfaces:
                 
                 #create vibref3 (dB) surface average for the surface
-                surface_vibref3_average = surface.get_average("vibref3_db")
+                surface_vibref3_average = surface.get_average("vibref3_db", self.get_saved_anomalous(surface, "vibref3_db", anomalous_points), averaging_mode, aggregation)
 
                 #append vibref3 (dB) surface average to graphs list
                 self.graph_list.append(surface_vibref3_average)
@@ -354,15 +374,23 @@ class Device:
                 self.remarks_list.append(surface_vibref3_average.remarks)
 
 
-        #use this to get the message box and file dialog to show as top windows later
-        window = Tk()
-        window.wm_attributes('-topmost', 1)
+        #save to the given filename without asking
+        if filename_hxml is not None:
+
+            user_filename = filename_hxml
+            valid_filename = True
 
-        #suppress the Tk window
-        window.withdraw()
+        else:
 
-        #loop until user chooses a filename
-        valid_filename = False
+            #use this to get the message box and file dialog to show as top windows later
+            window = Tk()
+            window.wm_attributes('-topmost', 1)
+
+            #suppress the Tk window
+            window.withdraw()
+
+            #loop until user chooses a filename
+            valid_filename = False
 
         while not valid_filename:
 
@@ -385,11 +413,29 @@ class Device:
                 valid_filename = False
 
 
+        graphs_list, remarks_list = self.graph_list, self.remarks_list
+
+        #reduce every curve to fractional-octave bands, noting the reduction in its remarks
+        if octave_fraction is not None:
+            graphs_list = [Graph_octave(graph, octave_fraction, octave_reduction) for graph in self.graph_list]
+            remarks_list = [remarks + graph.reduction_remark for remarks, graph in zip(self.remarks_list, graphs_list)]
+
+        self.exported_graphs = graphs_list
+
         #create the HXML file with the chosen filename and location
         hxml_object = HXMLGenerator(user_filename)
 
         #write the current graph object's data to the HXML file
-        hxml_object.graphs_to_hxml(self.graph_list, self.remarks_list)
+        hxml_object.graphs_to_hxml(graphs_list, remarks_list)
+
+
+    def render_plots(self, output_folder, formats=("png",), max_workers=None):
+
+        '''Render a plot of every graph of the last export to image files in output_folder, without any Tk windows, 
+        see graph_renderer.render_graphs. formats are any of graph_renderer.RENDER_FORMATS. 
+        Returns the list of filepaths written for each graph'''
+
+        return render_graphs(self.exported_graphs, output_folder, formats, max_workers=max_workers)
 
 
 
@@ -0,0 +1,154 @@
+import numpy as np
+
+
+#number of (source grid, target grid) pairs whose interpolation weights are kept, the oldest pair is dropped first
+WEIGHTS_CACHE_SIZE = 64
+
+#default resolution of log-spaced grids
+POINTS_PER_OCTAVE = 48
+
+#interpolation weights keyed by the bytes of the source and target grids
+_weights_cache = {}
+
+
+def get_grid_key(x_data):
+
+    '''Return a hashable key for a frequency grid, equal for grids with the same values'''
+
+    return np.ascontiguousarray(x_data, dtype = float).tobytes()
+
+
+def get_common_band(x_data_list):
+
+    '''Return (lowest, highest) frequency covered by every grid in x_data_list, ignoring frequencies of 0 Hz and below,
+    which have no log-frequency. Raises ValueError if the grids do not overlap'''
+
+    lowest = max(np.min(np.asarray(x_data)[np.asarray(x_data) > 0]) for x_data in x_data_list)
+    highest = min(np.max(x_data) for x_data in x_data_list)
+
+    if lowest > highest:
+        raise ValueError(f"The frequency grids do not overlap, the common band would be {lowest} to {highest}")
+
+    return float(lowest), float(highest)
+
+
+def get_log_grid(lowest, highest, points_per_octave = POINTS_PER_OCTAVE):
+
+    '''Return a grid from lowest to highest frequency with points_per_octave log-spaced points in every octave'''
+
+    number_of_points = max(int(np.ceil(np.log2(highest / lowest) * points_per_octave)) + 1, 2)
+
+    return np.geomspace(lowest, highest, number_of_points)
+
+
+def get_common_grid(x_data_list):
+
+    '''Return the grid that graphs with the grids in x_data_list are compared on:
+    the grid of the finest of them inside the common band, so that graph keeps its own values'''
+
+    lowest, highest = get_common_band(x_data_list)
+
+    inside_band = [np.asarray(x_data)[(np.asarray(x_data) >= lowest) & (np.asarray(x_data) <= highest)] for x_data in x_data_list]
+
+    return max(inside_band, key = len)
+
+
+def get_interpolation_weights(source_x, target_x):
+
+    '''Return (lower indices, upper weights, outside mask) for linear interpolation in log-frequency from source_x to target_x,
+    so that resampled y = y[lower] * (1 - weight) + y[lower + 1] * weight.
+    Targets outside the positive frequencies of source_x are marked in the outside mask.
+    Weights are computed once per pair of grids and cached'''
+
+    key = (get_grid_key(source_x), get_grid_key(target_x))
+
+    if key in _weights_cache:
+        return _weights_cache[key]
+
+    source_x = np.asarray(source_x, dtype = float)
+    target_x = np.asarray(target_x, dtype = float)
+
+    #the grid is ascending, so the positive frequencies are the end of it
+    first_positive = int(np.searchsorted(source_x, 0, side = "right"))
+    log_source = np.log(source_x[first_positive:])
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        log_target = np.log(target_x)
+
+    outside = ~((log_target >= log_source[0]) & (log_target <= log_source[-1]))
+
+    #index of the source point at or below each target, the last interval is used for the top end of the grid
+    lower = np.clip(np.searchsorted(log_source, log_target, side = "right") - 1, 0, max(len(log_source) - 2, 0))
+
+    if len(log_source) > 1:
+        weights = (log_target - log_source[lower]) / (log_source[lower + 1] - log_source[lower])
+    else:
+        weights = np.zeros(len(log_target))
+
+    weights[outside] = 0.0
+
+    weights_entry = (lower + first_positive, weights, outside)
+
+    #drop the oldest pair when the cache is full
+    if len(_weights_cache) >= WEIGHTS_CACHE_SIZE:
+        del _weights_cache[next(iter(_weights_cache))]
+
+    _weights_cache[key] = weights_entry
+
+    return weights_entry
+
+
+def resample(y_data, source_x, target_x):
+
+    '''Return y_data on the source_x grid resampled to target_x by interpolation in log-frequency.
+    y_data is one curve or a (curves x bins) array of curves that share source_x, resampled together.
+    Targets outside source_x are nan'''
+
+    lower, weights, outside = get_interpolation_weights(source_x, target_x)
+
+    y_data = np.asarray(y_data)
+
+    if y_data.shape[-1] == 1:
+        resampled = np.repeat(y_data, len(weights), axis = -1).astype(np.result_type(y_data, float))
+
+    else:
+        resampled = y_data[..., lower] * (1 - weights) + y_data[..., lower + 1] * weights
+
+    if outside.any():
+        resampled[..., outside] = np.nan
+
+    return resampled
+
+
+def align_y_data(x_data_list, y_data_list, target_x = None):
+
+    '''Return (x data, list of y data) with every curve in y_data_list on the same grid.
+    Curves are resampled to target_x if given, otherwise to get_common_grid of x_data_list.
+    When every grid is the same and no target_x is given, the y data is returned as it is.
+    Curves with the same grid are resampled together'''
+
+    if target_x is None:
+
+        if all(np.array_equal(x_data_list[0], x_data) for x_data in x_data_list[1:]):
+            return x_data_list[0], y_data_list
+
+        target_x = get_common_grid(x_data_list)
+
+    target_x = np.asarray(target_x, dtype = float)
+
+    #indices of the curves on each distinct grid
+    groups = {}
+
+    for index, x_data in enumerate(x_data_list):
+        groups.setdefault(get_grid_key(x_data), []).append(index)
+
+    aligned_y_data = [None] * len(y_data_list)
+
+    for indices in groups.values():
+
+        resampled = resample(np.stack([y_data_list[index] for index in indices]), x_data_list[indices[0]], target_x)
+
+        for row, index in enumerate(indices):
+            aligned_y_data[index] = resampled[row]
+
+    return target_x, aligned_y_data
@@ -3,98 +3,132 @@ import matplotlib.ticker as tick
 import numpy as np
 import data_tools as dt
 from annotated_cursor import AnnotatedCursor
+from line_decimation import plot_decimated
 import tkinter as tk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 
+#tick locations of the log2 frequency axis of every graph plot
+TICK_LOCATIONS = [100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+def draw_graph(ax, graph):
+
+    '''Plot one graph on ax with the log2 frequency axis, labels, title and grids shared by every graph plot. 
+    Only uses the axes, so it works for pyplot figures and for figures rendered without pyplot, see graph_renderer. 
+    The line only draws the points that show at the current zoom, see line_decimation. 
+    Returns the plotted line'''
+
+    line = plot_decimated(ax, graph.x_data, graph.y_data)
+
+    ax.set_xscale("log", base=2)
+    ax.xaxis.set_major_locator(tick.FixedLocator(TICK_LOCATIONS))
+    ax.xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
+
+    ax.set_xlabel(graph.x_label_with_unit)
+    ax.set_ylabel(graph.y_label_with_unit)
+    ax.set_title(graph.plot_title)
+    ax.set_xlim([graph.x_min, 10000])
+
+    ax.grid(which="major", color="dimgrey", linewidth=0.5)
+    ax.minorticks_on()
+    ax.grid(which="minor", linestyle=":", color="lightgrey", linewidth=1)
+
+    return line
+
+
+def add_cursor(ax, line):
+
+    '''Add the red annotated cursor showing the values of the line under the mouse'''
+
+    return AnnotatedCursor(
+        line=line,
+        numberformat="{}\n{}",
+        dataaxis='x',
+        offset=[10, 10],
+        textprops={'color': 'red'},
+        ax=ax,
+        useblit=True,
+        color='red',
+        linewidth=1
+    )
+
+
 def graph_plotter(graph, *args, **kwargs):
     
     '''Method to plot an individual graph or a subplot of graphs depending on input,
     but will not show plots yet'''
     
-    tick_locations = [100, 200, 500, 1000, 2000, 5000, 10000]
     number_of_graphs = len(args)
 
     if number_of_graphs == 0:
         # Single graph
         fig, ax = plt.subplots()
-        line, = ax.plot(graph.x_data, graph.y_data)
-        
-        plt.xscale("log", base=2)
-        ax.xaxis.set_major_locator(tick.FixedLocator(tick_locations))
-        ax.xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
-        
-        ax.set_xlabel(graph.x_label_with_unit)
-        ax.set_ylabel(graph.y_label_with_unit)
-        ax.set_title(graph.plot_title)
-        ax.set_xlim([graph.x_min, 10000])
+        axes = [ax]
+
+    else:
+        # Multiple subplots, one for the first graph and one for each additional graph
+        fig, ax = plt.subplots(1, number_of_graphs + 1)
+        axes = list(ax)
+
+    for axis, plotted_graph in zip(axes, (graph,) + args):
+        line = draw_graph(axis, plotted_graph)
 
         # Annotated cursor (optional, remove if not needed)
-        cursor = AnnotatedCursor(
-            line=line,
-            numberformat="{}\n{}",
-            dataaxis='x',
-            offset=[10, 10],
-            textprops={'color': 'red'},
-            ax=ax,
-            useblit=True,
-            color='red',
-            linewidth=1
-        )
+        cursor = add_cursor(axis, line)
 
-    else:
-        # Multiple subplots
-        fig, ax = plt.subplots(1, number_of_graphs)
-        
-        # First subplot
-        line1, = ax[0].plot(graph.x_data, graph.y_data)
-        ax[0].set_xscale("log", base=2)
-        ax[0].xaxis.set_major_locator(tick.FixedLocator(tick_locations))
-        ax[0].xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
-        ax[0].set_xlabel(graph.x_label_with_unit)
-        ax[0].set_ylabel(graph.y_label_with_unit)
-        ax[0].set_title(graph.plot_title)
-        ax[0].set_xlim([graph.x_min, 10000])
-
-        cursor1 = AnnotatedCursor(
-            line=line1,
-            numberformat="{}\n{}",
-            dataaxis='x',
-            offset=[10, 10],
-            textprops={'color': 'red'},
-            ax=ax[0],
-            useblit=True,
-            color='red',
-            linewidth=1
-        )
-
-        # Remaining subplots
-        for i, additional_graph in enumerate(args, start=1):
-            line, = ax[i].plot(additional_graph.x_data, additional_graph.y_data)
-            ax[i].set_xscale("log", base=2)
-            ax[i].xaxis.set_major_locator(tick.FixedLocator(tick_locations))
-            ax[i].xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
-            ax[i].set_xlabel(additional_graph.x_label_with_unit)
-            ax[i].set_ylabel(additional_graph.y_label_with_unit)
-            ax[i].set_title(additional_graph.plot_title)
-            ax[i].set_xlim([additional_graph.x_min, 10000])
-
-            cursor = AnnotatedCursor(
-                line=line,
-                numberformat="{}\n{}",
-                dataaxis='x',
-                offset=[10, 10],
-                textprops={'color': 'red'},
-                ax=ax[i],
-                useblit=True,
-                color='red',
-                linewidth=1
-            )
-
-    # Apply grids (for all subplots)
-    for axis in (ax if number_of_graphs > 0 else [ax]):
-        axis.grid(which="major", color="dimgrey", linewidth=0.5)
-        axis.minorticks_on()
-        axis.grid(which="minor", linestyle=":", color="lightgrey", linewidth=1)
-
-    return fig
\ No newline at end of file
+    return fig
+
+
+class Graph_Template:
+
+    '''Axes of a figure plotted by graph_plotter reused for other graphs by swapping the line data, title, labels and limits, 
+    instead of plotting a new figure for every graph, e.g. for the two graphs shown on each page of the pair reviewer. 
+    Each graph is scaled to its own data like a new plot'''
+
+    def __init__(self, graph, figure):
+
+        # The first axes of the figure and the graph line plotted on it by draw_graph, the first line of the axes
+        self.figure = figure
+        self.ax = figure.axes[0]
+        self.line = self.ax.lines[0]
+
+        self.stamp(graph)
+
+    def get_y_limits(self, y_data):
+
+        '''Return the y limits of a new plot of y_data, the finite data range with the default margins'''
+
+        y_data = np.asarray(y_data)
+        y_data = y_data[np.isfinite(y_data)]
+
+        if len(y_data) == 0:
+            return (0.0, 1.0)
+
+        y_min, y_max = float(y_data.min()), float(y_data.max())
+        margin = (y_max - y_min) * self.ax.margins()[1] if y_max > y_min else 1.0
+
+        return (y_min - margin, y_max + margin)
+
+    def stamp(self, graph):
+
+        '''Put graph on the template axes by swapping the line data, title, labels and limits, 
+        leaving out the cursor lines on the axes from the y limits'''
+
+        self.line.set_data(graph.x_data, graph.y_data)
+        self.ax.set_title(graph.plot_title)
+        self.ax.set_xlabel(graph.x_label_with_unit)
+        self.ax.set_ylabel(graph.y_label_with_unit)
+        self.ax.set_xlim([graph.x_min, 10000])
+        self.ax.set_ylim(self.get_y_limits(graph.y_data))
+
+        return self.figure
+
+    def show(self, graph):
+
+        '''Show graph by stamping it and asking the canvas of the figure to draw when it is next idle'''
+
+        self.stamp(graph)
+        self.figure.canvas.draw_idle()
+
+        return self.figure
\ No newline at end of file
@@ -0,0 +1,119 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from graph_plotter import draw_graph
+
+
+#file formats that figures can be rendered to
+RENDER_FORMATS = ("png", "svg", "pdf")
+
+#resolution of rendered images, the same as the photos saved by gui_export
+RENDER_DPI = 300
+
+
+def get_plot_data(graph):
+
+    '''Return only the data and labels that draw_graph uses from a graph object, as plain arrays and strings.
+    Graph objects keep references to the graphs or plane they came from, which would all be copied to a worker process'''
+
+    return SimpleNamespace(x_data = np.asarray(graph.x_data), y_data = np.asarray(graph.y_data), x_min = graph.x_min, plot_title = str(graph.plot_title),
+                           x_label_with_unit = str(graph.x_label_with_unit), y_label_with_unit = str(graph.y_label_with_unit))
+
+
+def get_safe_filename(name):
+
+    '''Return name with the characters that are not allowed in Windows filenames replaced by underscores'''
+
+    return re.sub(r'[\\/:*?"<>|]', "_", name).strip() or "graph"
+
+
+def create_figure():
+
+    '''Return a Figure with the Agg canvas instead of a pyplot figure, so nothing is shown and no figure is kept open'''
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+
+    return figure
+
+
+def save_figure(figure, filepath, dpi = RENDER_DPI):
+
+    '''Save figure to filepath in the format of its extension, cropped to its contents like the photos saved by gui_export. 
+    Returns filepath'''
+
+    figure.savefig(filepath, dpi = dpi, bbox_inches = "tight")
+
+    return filepath
+
+
+def render_figure(plot_data_list, filepath_without_extension, formats = ("png",), dpi = RENDER_DPI):
+
+    '''Render one figure with a subplot for each graph in plot_data_list, laid out like graph_plotter,
+    using a Figure with the Agg canvas instead of pyplot, so nothing is shown and no figure is kept open.
+    Returns the list of filepaths written, one per format'''
+
+    figure = create_figure()
+
+    axes = figure.subplots(1, len(plot_data_list), squeeze = False)[0]
+
+    for ax, plot_data in zip(axes, plot_data_list):
+        draw_graph(ax, plot_data)
+
+    return [save_figure(figure, f"{filepath_without_extension}.{file_format}", dpi) for file_format in formats]
+
+
+def render_graphs(graphs, output_folder, formats = ("png",), dpi = RENDER_DPI, max_workers = None, filenames = None):
+
+    '''Render graphs to image files in output_folder without any Tk windows.
+    Each item of graphs is a graph object, or a list of graph objects drawn side by side in one figure.
+    Files are named after the plot title of the first graph of each figure unless filenames are given,
+    with a number added when titles repeat. Figures are rendered in parallel by up to max_workers processes,
+    by default one per CPU. Returns the list of filepaths written for each figure, in the order of graphs'''
+
+    for file_format in formats:
+
+        if file_format not in RENDER_FORMATS:
+            raise ValueError(f"Unknown format {file_format}, choose from {', '.join(RENDER_FORMATS)}")
+
+    os.makedirs(output_folder, exist_ok = True)
+
+    #arguments for render_figure, one tuple per figure
+    jobs = []
+    used_names = set()
+
+    for index, figure_graphs in enumerate(graphs):
+
+        if not isinstance(figure_graphs, (list, tuple)):
+            figure_graphs = [figure_graphs]
+
+        name = get_safe_filename(filenames[index] if filenames is not None else figure_graphs[0].plot_title)
+
+        #keep every figure when plot titles repeat
+        unique_name, number = name, 1
+
+        while unique_name.lower() in used_names:
+            number += 1
+            unique_name = f"{name} ({number})"
+
+        used_names.add(unique_name.lower())
+
+        jobs.append(([get_plot_data(graph) for graph in figure_graphs], os.path.join(output_folder, unique_name), tuple(formats), dpi))
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    #render in this process when there is nothing to run in parallel
+    if max_workers <= 1 or len(jobs) <= 1:
+        return [render_figure(*job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers = min(max_workers, len(jobs))) as executor:
+
+        #several figures per task so that short renders do not wait on the pool
+        return list(executor.map(render_figure, *zip(*jobs), chunksize = max(1, len(jobs) // (4 * max_workers))))
\ No newline at end of file
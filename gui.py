@@ -1,6 +1,8 @@
+import multiprocessing
+import os
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, Tk
-from measurement_plane import Measurement_Plane
+from measurement_plane import Measurement_Plane, start_load_pool, shutdown_load_pool
 from surface_average_comparison import Compare_Surface_Average
 from scan_point_graph import Graph_average
 from device import Device
@@ -88,6 +90,31 @@ class VibroGUI(Tk):
         button.pack(pady=(30, 0))
         button.place(relx=1, rely=0, anchor="ne", x=-10, y=10)
 
+    def show_loading_page(self, number_of_files):
+        """Show a progress page and return a progress callback for load_measurement_planes."""
+        page = tk.Frame(self.container, bg="white")
+
+        content = tk.Frame(page, bg="#f0f0f0", bd="10", relief="groove", padx=40, pady=30)
+        content.place(relx=0.5, rely=0.5, anchor="center")
+
+        tk.Label(content, text="Loading Measurement Files", font=("Times New Roman", 16, "bold"), bg="#f0f0f0").pack(pady=(0, 10))
+        status = tk.Label(content, text=f"0 of {number_of_files} files loaded", font=("Times New Roman", 12), bg="#f0f0f0")
+        status.pack(pady=(0, 10))
+
+        progress = ttk.Progressbar(content, maximum=number_of_files, length=400, mode="determinate")
+        progress.pack()
+
+        self.show_page(page)
+        self.update()
+
+        def progress_callback(number_loaded, number_of_files, filepath):
+            progress["value"] = number_loaded
+            status.config(text=f"{number_loaded} of {number_of_files} files loaded: {os.path.basename(filepath)}")
+            # redraw now as files are loaded before control returns to the main loop
+            self.update()
+
+        return progress_callback
+
     def start_task(self):
         match self.task_type.get()[0]:
             case "1":
@@ -211,7 +238,7 @@ class VibroGUI(Tk):
                 key_db = f"{graph_id}_db"
                 key = key_raw if units == "raw" else key_db
 
-                for sp in measurement.scanpoints:
+                for point_index, sp in enumerate(measurement.scanpoints):
                     try:
                         if units == "raw":
                             g_obj = getattr(sp, key_raw)
@@ -221,15 +248,17 @@ class VibroGUI(Tk):
                         g_obj = getattr(sp, key) if hasattr(sp, key) else None
                     if g_obj is None:
                         continue
-                    fig = graph_plotter(g_obj)
-                    graph_items.append(GraphItem(fig, f"Point {sp.scan_point_no}"))
-                    self.current_figs.append(fig)
+                    # figure is only plotted when the reviewer shows this item
+                    graph_items.append(GraphItem(lambda g_obj=g_obj: graph_plotter(g_obj), f"Point {sp.scan_point_no}", source=(measurement, key, point_index), graph=g_obj))
 
                 def build_final_average(kept_items, anomalous_indices):
                     if not kept_items:
                         messagebox.showwarning("No points selected", "You excluded every scan point.")
                         return
 
+                    # the reviewer's choice is the only thing that sets the anomalous points of the plane
+                    measurement.set_anomalous_points(anomalous_indices)
+
                     try:
                         avg_graph = measurement.get_average(key, anomalous_indices=anomalous_indices)
                     except Exception as e:
@@ -333,8 +362,9 @@ class VibroGUI(Tk):
                 return
 
         try:
-            comparison_obj = Compare_Surface_Average(self.selected_files)
+            comparison_obj = Compare_Surface_Average(self.selected_files, progress_callback=self.show_loading_page(len(self.selected_files)))
         except Exception as e:
+            self.show_page(self.menu_frame)
             messagebox.showerror("Load Error", str(e))
             return
         
@@ -364,6 +394,25 @@ class VibroGUI(Tk):
         graph_type_label.pack(anchor="w", pady=(8, 0))
         ttk.Combobox(content, state="readonly", values=graph_types, textvariable=graph_var, width=35).pack()
 
+        # Averages saved in earlier HXML exports, compared without their UFF files
+        saved_label = tk.Label(content, text=f"Saved averages: {len(comparison_obj.saved_averages)}", font=("Times New Roman", 11), bg="#f0f0f0")
+
+        def add_saved_averages():
+            hxml_files = filedialog.askopenfilenames(
+                title="Select HXML exports of surface averages",
+                filetypes=[("HXML files", "*.hxml"), ("All files", "*.*")]
+            )
+            for hxml_file in hxml_files:
+                try:
+                    comparison_obj.load_saved_averages(hxml_file)
+                except Exception as e:
+                    messagebox.showerror("Load Error", f"Could not read {os.path.basename(hxml_file)}:\n{str(e)}")
+            saved_label.config(text=f"Saved averages: {len(comparison_obj.saved_averages)}")
+
+        tk.Button(content, text="Add Saved Averages (HXML)", command=add_saved_averages,
+                font=("Times New Roman", 11)).pack(anchor="w", pady=(12, 0))
+        saved_label.pack(anchor="w")
+
         graph_id = short_graph_types[graph_types.index(graph_var.get())]
         channel_signal_type = graph_id if unit_var == "raw" else f"{graph_id}_db"
         
@@ -382,7 +431,7 @@ class VibroGUI(Tk):
             graph_metadata = [None]  # To track {graph_index: measurement_index, scan_point_index}
 
             for surface_idx, measurement in enumerate(comparison_obj.measurement_list):
-                for sp in measurement.scanpoints:
+                for point_index, sp in enumerate(measurement.scanpoints):
                     try:
                         if units == "raw":
                             g_obj = getattr(sp, graph_id)
@@ -394,10 +443,9 @@ class VibroGUI(Tk):
                     if g_obj is None:
                         continue
 
-                    fig = graph_plotter(g_obj)
-                    graph_items.append(GraphItem(fig, f"Surface {surface_idx} - Point {sp.scan_point_no}"))
+                    # figure is only plotted when the reviewer shows this item
+                    graph_items.append(GraphItem(lambda g_obj=g_obj: graph_plotter(g_obj), f"Surface {surface_idx} - Point {sp.scan_point_no}", source=(measurement, key, point_index), graph=g_obj))
                     graph_metadata.append((surface_idx, graph_id, sp.scan_point_no))
-                    self.current_figs.append(fig)
            
             def build_final_average(kept_items, excluded_indices):
                 comparison_obj.average_list.clear()
@@ -421,11 +469,19 @@ class VibroGUI(Tk):
                     try:
                         avg_graph = surface.get_average(key, anomalous_indices=excluded)
                         comparison_obj.average_list.append(avg_graph)
-                        comparison_obj.initialize_from_files(is_GUI=True)
                     except Exception as e:
                         messagebox.showerror("Averaging Failed",
                             f"Averaging failed for surface {surface_idx + 1}:\n{str(e)}")
 
+                # add the saved averages of the same channel signal after the surface averages
+                try:
+                    comparison_obj.initialize_from_files(is_GUI=True)
+                except ValueError as e:
+                    messagebox.showerror("Saved Averages Not Compared", str(e))
+                    comparison_obj.saved_averages.clear()
+                    saved_label.config(text="Saved averages: 0")
+                    comparison_obj.initialize_from_files(is_GUI=True)
+
                 combined_fig = comparison_obj.create_combined_average_figure()
                 self.current_figs.append(combined_fig)
 
@@ -533,7 +589,7 @@ class VibroGUI(Tk):
 
             graph_items = []
 
-            for sp in measurement.scanpoints:
+            for point_index, sp in enumerate(measurement.scanpoints):
                 try:
                     if units == "raw":
                         g_obj = getattr(sp, graph_id)
@@ -543,9 +599,8 @@ class VibroGUI(Tk):
                     g_obj = getattr(sp, key) if hasattr(sp, key) else None
                 if g_obj is None:
                     continue
-                fig = graph_plotter(g_obj)
-                graph_items.append(GraphItem(fig, f"Point {sp.scan_point_no}"))
-                self.current_figs.append(fig)
+                # figure is only plotted when the reviewer shows this item
+                graph_items.append(GraphItem(lambda g_obj=g_obj: graph_plotter(g_obj), f"Point {sp.scan_point_no}", source=(measurement, key, point_index), graph=g_obj))
             
             def build_final_graph(kept_items, excluded_indices):
                 avg_page = tk.Frame(self.container, bg="white")
@@ -626,8 +681,9 @@ class VibroGUI(Tk):
                     return
 
         try:
-            device = Device(self.selected_files)
+            device = Device(self.selected_files, progress_callback=self.show_loading_page(len(self.selected_files)))
         except Exception as e:
+            self.show_page(self.menu_frame)
             messagebox.showerror("Load Error", str(e))
             return
 
@@ -645,15 +701,14 @@ class VibroGUI(Tk):
         for surface_idx, surface in enumerate(device.all_surfaces):
             for key_raw in keys:
                 key = f"{key_raw}_db"
-                for sp in surface.scanpoints:
+                for point_index, sp in enumerate(surface.scanpoints):
                     try:
                         g_obj = getattr(sp, f"create_{key_raw}_decibel")()
                         if g_obj is None:
                             continue
-                        fig = graph_plotter(g_obj)
-                        graph_items.append(GraphItem(fig, f"{key.upper()} - Surface {surface_idx}, Point {sp.scan_point_no}"))
+                        # figure is only plotted when the reviewer shows this item
+                        graph_items.append(GraphItem(lambda g_obj=g_obj: graph_plotter(g_obj), f"{key.upper()} - Surface {surface_idx}, Point {sp.scan_point_no}", source=(surface, key, point_index), graph=g_obj))
                         graph_metadata.append((surface_idx, key, sp.scan_point_no))
-                        self.current_figs.append(fig)   
                     except Exception as e:
                         print(f"Failed to get graph for {key} at surface {surface_idx} point {sp.scan_point_no}: {e}")
 
@@ -694,5 +749,14 @@ class VibroGUI(Tk):
 
 
 
-app = VibroGUI()
-app.mainloop()
+if __name__ == "__main__":
+    # measurement files are loaded in worker processes, which import this module again on windows
+    multiprocessing.freeze_support()
+
+    # start the workers now, so that they have imported everything by the time files are chosen
+    start_load_pool()
+
+    app = VibroGUI()
+    app.mainloop()
+
+    shutdown_load_pool()
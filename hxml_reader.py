@@ -0,0 +1,63 @@
+import numpy as np
+import xml.etree.ElementTree as ET
+from scan_point_graph import Graph_hxml
+
+
+#class for reading the curves of an HXML file written by HXMLGenerator
+#counterpart of HXMLGenerator, so exported averages can be plotted and compared again without the source UFF files
+class HXMLReader:
+
+    def __init__(self, filename_hxml):
+        '''Parse the HXML file once, the curves are only converted to graphs when read_graphs is called'''
+
+        self.filename_hxml = filename_hxml
+
+        #parse the whole file with the C XML parser
+        self.hxml = ET.parse(self.filename_hxml).getroot()
+
+        #list of all curvedata elements in the order they were written
+        self.curve_data_list = self.hxml.findall("./data/dataset/v-curvedata/curvedata")
+
+
+    def get_curve_names(self):
+
+        #return list of the names of all the curves in the file
+        return [curve_data.get("CurveDataName", "") for curve_data in self.curve_data_list]
+
+
+    def read_graphs(self):
+
+        '''Return a list of Graph_hxml objects, one for each curvedata element in the file'''
+
+        return [self.read_curve_data(curve_data) for curve_data in self.curve_data_list]
+
+
+    def read_curve_data(self, curve_data):
+
+        '''Return a Graph_hxml for one curvedata element holding an x curve, a y curve and a remarks curve'''
+
+        curves = curve_data.findall("curve")
+
+        #first two curves are x and y values, remarks curve is optional in files written by other tools
+        x_curve, y_curve = curves[0], curves[1]
+
+        remarks = ""
+        for curve in curves[2:]:
+            if curve.get("name") == "remarks":
+                remarks = curve.text or ""
+
+        return Graph_hxml(curve_data.get("CurveDataName", ""),
+                          x_curve.get("name", ""), x_curve.get("unit", ""), self.read_values(x_curve.text),
+                          y_curve.get("name", ""), y_curve.get("unit", ""), self.read_values(y_curve.text),
+                          remarks)
+
+
+    def read_values(self, text):
+
+        '''Parse the text of a curve written as [v1 v2 ...] into a float array
+        in a single vectorised call instead of converting each value separately'''
+
+        if not text:
+            return np.array([], dtype=float)
+
+        return np.fromstring(text.strip().strip("[]"), dtype=float, sep=" ")
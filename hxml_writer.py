@@ -4,6 +4,53 @@ import numpy as np
 import xml.etree.ElementTree as ET
 import xml.dom.minidom as minidom
 
+# Pretty-printed start and end of an HXML file, exactly as minidom toprettyxml() writes the basic structure.
+# The curvedata elements go between them, inside v-curvedata.
+HXML_HEAD = (
+    '<?xml version="1.0" ?>\n'
+    '<hxml>\n'
+    '\t<head>\n'
+    '\t\t<Document>\n'
+    '\t\t\t<DataVersion XsdVersion="0.0.0.1">0.0.0.1</DataVersion>\n'
+    '\t\t\t<DataType>hiCurve</DataType>\n'
+    '\t\t\t<LDocNode>//hxml/data</LDocNode>\n'
+    '\t\t\t<PlatformVersion>n.a.</PlatformVersion>\n'
+    '\t\t</Document>\n'
+    '\t</head>\n'
+    '\t<data>\n'
+    '\t\t<dataset>\n'
+    '\t\t\t<longDataSetDesc/>\n'
+    '\t\t\t<shortDataSetDesc/>\n'
+    '\t\t\t<acpEarhookType/>\n'
+)
+HXML_TAIL = (
+    '\t\t</dataset>\n'
+    '\t</data>\n'
+    '\t<environment/>\n'
+    '</hxml>\n'
+)
+
+
+def escape_hxml(text):
+    """Escape text the same way minidom does when pretty-printing."""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+
+def format_curve_values(curv_values):
+    """Return the text of a curve, numeric arrays are written as [v1 v2 ...]."""
+    if isinstance(curv_values, (np.ndarray, np.generic)):
+        curv_values = np.asarray(curv_values)
+
+        # repr of a Python float gives the same shortest digits as str of a numpy float64,
+        # converting the whole array with tolist is much faster than str per numpy scalar
+        if curv_values.dtype == np.float64:
+            return "[" + ' '.join(map(repr, curv_values.ravel().tolist())) + "]"
+
+        return "[" + ' '.join(map(str, curv_values)) + "]"
+
+    return curv_values
+
+
 class HXMLGenerator:
     def __init__(self, filename_hxml, re_arrange=True):
         self.filename_hxml = filename_hxml
@@ -57,8 +104,54 @@ class HXMLGenerator:
         with open(self.filename_hxml, "w") as formatted_file:
             formatted_file.write(pretty_xml)
 
+    def write_curves(self, curves):
+        """Writes the HXML file in one pass from a list of
+        (curve name, x name, x unit, x values, y name, y unit, y values, remarks) tuples.
+        The output is the same as building the tree and pretty-printing it with re_arrange_file."""
+        with open(self.filename_hxml, "w", encoding="utf-8") as hxml_file:
+            hxml_file.write(HXML_HEAD)
+
+            if not curves:
+                hxml_file.write('\t\t\t<v-curvedata/>\n')
+            else:
+                hxml_file.write('\t\t\t<v-curvedata>\n')
+                for curve in curves:
+                    self.write_curvedata(hxml_file, *curve)
+                hxml_file.write('\t\t\t</v-curvedata>\n')
+
+            hxml_file.write(HXML_TAIL)
+
+    def write_curvedata(self, hxml_file, curve_name, curv1_size, curv1_unit, curv1_values, curv2_size, curv2_unit, curv2_values, remarks):
+        """Writes one curvedata element, the streaming counterpart of new_field_hxml."""
+        hxml_file.write(f'\t\t\t\t<curvedata CurveDataName="{escape_hxml(curve_name)}">\n'
+                        '\t\t\t\t\t<longDataSetDesc/>\n'
+                        '\t\t\t\t\t<shortDataSetDesc/>\n')
+        self.write_curve(hxml_file, curv1_size, curv1_unit, format_curve_values(curv1_values))
+        self.write_curve(hxml_file, curv2_size, curv2_unit, format_curve_values(curv2_values))
+        self.write_curve(hxml_file, "remarks", "", remarks)
+        hxml_file.write('\t\t\t\t</curvedata>\n')
+
+    def write_curve(self, hxml_file, curv_size, curv_unit, text):
+        """Writes one curve element, an empty text gives an empty element like minidom."""
+        hxml_file.write(f'\t\t\t\t\t<curve name="{escape_hxml(curv_size)}" unit="{escape_hxml(curv_unit)}"')
+        if text:
+            hxml_file.write(f'>{escape_hxml(text)}</curve>\n')
+        else:
+            hxml_file.write('/>\n')
+
     def graphs_to_hxml(self, graphs_list, remarks_list = None):
         """Populates the HXML file with data from a dictionary."""
+        if self.re_arrange:
+            np.set_printoptions(linewidth=np.inf, precision=2, floatmode="fixed")
+
+            #once i changed f to Frequency and Response_Magnitude to velocity and the units as well, rdstarter cant display it
+            curves = [(graph.plot_title, "f", graph.x_label_unit, np.array(graph.x_data), graph.y_label, graph.y_label_unit, np.array(graph.y_data),
+                       "No remarks" if remarks_list is None else remarks_list[index])
+                      for index, graph in enumerate(graphs_list)]
+
+            self.write_curves(curves)
+            return
+
         self.basic_structure()
 
         #no remarks
@@ -94,6 +187,15 @@ class HXMLGenerator:
 
     def excel_to_hxml(self, data_dicts):
         """Populates the HXML file with data from a dictionary."""
+        if self.re_arrange:
+            np.set_printoptions(linewidth=np.inf, precision=2, floatmode="fixed")
+
+            curves = [(data_dict["curvename"], "f", "Hz", np.array(data_dict["frequency"]), "Response_Magnitude", "dBSPL/V", np.array(data_dict["response_magnitude"]), None)
+                      for data_dict in data_dicts]
+
+            self.write_curves(curves)
+            return
+
         self.basic_structure()
         number_of_curves = len(data_dicts)
 
@@ -130,10 +232,7 @@ class HXMLGenerator:
         curve.set("name", curv_size)
         curve.set("unit", curv_unit)
 
-        if isinstance(curv_values, (np.ndarray, np.generic)):
-            curve.text = "[" + ' '.join(map(str, curv_values)) + "]"
-        else:
-            curve.text = curv_values
+        curve.text = format_curve_values(curv_values)
 
     def insert_one_curve_metadata_hxml(self, par_node, remarks):
         """Inserts a single remark line into the HXML file."""
@@ -0,0 +1,119 @@
+import numpy as np
+from matplotlib.lines import Line2D
+
+
+#largest number of points kept for each pixel column: the first, lowest, highest and last point
+POINTS_PER_COLUMN = 4
+
+
+def get_decimation_indices(x_data, y_data, x_limits, number_of_columns):
+
+    '''Return the sorted indices of the points of a line on a log x axis that are drawn for the view x_limits,
+    number_of_columns pixels wide. The visible points are binned per pixel column in log-frequency and only the
+    first, lowest, highest and last point of each column are kept, so the drawn line covers the same pixels, peaks included.
+    The nearest point outside each end of the view is kept so the line still runs to the edges,
+    and the first nan of each run of nans is kept so gaps stay gaps'''
+
+    x_data = np.asarray(x_data, dtype = float)
+    y_data = np.asarray(y_data, dtype = float)
+
+    low, high = min(x_limits), max(x_limits)
+
+    #the x data is ascending, so the visible points are one slice
+    start = max(int(np.searchsorted(x_data, low, side = "left")) - 1, 0)
+    end = min(int(np.searchsorted(x_data, high, side = "right")) + 1, len(x_data))
+
+    if end - start <= POINTS_PER_COLUMN * number_of_columns or low <= 0:
+        return np.arange(start, end)
+
+    x_visible, y_visible = x_data[start:end], y_data[start:end]
+
+    #pixel column of each point, the points just outside the view get columns -1 and number_of_columns of their own
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        columns = np.floor((np.log(x_visible) - np.log(low)) / (np.log(high) - np.log(low)) * number_of_columns)
+
+    columns = np.clip(np.nan_to_num(columns, nan = -1, neginf = -1), -1, number_of_columns)
+
+    #the columns are ascending, so the points of each column are contiguous
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    counts = np.diff(np.r_[starts, len(columns)])
+    positions = np.arange(len(columns))
+
+    is_nan = np.isnan(y_visible)
+    min_keys = np.where(is_nan, np.inf, y_visible)
+    max_keys = np.where(is_nan, -np.inf, y_visible)
+
+    #first point of each column holding its lowest and highest value
+    is_min = min_keys == np.repeat(np.minimum.reduceat(min_keys, starts), counts)
+    is_max = max_keys == np.repeat(np.maximum.reduceat(max_keys, starts), counts)
+
+    lowest = np.minimum.reduceat(np.where(is_min, positions, len(columns)), starts)
+    highest = np.minimum.reduceat(np.where(is_max, positions, len(columns)), starts)
+
+    nan_starts = np.flatnonzero(is_nan & ~np.r_[False, is_nan[:-1]])
+
+    kept = np.unique(np.concatenate([starts, starts + counts - 1, lowest, highest, nan_starts]))
+
+    return kept + start
+
+
+class Decimated_Line(Line2D):
+
+    '''Line on a log x axis that draws only the points returned by get_decimation_indices for the current view and size.
+    It keeps the full resolution data, so get_xdata and get_ydata, the autoscaling and the AnnotatedCursor see every point.
+    The decimation is done again whenever the view, the axes size or the dpi changes, so zooming, panning and saving stay exact'''
+
+    def __init__(self, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+
+        #line that is drawn with the decimated data, it is not added to the axes
+        self.decimated_line = Line2D([], [])
+
+        #(x data, y data, view, number of columns) the decimated line was made for
+        self.decimation_key = None
+
+    def draw(self, renderer):
+
+        if not self.get_visible() or self.axes is None:
+            return super().draw(renderer)
+
+        x_data, y_data = self.get_xdata(orig = True), self.get_ydata(orig = True)
+        x_limits = tuple(self.axes.get_xlim())
+        number_of_columns = max(int(np.ceil(self.axes.bbox.width)), 1)
+
+        key = self.decimation_key
+
+        #set_data replaces the arrays, so the same arrays mean the same data
+        if key is None or key[0] is not x_data or key[1] is not y_data or key[2:] != (x_limits, number_of_columns):
+
+            indices = get_decimation_indices(x_data, y_data, x_limits, number_of_columns)
+            self.decimated_line.set_data(np.asarray(x_data)[indices], np.asarray(y_data)[indices])
+            self.decimation_key = (x_data, y_data, x_limits, number_of_columns)
+
+        #style, transform and clipping may have changed since the last draw
+        self.decimated_line.update_from(self)
+
+        if self.decimated_line.axes is None:
+            self.decimated_line.set_figure(self.figure)
+            self.decimated_line.axes = self.axes
+
+        self.decimated_line.draw(renderer)
+        self.stale = False
+
+
+def plot_decimated(ax, x_data, y_data, **kwargs):
+
+    '''Plot a line like ax.plot, with the style and colour ax.plot would give it, as a Decimated_Line. Returns the line'''
+
+    line, = ax.plot(x_data, y_data, **kwargs)
+
+    decimated = Decimated_Line(line.get_xdata(orig = True), line.get_ydata(orig = True))
+    decimated.update_from(line)
+    decimated.set_label(line.get_label())
+
+    #put the decimated line in the place of the plotted one
+    line.remove()
+    ax.add_line(decimated)
+
+    return decimated
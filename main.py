@@ -16,6 +16,10 @@ from device import Device
 graph_types = ["Vibration Displacement", "Vibration Velocity", "Vibration Acceleration", "Ref1", "Ref2", "Ref3", "H1 Vibration Ref1", "H2 Vibration Ref1", "Vibration Ref1", "Vibration Ref2", "Vibration Ref3"]
 short_graph_types = ["disp", "vib", "acc", "ref1", "ref2", "ref3", "h1vibref1", "h2vibref1", "vibref1", "vibref2", "vibref3"]
 
+#this script runs at module level without a __main__ guard, so worker processes started by spawn on windows would run the menu again
+#load measurement files one after another in this process instead of in a process pool
+load_workers = 1
+
 #python terminal user interface
 
 #loop until user gives valid input
@@ -707,14 +711,14 @@ while not valid:
                                     #raw units
                                     if user_unit_choice == "1":
 
-                                        comparison_obj = Compare_Surface_Average(selected_filepaths)
+                                        comparison_obj = Compare_Surface_Average(selected_filepaths, max_workers = load_workers)
                                         comparison_obj.initialize_from_files(f"{short_graph_types[choice_index]}")
                                         comparison_obj.compare_surface_average_plot()
 
                                     #decibel
                                     else:
 
-                                        comparison_obj = Compare_Surface_Average(selected_filepaths)
+                                        comparison_obj = Compare_Surface_Average(selected_filepaths, max_workers = load_workers)
                                         comparison_obj.initialize_from_files(f"{short_graph_types[choice_index]}_db")
                                         comparison_obj.compare_surface_average_plot()
 
@@ -724,14 +728,14 @@ while not valid:
                                     #raw units
                                     if user_unit_choice == "1":
 
-                                        comparison_obj = Compare_Surface_Average(selected_filepaths)
+                                        comparison_obj = Compare_Surface_Average(selected_filepaths, max_workers = load_workers)
                                         comparison_obj.initialize_from_files(f"{short_graph_types[choice_index]}")
                                         comparison_obj.compare_surface_average_export()
 
                                     #decibel
                                     else:
 
-                                        comparison_obj = Compare_Surface_Average(selected_filepaths)
+                                        comparison_obj = Compare_Surface_Average(selected_filepaths, max_workers = load_workers)
                                         comparison_obj.initialize_from_files(f"{short_graph_types[choice_index]}_db")
                                         comparison_obj.compare_surface_average_export()
 
@@ -912,7 +916,7 @@ while not valid:
             device_list_planes_filepaths = filedialog.askopenfilenames(parent = window, initialdir = "C:\\Git_Repos_Azure\\EAD_SG\\Measurement\\LaserVibrometerPythonAnalyser\\laser_vibrometer_scans")
 
             #create device object
-            device = Device(device_list_planes_filepaths)
+            device = Device(device_list_planes_filepaths, max_workers = load_workers)
 
             #export device data to HXML
             device.export()
@@ -1,47 +1,81 @@
 import pyuff
 import matplotlib.pyplot as plt
 import matplotlib.ticker as tick
+from matplotlib.colors import to_rgba
+from matplotlib.widgets import RectangleSelector, LassoSelector
 import numpy as np
 import os
+import warnings
 import tkinter as tk
-from scan_point import Scan_Point
-from scan_point_graph import Graph_average
+from scan_point import Scan_Point, CHANNELS
+from uff_reader import UFF_Reader, read_uff_sets
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import scan_cache
+from scan_point_graph import Graph_average, Graph_octave, average_y_data, reduce_to_octave_bands
+from point_index import Point_Index
+from band_clustering import get_cluster_labels, get_group_sums, get_principal_scores, CLUSTERING_METHODS
 from annotated_cursor import AnnotatedCursor
+from line_decimation import plot_decimated
+from graph_renderer import create_figure, save_figure
 from tkinter import filedialog, messagebox, Tk
-from data_tools import get_short_names, get_short_chan_signal
+from data_tools import get_short_names, get_short_chan_signal, array_to_decibel_1, array_to_decibel_2
 from hxml_writer import HXMLGenerator
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
 
+#a frequency bin of a scan point is an outlier when its robust z-score against the other points of the plane is above this
+ANOMALY_Z_THRESHOLD = 3.5
+
+#a scan point is flagged as anomalous when more than this fraction of its frequency bins are outliers
+ANOMALY_BIN_FRACTION = 0.2
+
+#median and median absolute deviation are not meaningful for fewer scan points than this, so no points are flagged
+ANOMALY_MIN_POINTS = 5
+
+#default balance between spectral similarity and position when suggesting bands, 0 is position only and 1 is spectra only
+BAND_SPECTRAL_WEIGHT = 0.5
+
+#number of principal components of the spectra used when suggesting bands
+BAND_SPECTRAL_COMPONENTS = 8
+
+
 #class for one measurement file
 class Measurement_Plane:
 
-    def __init__(self, filepath, number_graphs = 8):
+    def __init__(self, filepath, number_graphs = 8, use_cache = True, uff_sets = None):
         '''Change number_graphs to accomodate the 
-        number of graphs extracted per scan point'''
+        number of graphs extracted per scan point. 
+        Set use_cache to False to always parse the UFF file instead of using the scan cache. 
+        uff_sets is (set types, datasets) already read from the file in another process, see load_measurement_planes'''
 
         self.filepath = filepath
 
-        #open UFF file
-        self.uff_file = pyuff.UFF(self.filepath)
+        #default 8 graphs per scan point
+        self.number_graphs = number_graphs
 
-        #load all datasets from UFF file to data object
-        self.data = self.uff_file.read_sets()
+        #information about the measurement
+        self.scan_name = os.path.basename(filepath)
 
-        #get array of set types
-        self.set_types = self.uff_file.get_set_types()
+        #UFF file reader and all datasets from the UFF file
+        #stay as None when the plane is loaded from the scan cache
+        self.uff_file = None
+        self.data = None
 
-        #search in set_types array for 2411 and get tuple of indexes for search result
-        #get the index of 2411 and save as coordinates data index which is where the scan point coordinates data are stored in self.data
-        self.coordinates_data_index = (np.where(self.set_types == 2411))[0][0]
+        #load the parsed plane from the scan cache if this file has been opened before
+        #datasets that were already read by a worker process skip the cache lookup
+        cached_plane = scan_cache.default_cache.load(self.filepath, self.number_graphs) if use_cache and uff_sets is None else None
 
-        #create a list of scan point numbers with each one converted to integer
-        self.scan_point_names = [int(point_no) for point_no in self.data[self.coordinates_data_index]["node_nums"]]
+        if cached_plane is not None:
 
-        #create a 2D list of scanpoint coordinates
-        #structure is [[point numbers], [x-coordinates], [y-coordinates], [z-coordinates]]
-        #also convert scan point numbers to integers
-        self.scan_point_coordinates = [self.scan_point_names, self.data[self.coordinates_data_index]["x"], self.data[self.coordinates_data_index]["y"], self.data[self.coordinates_data_index]["z"]]
+            self.from_cache(*cached_plane)
+
+        else:
+
+            #parse the UFF file and save the parsed plane to the scan cache for next time
+            self.read_uff_file(uff_sets)
+
+            if use_cache:
+                scan_cache.default_cache.store(self.filepath, self.number_graphs, *self.to_cache())
 
         #attribute to store list of colours for bands of points
         self.band_colours = self.band_colours = [
@@ -78,6 +112,100 @@ class Measurement_Plane:
                         ]
         
         
+        #list holding all the scan point objects
+        self.scanpoints = []
+
+        #iterate through all the scan points in the measurement
+        #each scan point object is a view over its row of self.channel_data
+        for point in range(self.number_of_scan_points):
+
+            #create instance of scan point object for this scan point 
+            #and append this scan point object to list of scan points for this measurement
+            self.scanpoints.append(Scan_Point(self, point))
+
+
+        #attribute to store anomalous points when get_anomalous method is called
+        self.anomalous_points = []
+
+        #attribute to store a 2D list for non-anomalous points when get_anomalous method is called
+        #before get_anomalous method is called, it is assumed all points are non-anomalous
+        self.scan_point_coordinates_valid = self.scan_point_coordinates
+
+        #attribute to store a 2D list for anomalous points when get_anomalous method is called
+        self.scan_point_coordinates_anomalous = [[], [], [], []]
+
+        #attribute to store list of all bands after calling create_bands method
+        #each band is a list of point numbers
+        self.all_bands = []
+
+        #attribute to store list of all bands after calling create_bands method
+        #each band is a list of scan point objects
+        self.all_bands_points = []
+
+        #attribute to store list of graph average objects of each band after calling get_band_averages method
+        self.band_averages = []
+
+        ##attribute to store a list of remarks, one for for each band
+        #indicate color of band as shown on scan layout, as well as the scanpoints included in the band
+        #after calling get_band_averages method
+        self.band_remarks = []
+
+        #attribute to store the standard deviation and min/max envelope of each band
+        #after calling plot_band_averages method with spread
+        self.band_spread = None
+
+        #attribute to store the running sum and count of included points for each channel signal type
+        #after calling start_running_average method
+        self.running_averages = {}
+
+        #attribute to store the (points x bins) transfer functions vibref1, vibref2 and vibref3 of all the scan points
+        #after calling get_transfer_function method
+        self.transfer_functions = {}
+
+        #attribute to store the spatial index over the scan point coordinates, built by get_point_index method
+        self.scan_point_index = None
+
+            
+
+    
+    def read_uff_file(self, uff_sets = None):
+
+        '''Method to parse the UFF file into the attributes of the plane. 
+        uff_sets is (set types, datasets) if the file was already read, e.g. by read_uff_sets in a worker process'''
+
+        if uff_sets is not None:
+
+            #datasets were read elsewhere, no reader is kept for this plane
+            self.set_types, self.data = uff_sets
+
+        else:
+
+            #open UFF file and load all datasets from UFF file to data object
+            #the native reader parses the ordinate data of dataset 58 straight into numpy arrays
+            try:
+                self.uff_file = UFF_Reader(self.filepath)
+                self.data = self.uff_file.read_sets()
+
+            #fall back to pyuff for files the native reader does not support e.g. binary dataset 58b
+            except ValueError:
+                self.uff_file = pyuff.UFF(self.filepath)
+                self.data = self.uff_file.read_sets()
+
+            #get array of set types
+            self.set_types = self.uff_file.get_set_types()
+
+        #search in set_types array for 2411 and get tuple of indexes for search result
+        #get the index of 2411 and save as coordinates data index which is where the scan point coordinates data are stored in self.data
+        self.coordinates_data_index = (np.where(self.set_types == 2411))[0][0]
+
+        #create a list of scan point numbers with each one converted to integer
+        self.scan_point_names = [int(point_no) for point_no in self.data[self.coordinates_data_index]["node_nums"]]
+
+        #create a 2D list of scanpoint coordinates
+        #structure is [[point numbers], [x-coordinates], [y-coordinates], [z-coordinates]]
+        #also convert scan point numbers to integers
+        self.scan_point_coordinates = [self.scan_point_names, self.data[self.coordinates_data_index]["x"], self.data[self.coordinates_data_index]["y"], self.data[self.coordinates_data_index]["z"]]
+
         #search in set_types array for 58 and get tuple of indexes for search result
         #get the index of the first instance of 58 and save as first data index which is where the first data graph is stored in self.data
         first_data_index = (np.where(self.set_types == 58))[0][0]
@@ -85,17 +213,7 @@ class Measurement_Plane:
         actual_graph_count = len(graph_indices)
         #print(f"graph count: {actual_graph_count}")
         
-        self.number_of_scan_points = int(actual_graph_count/number_graphs)
-
-        #dictionary holding all the scan point objects
-        self.scanpoints = []
-
-        #default 8 graphs per scan point
-        self.number_graphs = number_graphs
-        
-
-        #information about the measurement
-        self.scan_name = os.path.basename(filepath)
+        self.number_of_scan_points = int(actual_graph_count/self.number_graphs)
 
         self.db_app = str(self.data[0]["db_app"])
         self.date_db_created = str(self.data[0]["date_db_created"])
@@ -116,86 +234,417 @@ class Measurement_Plane:
         #print(f"{actual_graph_count} {first_data_index} {len(self.data)}")
         for i in graph_indices:
             #set filename attribute to current filename
-            self.data[i]["id4"] = str(os.path.basename(filepath))
+            self.data[i]["id4"] = self.scan_name
 
 
-        #iterate through all the scan points in the measurement
-        for point in range(self.number_of_scan_points):
-            
-            #create a list to store all the graphs for the current scan point
-            scan_point_all_graphs = []
+        #store the whole plane as one array indexed [point, channel, bin] with one shared frequency axis
+        #and one metadata table with an entry for each channel
+        self.build_channel_data(graph_indices)
 
-            #index to start from for this point
-            #first 6 items in self.data are not graph data
-            #for point 1 start from index 6 to skip the first 6 items to start from item 7 at index 6
-            #for point 2 start from index 7 and etc
-            index = first_data_index + point
 
+    def to_cache(self):
 
-            #iterate through all the graphs for the current scan point
-            for graph in range(self.number_graphs):
-                if index >= len(self.data):
-                    print(f"⚠️ Warning: Not enough graph data for scan point {point + 1}. Expected {self.number_graphs} graphs, found fewer.")
-                    break
+        '''Method to return the parsed plane as (arrays, metadata) to save in the scan cache'''
 
-                #access one graph for the current scan point
-                scan_point_graph = self.data[index]
+        arrays = {
+            "set_types": np.asarray(self.set_types),
+            "coordinates": np.array(self.scan_point_coordinates, dtype = float),
+            "frequencies": self.frequencies,
 
-                #append the graph to the list of graphs for current scan point
-                scan_point_all_graphs.append(scan_point_graph)
+            #saved channel by channel so that each channel is one contiguous block in the file
+            "channel_data": self.channel_data.transpose(1, 0, 2),
+            "scan_point_numbers": self.scan_point_numbers,
+        }
 
-                #increment the index by the number of scan points
-                #to access the next graph for this same scan point
-                index += self.number_of_scan_points
-            
-            if len(scan_point_all_graphs) != self.number_graphs:
-                continue
+        metadata = {
+            "number_of_scan_points": self.number_of_scan_points,
+            "db_app": self.db_app,
+            "date_db_created": self.date_db_created,
+            "time_db_created": self.time_db_created,
+            "units_description": self.units_description,
 
-            #create instance of scan point object for this scan point 
-            #and append this scan point object to list of scan points for this measurement
-            self.scanpoints.append(Scan_Point(scan_point_all_graphs))
+            #x data is saved once as frequencies
+            "channel_info": [{key: value for key, value in info.items() if key != "x"} for info in self.channel_info],
+        }
 
+        return arrays, metadata
 
-        #attribute to store anomalous points when get_anomalous method is called
-        self.anomalous_points = []
 
-        #attribute to store a 2D list for non-anomalous points when get_anomalous method is called
-        #before get_anomalous method is called, it is assumed all points are non-anomalous
-        self.scan_point_coordinates_valid = self.scan_point_coordinates
+    def from_cache(self, arrays, metadata):
 
-        #attribute to store a 2D list for anomalous points when get_anomalous method is called
-        self.scan_point_coordinates_anomalous = [[], [], [], []]
+        '''Method to restore the parsed plane from (arrays, metadata) loaded from the scan cache'''
 
-        #attribute to store list of all bands after calling create_bands method
-        #each band is a list of point numbers
-        self.all_bands = []
+        self.set_types = arrays["set_types"]
 
-        #attribute to store list of all bands after calling create_bands method
-        #each band is a list of scan point objects
-        self.all_bands_points = []
+        #create a 2D list of scanpoint coordinates
+        #structure is [[point numbers], [x-coordinates], [y-coordinates], [z-coordinates]]
+        coordinates = arrays["coordinates"]
+        self.scan_point_names = [int(point_no) for point_no in coordinates[0]]
+        self.scan_point_coordinates = [self.scan_point_names, coordinates[1], coordinates[2], coordinates[3]]
 
-        #attribute to store list of graph average objects of each band after calling get_band_averages method
-        self.band_averages = []
+        self.number_of_scan_points = int(metadata["number_of_scan_points"])
 
-        ##attribute to store a list of remarks, one for for each band
-        #indicate color of band as shown on scan layout, as well as the scanpoints included in the band
-        #after calling get_band_averages method
-        self.band_remarks = []
+        self.db_app = metadata["db_app"]
+        self.date_db_created = metadata["date_db_created"]
+        self.time_db_created = metadata["time_db_created"]
+        self.units_description = metadata["units_description"]
+
+        self.frequencies = arrays["frequencies"]
+
+        #channel data is memory-mapped from the cache, so each channel is only read from disk when it is first used
+        #the file holds one contiguous block per channel, transpose back to [point, channel, bin]
+        self.channel_data = arrays["channel_data"].transpose(1, 0, 2)
+        self.scan_point_numbers = arrays["scan_point_numbers"]
+
+        #the cached file may have been saved under another name, so use the current filename as the scan name
+        self.channel_info = [dict(info, x = self.frequencies, id4 = self.scan_name) for info in metadata["channel_info"]]
+
+
+    def build_channel_data(self, graph_indices):
+
+        '''Method to gather the dataset 58 graphs of all the scan points into
+        self.channel_data, an array of y data indexed [point, channel, bin],
+        self.frequencies, the x data shared by all the graphs, and
+        self.channel_info, a list with one dictionary of labels for each channel'''
+
+        #graphs in the file are ordered by channel, then by scan point
+        #the graph for a point and channel is at graph_indices[channel * number of scan points + point]
+        number_of_graphs = self.number_of_scan_points * self.number_graphs
+
+        if number_of_graphs < len(graph_indices):
+            print(f"⚠️ Warning: {len(graph_indices) - number_of_graphs} graphs in {self.scan_name} do not belong to a complete scan point and were skipped.")
+
+        graphs = [self.data[index] for index in graph_indices[:number_of_graphs]]
+
+        #all graphs of a measurement share the x data of the first graph
+        self.frequencies = graphs[0]["x"]
+
+        #array of y data for all the graphs
+        #stored channel by channel in memory and viewed as [point, channel, bin], so every channel array is contiguous
+        self.channel_data = np.empty((self.number_graphs, self.number_of_scan_points, len(self.frequencies))).transpose(1, 0, 2)
+
+        #list of label dictionaries, one for each channel
+        self.channel_info = []
+
+        for channel in range(self.number_graphs):
+
+            #graphs of all the scan points for this channel
+            channel_graphs = graphs[channel * self.number_of_scan_points:(channel + 1) * self.number_of_scan_points]
+
+            #stack the y data of this channel into a (points x bins) array
+            channel_y_data = np.array([graph["data"] for graph in channel_graphs])
+
+            #if the y data is complex, convert all elements in the array to absolute, same as Graph
+            if np.iscomplexobj(channel_y_data):
+                channel_y_data = np.abs(channel_y_data)
+
+            self.channel_data[:, channel, :] = channel_y_data
+
+            first_graph = channel_graphs[0]
+
+            #labels shared by all the scan points for this channel
+            self.channel_info.append({
+                "x": self.frequencies,
+                "abscissa_min": first_graph["abscissa_min"],
+                "id4": str(first_graph["id4"]),
+                "id2": str(first_graph["id2"]),
+                "abscissa_axis_lab": str(first_graph["abscissa_axis_lab"]),
+                "abscissa_axis_units_lab": str(first_graph["abscissa_axis_units_lab"]),
+                "ordinate_axis_lab": str(first_graph["ordinate_axis_lab"]),
+                "ordinate_axis_units_lab": str(first_graph["ordinate_axis_units_lab"]),
+            })
+
+        #scan point numbers of each row of self.channel_data, taken from the first channel
+        self.scan_point_numbers = np.array([int(graph["rsp_node"]) for graph in graphs[:self.number_of_scan_points]])
+
+
+    def get_channel_array(self, channel_signal_type):
+
+        '''Method to return the (points x bins) array of y data for one raw channel,
+        e.g. "vib" or "ref1", as a view into self.channel_data'''
+
+        return self.channel_data[:, CHANNELS.index(channel_signal_type), :]
+
+
+    def get_transfer_function(self, channel_signal_type):
+
+        '''Method to return the (points x bins) masked array of the transfer function "vibref1", "vibref2" or "vibref3" 
+        of every scan point, vib divided by ref1, ref2 or ref3 in one array operation. 
+        Bins where the reference is 0 or either channel is not finite are masked, and their data is nan. 
+        The averages of the plane leave masked bins out of their sums and counts, since they are nan in the data, 
+        see scan_point_graph.aggregate_y_data, start_running_average and get_band_statistics. 
+        Computed once per plane, the Graph_quotient of each scan point is a view over one row of it'''
+
+        if channel_signal_type not in self.transfer_functions:
+
+            dividend = self.get_channel_array("vib")
+            divisor = self.get_channel_array(channel_signal_type.replace("vib", ""))
+
+            masked = (divisor == 0) | ~np.isfinite(divisor) | ~np.isfinite(dividend)
+
+            #divide only the valid bins, so there are no divide by zero warnings
+            quotient = np.full(dividend.shape, np.nan, dtype = np.result_type(dividend, divisor, float))
+            np.divide(dividend, divisor, out = quotient, where = ~masked)
+
+            self.transfer_functions[channel_signal_type] = np.ma.masked_array(quotient, masked)
+
+        return self.transfer_functions[channel_signal_type]
+
+
+    def get_channel_matrix(self, channel_signal_type):
+
+        '''Method to return the (points x bins) array of y data for any channel signal type used by get_average, 
+        e.g. "vib", "vibref1" or "vibref1_db", holding the same values as the scan point graphs of that type. 
+        Transfer functions and decibel conversions are done on the whole plane at once'''
+
+        channel = channel_signal_type.replace("_db", "")
+
+        #raw channel stored in the plane
+        if channel in CHANNELS:
+            matrix = self.get_channel_array(channel)
+
+        #transfer function vibref1, vibref2 or vibref3 is vib divided by ref1, ref2 or ref3, 
+        #its masked bins are nan so that the averages can leave them out
+        else:
+            matrix = self.get_transfer_function(channel).data
+
+        if channel_signal_type.endswith("_db"):
+
+            #decibel reference of each row, set on its scan point
+            references = self.get_decibel_references(channel)
+
+            #acceleration has squared units
+            if channel == "acc":
+                matrix = array_to_decibel_2(matrix, references)
+
+            else:
+                matrix = array_to_decibel_1(matrix, references)
+
+        return matrix
+
+
+    def get_decibel_references(self, channel_signal_type):
+
+        '''Method to return the (points x 1) array of the decibel references of a channel, e.g. "vib" or "vibref1", 
+        one for each scan point so that the rows of a (points x bins) array are each converted with their own reference'''
+
+        return np.array([[getattr(point, f"{channel_signal_type}_decibel_reference")] for point in self.scanpoints], dtype = float)
+
+
+    def get_octave_matrix(self, channel_signal_type, fraction = 3, reduction = "smooth"):
+
+        '''Method to return (x data, (points x bins) array) of a channel signal type with every scan point reduced to 
+        1/fraction-octave bands at once, the same values as scan_point_graph.Graph_octave of each scan point graph, 
+        decibel channels with the decibel reference of each scan point. 
+        reduction is one of scan_point_graph.OCTAVE_REDUCTIONS'''
+
+        channel = channel_signal_type.replace("_db", "")
+
+        #decibel y data is combined in power, acceleration has squared units
+        if channel_signal_type.endswith("_db"):
+            decibel_factor = 10 if channel == "acc" else 20
+
+        else:
+            decibel_factor = None
+
+        return reduce_to_octave_bands(self.get_channel_matrix(channel_signal_type), self.frequencies, fraction, reduction, decibel_factor)
+
+
+    def get_coherence_matrix(self):
+
+        '''Method to return the (points x bins) array of coherence between vib and ref1 of every scan point, 
+        from the ratio of the H1 and H2 transfer functions already loaded. 
+        Values are clipped to 0 to 1, bins where H2 is 0 have coherence 0. Used as weights for averaging'''
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            coherence = np.divide(np.abs(self.get_channel_array("h1vibref1")), np.abs(self.get_channel_array("h2vibref1")))
+
+        return np.clip(np.nan_to_num(coherence, nan = 0.0, posinf = 0.0), 0.0, 1.0)
+
+
+    def get_log_magnitude_matrix(self, channel_signal_type):
+
+        '''Method to return the (points x bins) array of a channel signal type as log magnitudes in decibels, 
+        used to compare the spectra of scan points. Zero magnitudes give -inf'''
+
+        matrix = np.asarray(self.get_channel_matrix(channel_signal_type))
+
+        #decibel values are already log magnitudes
+        if channel_signal_type.endswith("_db"):
+            return matrix.astype(float)
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return 20 * np.log10(np.abs(matrix))
+
+
+    def suggest_bands(self, channel_signal_type, number_of_bands, method = "kmeans", spectral_weight = BAND_SPECTRAL_WEIGHT):
+
+        '''Method to group the scan points into bands automatically instead of asking the user as in create_bands. 
+        Points are clustered on their (x, y) coordinates together with the similarity of their log magnitude spectra 
+        for the channel signal type, spectral_weight from 0 (position only) to 1 (spectra only) sets the balance. 
+        method is "kmeans", "agglomerative" or "spatial" (only neighbouring points are grouped), see band_clustering. 
+        Anomalous points are left out of every band. 
+        Updates the attributes for bands so that plot_band_averages can be called next, and returns the list of bands'''
+
+        #indices of the points that can be put in a band
+        valid_indices = np.flatnonzero(~np.isin(self.scan_point_numbers, list(self.anomalous_points)))
+
+        if len(valid_indices) == 0:
+            raise ValueError(f"All scan points in {self.scan_name[:-4]} are anomalous, no bands can be made")
+
+        #position features, scaled so that the average squared distance from the centre is 1
+        positions = np.column_stack([self.scan_point_coordinates[1], self.scan_point_coordinates[2]]).astype(float)[valid_indices]
+        position_features = positions - positions.mean(axis = 0)
+        position_features /= np.sqrt((position_features ** 2).sum(axis = 1).mean()) or 1
+
+        #spectral features, non finite values are replaced by the median of their bin
+        spectra = self.get_log_magnitude_matrix(channel_signal_type)[valid_indices]
+        is_finite = np.isfinite(spectra)
+
+        if not is_finite.all():
+
+            spectra = np.where(is_finite, spectra, np.nan)
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                bin_median = np.nanmedian(spectra, axis = 0)
+
+            spectra = np.where(is_finite, spectra, np.nan_to_num(bin_median))
+
+        spectra -= spectra.mean(axis = 0)
+
+        #keep the main principal components of the spectra so that clustering thousands of points stays fast
+        spectral_features = get_principal_scores(spectra, BAND_SPECTRAL_COMPONENTS)
+        spectral_features /= np.sqrt((spectral_features ** 2).sum(axis = 1).mean()) or 1
+
+        features = np.hstack([np.sqrt(1 - spectral_weight) * position_features, np.sqrt(spectral_weight) * spectral_features])
+
+        labels = get_cluster_labels(features, positions, number_of_bands, method)
+
+        #number the bands in order of position, left to right then bottom to top
+        number_of_clusters = labels.max() + 1
+        centres = get_group_sums(labels, positions, number_of_clusters) / np.bincount(labels, minlength = number_of_clusters)[:, None]
+        band_order = np.lexsort((centres[:, 1], centres[:, 0]))
+
+        all_bands = [[int(self.scan_point_numbers[index]) for index in valid_indices[labels == cluster]] for cluster in band_order]
+        all_bands_points = [[self.scanpoints[index] for index in valid_indices[labels == cluster]] for cluster in band_order]
+
+        #update attributes
+        self.all_bands = all_bands
+        self.all_bands_points = all_bands_points
+
+        return all_bands
 
-            
 
-    
     def get_dataset_types(self):
         
         #check datasets used and display
-        dataset_types = self.uff_file.get_set_types()
+        #set types are kept when the plane is loaded from the scan cache
+        dataset_types = self.set_types
         return dataset_types
 
     def set_anomalous_points(self, anomalous_points):
+
+        '''Method to update the attributes for anomalous points and the 2D lists of valid and anomalous point coordinates'''
+
+        #update attribute for anomalous points
         self.anomalous_points = anomalous_points
 
+        #create 2D lists for valid and anomalous points
+        scan_point_coordinates_anomalous = [[], [], [], []]
+        scan_point_coordinates_valid = [[], [], [], []]
+
+        #iterate through all the scanpoints in the measurement
+        for index in range(len(self.scan_point_coordinates[0])):
+
+            #if current scanpoint is anomalous
+            if self.scan_point_coordinates[0][index] in self.anomalous_points:
+                
+                #append current scan point coordinate details to 2D list for anomalous points
+                scan_point_coordinates_anomalous[0].append(self.scan_point_coordinates[0][index])
+                scan_point_coordinates_anomalous[1].append(self.scan_point_coordinates[1][index])
+                scan_point_coordinates_anomalous[2].append(self.scan_point_coordinates[2][index])
+                scan_point_coordinates_anomalous[3].append(self.scan_point_coordinates[3][index])
+
+            #if current scanpoint is valid
+            else:
+
+                #append current scan point coordinate details to 2D list for valid points
+                scan_point_coordinates_valid[0].append(self.scan_point_coordinates[0][index])
+                scan_point_coordinates_valid[1].append(self.scan_point_coordinates[1][index])
+                scan_point_coordinates_valid[2].append(self.scan_point_coordinates[2][index])
+                scan_point_coordinates_valid[3].append(self.scan_point_coordinates[3][index])
+
+        
+        #update attribute for 2D lists for valid and anomalous points
+        self.scan_point_coordinates_valid = scan_point_coordinates_valid
+        self.scan_point_coordinates_anomalous = scan_point_coordinates_anomalous
+
+
+    def get_anomaly_scores(self, channel_signal_type, z_threshold = ANOMALY_Z_THRESHOLD):
+
+        '''Method to return an array with, for each scan point, the fraction of frequency bins where the point is an outlier. 
+        The spectra of all points are stacked as log magnitudes and each bin is compared to the plane median of that bin, 
+        scaled by the median absolute deviation of the bin (robust z-score). 
+        Bins where the point has no finite value count as outliers, bins where all points agree are ignored'''
+
+        log_matrix = self.get_log_magnitude_matrix(channel_signal_type)
+
+        #leave out non finite values when computing the median and spread of each bin
+        finite_matrix = np.where(np.isfinite(log_matrix), log_matrix, np.nan)
+
+        #bins without any finite value give nan and a warning which is not needed here
+        with np.errstate(all = "ignore"), warnings.catch_warnings():
+
+            warnings.simplefilter("ignore", RuntimeWarning)
+            bin_median = np.nanmedian(finite_matrix, axis = 0)
+            bin_mad = np.nanmedian(np.abs(finite_matrix - bin_median), axis = 0)
+
+            #0.6745 scales the median absolute deviation to the standard deviation of normally distributed data
+            z_scores = 0.6745 * (log_matrix - bin_median) / bin_mad
+
+        #only bins with a spread can be scored
+        valid_bins = np.isfinite(bin_mad) & (bin_mad > 0)
+
+        if not valid_bins.any():
+            return np.zeros(self.number_of_scan_points)
+
+        #nan z-scores come from non finite values of the point and count as outliers
+        outlier_bins = ~(np.abs(z_scores[:, valid_bins]) <= z_threshold)
+
+        return outlier_bins.mean(axis = 1)
+
+
+    def get_flagged_points(self, channel_signal_type, z_threshold = ANOMALY_Z_THRESHOLD, bin_fraction = ANOMALY_BIN_FRACTION):
+
+        '''Method to return the list of point numbers that detect_anomalous would flag, without changing the anomalous points. 
+        A point is flagged when more than bin_fraction of its frequency bins are outliers, see get_anomaly_scores'''
+
+        #too few points to tell what a normal spectrum looks like
+        if self.number_of_scan_points < ANOMALY_MIN_POINTS:
+            return []
+
+        scores = self.get_anomaly_scores(channel_signal_type, z_threshold)
+
+        return [int(point_no) for point_no in self.scan_point_numbers[scores > bin_fraction]]
+
+    def detect_anomalous(self, channel_signal_type, z_threshold = ANOMALY_Z_THRESHOLD, bin_fraction = ANOMALY_BIN_FRACTION):
+
+        '''Method to flag anomalous scan points automatically instead of asking the user as in get_anomalous, see get_flagged_points. 
+        Updates the attributes for anomalous points like get_anomalous and returns the list of flagged point numbers'''
+
+        anomalous_points = self.get_flagged_points(channel_signal_type, z_threshold, bin_fraction)
+
+        self.set_anomalous_points(anomalous_points)
+
+        return anomalous_points
+
     def display_dataset_types(self):
 
+        #datasets are not kept when the plane is loaded from the scan cache, so read them from the UFF file
+        if self.data is None:
+            self.data = UFF_Reader(self.filepath).read_sets()
+
         #iterate through the dataset and print out the dictionary keys
         for n in range(len(self.data)): 
             print(self.data[n].keys())
@@ -1437,49 +1886,23 @@ class Measurement_Plane:
             print()
 
 
-        #update attribute for anomalous points
-        self.anomalous_points = anomalous_points_to_exclude
-
-        #create 2D lists for valid and anomalous points generated in this method
-        scan_point_coordinates_anomalous = [[], [], [], []]
-        scan_point_coordinates_valid = [[], [], [], []]
-
-        #iterate through all the scanpoints in the measurement
-        for index in range(len(self.scan_point_coordinates[0])):
-
-            #if current scanpoint is anomalous
-            if self.scan_point_coordinates[0][index] in self.anomalous_points:
-                
-                #append current scan point coordinate details to 2D list for anomalous points
-                scan_point_coordinates_anomalous[0].append(self.scan_point_coordinates[0][index])
-                scan_point_coordinates_anomalous[1].append(self.scan_point_coordinates[1][index])
-                scan_point_coordinates_anomalous[2].append(self.scan_point_coordinates[2][index])
-                scan_point_coordinates_anomalous[3].append(self.scan_point_coordinates[3][index])
-
-            #if current scanpoint is valid
-            else:
-
-                #append current scan point coordinate details to 2D list for valid points
-                scan_point_coordinates_valid[0].append(self.scan_point_coordinates[0][index])
-                scan_point_coordinates_valid[1].append(self.scan_point_coordinates[1][index])
-                scan_point_coordinates_valid[2].append(self.scan_point_coordinates[2][index])
-                scan_point_coordinates_valid[3].append(self.scan_point_coordinates[3][index])
-
-        
-        #update attribute for 2D lists for valid and anomalous points
-        self.scan_point_coordinates_valid = scan_point_coordinates_valid
-        self.scan_point_coordinates_anomalous = scan_point_coordinates_anomalous
+        #update attributes for anomalous points and the 2D lists for valid and anomalous points
+        self.set_anomalous_points(anomalous_points_to_exclude)
 
         #return list of anomalous_points_to_exclude
         return anomalous_points_to_exclude
     
     
 
-    def get_average(self, channel_signal_type: str, anomalous_indices=None):
+    def get_average(self, channel_signal_type: str, anomalous_indices=None, averaging_mode="log", aggregation="mean", weights=None):
         """
         Return a single-point graph or a Graph_average of all non-anomalous points
         for the requested channel (raw or *_db).  If every point is anomalous
-        return False.
+        return False.  averaging_mode is one of scan_point_graph.AVERAGING_MODES,
+        "log" averages the y data as given, "linear" and "power" average linear magnitudes.
+        aggregation is one of scan_point_graph.AGGREGATIONS, "median" and "trimmed" limit
+        the effect of a few bad points.  weights are for "weighted", (points x bins) or one
+        per point over self.scanpoints, by default the coherence of each point (get_coherence_matrix).
         """
 
         table = {
@@ -1517,22 +1940,163 @@ class Measurement_Plane:
                 print(f"Error: The only scan-point is anomalous in {self.scan_name[:-4]}")
             return _get_graph(self.scanpoints[0], channel_signal_type)
 
-        graphs_to_avg = [
-            _get_graph(sp, channel_signal_type)
-            for sp in self.scanpoints
-            if sp.scan_point_no not in anomalous
-        ]
+        # average the whole plane at once, each point converted to dB with its own decibel reference
+        excluded_mask = np.isin(self.scan_point_numbers, list(anomalous))
+        return self.get_masked_average(channel_signal_type, excluded_mask, list(anomalous), averaging_mode, aggregation, weights)
+    
+    def get_included_mask(self, excluded_points=None):
+        """
+        Return a boolean mask over self.scanpoints that is True for the points to include.
+        excluded_points is a boolean mask over self.scanpoints (True for excluded points)
+        or an array of indices into self.scanpoints, by default no points are excluded.
+        """
+
+        included_mask = np.ones(self.number_of_scan_points, dtype=bool)
+        if excluded_points is not None:
+            excluded_points = np.asarray(excluded_points)
+            if excluded_points.dtype == bool:
+                included_mask &= ~excluded_points
+            else:
+                included_mask[excluded_points.astype(int)] = False
+
+        return included_mask
+
+    def get_point_weights(self, weights=None):
+        """
+        Return the weights of every point in self.scanpoints for a weighted average as an array,
+        by default the coherence of each point in each bin.
+        """
+
+        if weights is None:
+            return self.get_coherence_matrix()
+
+        return np.asarray(weights, dtype=float)
+
+    def get_masked_average(self, channel_signal_type, excluded_points = None, anomalous_points_list = None, averaging_mode = "log", aggregation = "mean", weights = None):
+        """
+        Return a Graph_average of one channel (raw or *_db) computed with one reduction
+        over the (points x bins) array of the plane, without creating a graph per point.
+        excluded_points is as for get_included_mask, by default no points are excluded.
+        anomalous_points_list is the list of point numbers given in the remarks,
+        by default the point numbers of the excluded points.  averaging_mode, aggregation
+        and weights are as for get_average.  If every point is excluded return False.
+        """
 
-        # safety: should never be empty here, but guard anyway
-        if not graphs_to_avg:
+        # boolean mask of the points to average
+        included_mask = self.get_included_mask(excluded_points)
+
+        if anomalous_points_list is None:
+            anomalous_points_list = [int(point_no) for point_no in self.scan_point_numbers[~included_mask]]
+
+        if not included_mask.any():
             print(f"Error: No valid scan-points left in {self.scan_name[:-4]}")
             return False
 
-        # build averaged graph 
-        return Graph_average(graphs_to_avg, list(anomalous))
-    
+        channel = channel_signal_type.replace("_db", "")
+
+        if aggregation == "weighted":
+            weights = self.get_point_weights(weights)[included_mask]
+
+        # linear and power averages of a decibel channel average the linear ratios of the points to their decibel references
+        # and convert the average to dB, so there is one log10 per bin instead of one per point and bin
+        if channel_signal_type.endswith("_db") and averaging_mode != "log":
+            linear_ratios = np.abs(self.get_channel_matrix(channel)) / self.get_decibel_references(channel)
+            linear_average = average_y_data(linear_ratios[included_mask], averaging_mode, aggregation=aggregation, weights=weights)
+
+            if channel == "acc":
+                plane_average = array_to_decibel_2(linear_average)
+            else:
+                plane_average = array_to_decibel_1(linear_average)
+
+        # stacked y data of the averaged points, same element-wise average as Graph_average
+        else:
+            plane_average = average_y_data(self.get_channel_matrix(channel_signal_type)[included_mask], averaging_mode, aggregation=aggregation, weights=weights)
+
+        # one graph of the channel supplies the x data and labels of the average
+        first_graph = self.get_point_graph(self.scanpoints[int(np.argmax(included_mask))], channel_signal_type)
+
+        return Graph_average([first_graph], anomalous_points_list, y_data=plane_average, scan_point_no=self.scan_point_numbers[included_mask], averaging_mode=averaging_mode, aggregation=aggregation)
+
+    def start_running_average(self, channel_signal_type, excluded_points=None):
+        """
+        Start keeping a running sum and count of the included points for one channel
+        (raw or *_db), so that including or excluding one point with set_point_included
+        only costs one row of y data.  excluded_points is a boolean mask or an array of
+        indices into self.scanpoints, as for get_included_mask.  nan bins, e.g. masked bins
+        of a transfer function, are left out of the sum and count of their bin.
+        Returns the average y data, or None if every point is excluded.
+        """
+
+        included_mask = self.get_included_mask(excluded_points)
+        matrix = self.get_channel_matrix(channel_signal_type)
+        has_value = ~np.isnan(matrix)
+
+        self.running_averages[channel_signal_type] = {
+            "matrix": np.where(has_value, matrix, 0),
+            "has_value": has_value,
+            "included": included_mask,
+            "sum": np.sum(np.where(has_value, matrix, 0)[included_mask], axis=0),
+            "count": int(np.count_nonzero(included_mask)),
+            "bin_count": np.count_nonzero(has_value[included_mask], axis=0),
+        }
+
+        return self.get_running_average(channel_signal_type)
+
+    def set_point_included(self, channel_signal_type, point_index, included):
+        """
+        Include or exclude the scan point at point_index in the running average of
+        one channel started with start_running_average, and return the updated
+        average y data, or None if every point is excluded.
+        """
+
+        running = self.running_averages[channel_signal_type]
+
+        if running["included"][point_index] != included:
+            running["included"][point_index] = included
+
+            if included:
+                running["sum"] = running["sum"] + running["matrix"][point_index]
+                running["bin_count"] = running["bin_count"] + running["has_value"][point_index]
+                running["count"] += 1
+            else:
+                running["sum"] = running["sum"] - running["matrix"][point_index]
+                running["bin_count"] = running["bin_count"] - running["has_value"][point_index]
+                running["count"] -= 1
+
+            # removing a point with -inf dB values from the sum leaves nan, sum the included points again
+            if not np.isfinite(running["sum"]).all():
+                running["sum"] = np.sum(running["matrix"][running["included"]], axis=0)
+
+        return self.get_running_average(channel_signal_type)
+
+    def get_running_average(self, channel_signal_type):
+        """
+        Return the average y data of the running average of one channel,
+        or None if every point is excluded.  This is a preview, get_average
+        recomputes the average of the included points exactly.
+        """
+
+        running = self.running_averages[channel_signal_type]
+
+        if running["count"] == 0:
+            return None
+
+        # bins where no included point has a value are nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.divide(running["sum"], running["bin_count"])
+
+    def get_point_index(self):
+
+        '''Method to return the Point_Index over the x and y scan point coordinates, built on first use and then kept'''
+
+        if self.scan_point_index is None:
+            self.scan_point_index = Point_Index(self.scan_point_coordinates[1], self.scan_point_coordinates[2])
+
+        return self.scan_point_index
+
     def create_bands_gui(self, parent_frame, channel_signal_type, finish_function):
-        '''GUI method to allow user to group scan points into bands via clicks'''
+        '''GUI method to allow user to group scan points into bands via clicks, 
+        or many points at once with a rectangle or lasso selection'''
 
         # Clear parent frame
         for widget in parent_frame.winfo_children():
@@ -1561,15 +2125,23 @@ class Measurement_Plane:
         y_coords = self.scan_point_coordinates[2]
         point_numbers = self.scan_point_coordinates[0]
 
-        # Draw points
-        point_artists = []
+        # Spatial index over the points, used for every click, hover and region selection
+        point_index = self.get_point_index()
+
+        # Draw all points as one collection so a selection only changes its colour array
+        is_anomalous = np.array([point in self.anomalous_points for point in point_numbers], dtype=bool)
+        face_colours = np.tile(to_rgba("grey"), (len(point_numbers), 1))
+        face_colours[is_anomalous] = (0, 0, 0, 0)
+        points_collection = ax.scatter(x_coords, y_coords, marker='o', c=face_colours)
+        if is_anomalous.any():
+            ax.scatter(np.asarray(x_coords)[is_anomalous], np.asarray(y_coords)[is_anomalous], marker='x', c='red')
         for idx, point in enumerate(point_numbers):
-            if point in self.anomalous_points:
-                artist = ax.scatter(x_coords[idx], y_coords[idx], marker='x', c='red')
-            else:
-                artist = ax.scatter(x_coords[idx], y_coords[idx], marker='o', c='grey')
             ax.annotate(str(point), (x_coords[idx], y_coords[idx] + 0.3))
-            point_artists.append(artist)
+
+        # Ring around the point under the mouse, drawn by blitting so hovering does not redraw the figure
+        hover_marker, = ax.plot([], [], marker='o', markersize=14, markerfacecolor='none',
+                                markeredgecolor='black', linestyle='none', animated=True)
+        hover = {"idx": None, "background": None}
 
         ax.set_title(f"Define Band {band_no}")
         ax.axis("equal")
@@ -1581,16 +2153,24 @@ class Measurement_Plane:
             if event.xdata is None or event.ydata is None:
                 return None
 
-            distances = [(abs(event.xdata - x_coords[i]) ** 2 + abs(event.ydata - y_coords[i]) ** 2, i) 
-                        for i in range(len(x_coords))]
+            nearest_idx = point_index.nearest(event.xdata, event.ydata)
+            if nearest_idx is None:
+                return None
 
-            _, nearest_idx = min(distances)
             point_number = point_numbers[nearest_idx]
             return point_number, nearest_idx
 
+        def set_point_colours(indices, colour):
+            face_colours[indices] = to_rgba(colour)
+            points_collection.set_facecolors(face_colours)
+
         def on_click(event):
             nonlocal selected_band_points
 
+            # Rectangle and lasso selectors handle the mouse in their own modes
+            if mode_var.get() != "click" or event.inaxes is not ax:
+                return
+
             result = find_nearest_point(event)
             if result is None:
                 return
@@ -1607,13 +2187,71 @@ class Measurement_Plane:
 
             if point_number in selected_band_points:
                 selected_band_points.remove(point_number)
-                point_artists[idx].set_color("grey")
+                set_point_colours([idx], "grey")
             else:
                 selected_band_points.append(point_number)
                 band_color = self.band_colours[(band_no - 1) % len(self.band_colours)]
-                point_artists[idx].set_color(band_color)
+                set_point_colours([idx], band_color)
 
-            canvas.draw()
+            canvas.draw_idle()
+
+        def select_region(indices):
+            # Add every free point of a rectangle or lasso selection to the current band
+            new_indices = [idx for idx in indices
+                           if point_numbers[idx] not in self.anomalous_points
+                           and point_numbers[idx] not in points_assigned
+                           and point_numbers[idx] not in selected_band_points]
+            if not new_indices:
+                return
+
+            selected_band_points.extend(point_numbers[idx] for idx in new_indices)
+            band_color = self.band_colours[(band_no - 1) % len(self.band_colours)]
+            set_point_colours(new_indices, band_color)
+            canvas.draw_idle()
+
+        def on_rectangle(press_event, release_event):
+            if None in (press_event.xdata, press_event.ydata, release_event.xdata, release_event.ydata):
+                return
+            select_region(point_index.within_rectangle(press_event.xdata, press_event.ydata,
+                                                       release_event.xdata, release_event.ydata))
+
+        def on_lasso(vertices):
+            select_region(point_index.within_polygon(vertices))
+
+        rectangle_selector = RectangleSelector(ax, on_rectangle, useblit=True, button=[1])
+        lasso_selector = LassoSelector(ax, on_lasso, useblit=True, button=[1])
+        rectangle_selector.set_active(False)
+        lasso_selector.set_active(False)
+
+        def on_draw(event):
+            # Keep a copy of the plot without the hover ring to restore before each blit
+            hover["background"] = canvas.copy_from_bbox(ax.bbox)
+            if hover["idx"] is not None:
+                ax.draw_artist(hover_marker)
+
+        def on_motion(event):
+            if hover["background"] is None:
+                return
+
+            idx = None
+            if event.inaxes is ax and event.xdata is not None:
+                idx = point_index.nearest(event.xdata, event.ydata)
+
+                # Only highlight when the mouse is within a few pixels of the point
+                if idx is not None:
+                    x_pixel, y_pixel = ax.transData.transform((x_coords[idx], y_coords[idx]))
+                    if (x_pixel - event.x) ** 2 + (y_pixel - event.y) ** 2 > 15 ** 2:
+                        idx = None
+
+            if idx == hover["idx"]:
+                return
+            hover["idx"] = idx
+
+            canvas.restore_region(hover["background"])
+            if idx is not None:
+                hover_marker.set_data([x_coords[idx]], [y_coords[idx]])
+                ax.draw_artist(hover_marker)
+            canvas.blit(ax.bbox)
 
         def finalize_band():
             nonlocal band_no, selected_band_points
@@ -1633,7 +2271,34 @@ class Measurement_Plane:
             selected_band_points = []
             band_no += 1
             ax.set_title(f"Define Band {band_no}")
-            canvas.draw()
+            canvas.draw_idle()
+
+        def show_band_colours(bands):
+            # Colour every point by its band, free points grey
+            face_colours[~is_anomalous] = to_rgba("grey")
+            for index, band in enumerate(bands):
+                band_indices = [idx for idx, point in enumerate(point_numbers) if point in band]
+                face_colours[band_indices] = to_rgba(self.band_colours[index % len(self.band_colours)])
+            points_collection.set_facecolors(face_colours)
+            canvas.draw_idle()
+
+        def suggest_bands():
+            previous_bands = (self.all_bands, self.all_bands_points)
+            try:
+                suggested_bands = self.suggest_bands(channel_signal_type, int(number_of_bands_var.get()), method_var.get())
+            except ValueError as e:
+                messagebox.showerror("Suggest Bands", str(e))
+                return
+
+            show_band_colours(suggested_bands)
+
+            if messagebox.askyesno("Suggest Bands", f"Use these {len(suggested_bands)} suggested bands?"):
+                messagebox.showinfo("Banding Complete", f"{len(suggested_bands)} bands saved.")
+                finish_function()
+            else:
+                # Back to the bands picked so far
+                self.all_bands, self.all_bands_points = previous_bands
+                show_band_colours(all_bands + [selected_band_points])
 
         def save_and_return():
             # Convert to scan point objects
@@ -1649,17 +2314,41 @@ class Measurement_Plane:
 
             finish_function()
 
-        # Bind click
+        # Bind click, hover and redraw
         canvas.mpl_connect('button_press_event', on_click)
+        canvas.mpl_connect('motion_notify_event', on_motion)
+        canvas.mpl_connect('draw_event', on_draw)
 
         # Control panel widgets (on the right)
         center_frame = tk.Frame(control_frame)
         center_frame.pack(expand=True, anchor="center")
 
-        tk.Label(center_frame, text="Click points to add/remove\nfrom current band.").pack(pady=10)
+        tk.Label(center_frame, text="Click points to add/remove\nfrom current band,\nor drag to add many points.").pack(pady=10)
+
+        mode_var = tk.StringVar(value="click")
+
+        def set_mode():
+            rectangle_selector.set_active(mode_var.get() == "rectangle")
+            lasso_selector.set_active(mode_var.get() == "lasso")
+
+        for text, value in (("Click", "click"), ("Rectangle", "rectangle"), ("Lasso", "lasso")):
+            tk.Radiobutton(center_frame, text=text, variable=mode_var, value=value, command=set_mode).pack(anchor="w")
+
         tk.Button(center_frame, text="Next Band", bg="#4CAF50", fg="white",
                 font=("Times New Roman", 11, "bold"), command=finalize_band).pack(pady=10)
 
+        # Automatic band suggestion by clustering position and spectra
+        tk.Label(center_frame, text="Or suggest bands\nautomatically:").pack(pady=(20, 5))
+
+        number_of_bands_var = tk.StringVar(value="4")
+        tk.Spinbox(center_frame, from_=1, to=len(self.band_colours), textvariable=number_of_bands_var, width=5).pack()
+
+        method_var = tk.StringVar(value=CLUSTERING_METHODS[0])
+        tk.OptionMenu(center_frame, method_var, *CLUSTERING_METHODS).pack(pady=5)
+
+        tk.Button(center_frame, text="Suggest Bands", bg="#4CAF50", fg="white",
+                font=("Times New Roman", 11, "bold"), command=suggest_bands).pack(pady=10)
+
         return all_bands
 
 
@@ -1858,10 +2547,10 @@ class Measurement_Plane:
         #return all_bands
         return all_bands
 
-    def bands_layout(self, is_GUI=False):
+    def draw_bands_layout(self, ax):
 
-        '''Method to display scatter plot of scan points with each band differentiated by colour'''
-        plt.figure()
+        '''Method to draw the scatter plot of scan points with each band differentiated by colour on ax, 
+        a pyplot axes to display or an axes of graph_renderer.create_figure to save'''
 
         #create a counter index to iterate through self.band_colours
         colour_index = 0
@@ -1888,7 +2577,7 @@ class Measurement_Plane:
                 band_point_coordinates[3].append(self.scan_point_coordinates[3][point_index])
             
             #plot current band, select next colour from self.band_colours
-            plt.scatter(band_point_coordinates[1], band_point_coordinates[2], c = self.band_colours[colour_index], label = f"Band {colour_index + 1}")
+            ax.scatter(band_point_coordinates[1], band_point_coordinates[2], c = self.band_colours[colour_index], label = f"Band {colour_index + 1}")
 
             #increment colour index
             colour_index += 1
@@ -1898,7 +2587,7 @@ class Measurement_Plane:
         if len(self.scan_point_coordinates_anomalous[0]) > 0:
             
             #plot all anomalous scanpoints as crosses
-            plt.scatter(self.scan_point_coordinates_anomalous[1], self.scan_point_coordinates_anomalous[2], marker = "x", color = "red", label = "Anomalous")
+            ax.scatter(self.scan_point_coordinates_anomalous[1], self.scan_point_coordinates_anomalous[2], marker = "x", color = "red", label = "Anomalous")
 
 
         #iterate through all the scan points
@@ -1906,16 +2595,22 @@ class Measurement_Plane:
             
             #label each point with point number
             #annotate at a higher y-value than the point so it does not overlap
-            plt.annotate(self.scan_point_coordinates[0][point_index], (self.scan_point_coordinates[1][point_index], self.scan_point_coordinates[2][point_index]))
+            ax.annotate(self.scan_point_coordinates[0][point_index], (self.scan_point_coordinates[1][point_index], self.scan_point_coordinates[2][point_index]))
 
         #set equal scaling for both axes so that the shape of the group of points will be correct
-        plt.axis("equal")
+        ax.axis("equal")
 
         #update legend for the plot to show band numbers
-        plt.legend(loc = "best")
+        ax.legend(loc = "best")
+
+    def bands_layout(self, is_GUI=False):
+
+        '''Method to display scatter plot of scan points with each band differentiated by colour and save it as a photo, 
+        the photo is drawn on an Agg figure, see graph_renderer'''
 
         if not is_GUI:
             #show plot but allow program to continue executing even when figure is open
+            self.draw_bands_layout(plt.figure().add_subplot())
             plt.show(block = False)
 
         #use this to get the message box and file dialog to show as top windows later
@@ -1952,122 +2647,93 @@ class Measurement_Plane:
                 valid_filename = False
 
         #save as the plot as a png image
-        plt.savefig(user_photo_filename, dpi=300, bbox_inches="tight")
-
-    def plot_band_averages(self, channel_signal_type):
+        layout_figure = create_figure()
+        self.draw_bands_layout(layout_figure.add_subplot())
+        save_figure(layout_figure, user_photo_filename)
 
-        '''Method to create average graph objects for each band, and store in a list and return the list.'''
+    def get_band_labels(self):
 
-        #list to store bands, each band as a list of their points with the required channel signal
-        all_bands_channel_signal = []
-
-        #iterate through all the bands that have been defined
-        for band in self.all_bands_points:
-            
-            #list to store the required channel signal graph for all the points in this band
-            band_channel_signal = []
-            
-            #iterate through each scan point object in the current band
-            for point in band:
+        '''Method to return an array with the band index of each scan point, in the order of self.scanpoints. 
+        Points that are not in any band are labelled -1'''
 
-                #append the required channel signal graph for the point to the list for this band
-                match channel_signal_type:
+        labels = np.full(self.number_of_scan_points, -1)
 
-                    case "disp":
-            
-                        band_channel_signal.append(point.disp)
+        for band_index, band in enumerate(self.all_bands_points):
+            labels[[point.point_index for point in band]] = band_index
 
-                    case "vib":
-            
-                        band_channel_signal.append(point.vib)
+        return labels
 
-                    case "acc":
-            
-                        band_channel_signal.append(point.acc)
+    def get_band_statistics(self, channel_signal_type, spread=False):
 
-                    case "ref1":
+        '''Method to compute the average of every band in one grouped reduction over the (points x bins) array of the plane, 
+        using the band label of each point instead of a graph per point. 
+        Returns a dictionary with the (bands x bins) arrays "mean" and the number of points "count" of each band, 
+        with spread also the standard deviation "std" and the envelope "min" and "max" of each band'''
 
-                        band_channel_signal.append(point.ref1)
+        matrix = self.get_channel_matrix(channel_signal_type)
 
-                    case "ref2":
-            
-                        band_channel_signal.append(point.ref2)
+        #complex y data is averaged as magnitudes, as in Graph_average
+        if np.iscomplexobj(matrix):
+            matrix = np.abs(matrix)
 
-                    case "ref3":
-            
-                        band_channel_signal.append(point.ref3)
+        number_of_bands = len(self.all_bands_points)
 
-                    case "h1vibref1":
-            
-                        band_channel_signal.append(point.h1vibref1)
+        #only the points in a band take part
+        labels = self.get_band_labels()
+        in_band = labels >= 0
+        labels = labels[in_band]
+        matrix = matrix[in_band]
 
-                    case "h2vibref1":
-            
-                        band_channel_signal.append(point.h2vibref1)
+        counts = np.bincount(labels, minlength=number_of_bands)
 
-                    case "vibref1":
-            
-                        band_channel_signal.append(point.create_vibref1())
+        #nan bins, e.g. masked bins of a transfer function, are left out of the sums and counts of their band
+        has_value = ~np.isnan(matrix)
+        bin_counts = np.zeros((number_of_bands, matrix.shape[1]))
+        np.add.at(bin_counts, labels, has_value)
 
-                    case "vibref2":
-            
-                        band_channel_signal.append(point.create_vibref2())
-            
-                    case "vibref3":
-            
-                        band_channel_signal.append(point.create_vibref3())
+        sums = np.zeros((number_of_bands, matrix.shape[1]))
+        np.add.at(sums, labels, np.where(has_value, matrix, 0))
 
-                    case "disp_db":
-            
-                        band_channel_signal.append(point.create_disp_decibel())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = sums / bin_counts
 
-                    case "vib_db":
-            
-                        band_channel_signal.append(point.create_vib_decibel())
+        statistics = {"mean": means, "count": counts}
 
-                    case "acc_db":
-            
-                        band_channel_signal.append(point.create_acc_decibel())
+        if spread:
 
-                    case "ref1_db":
+            #second pass over the deviations from the band mean, to avoid the rounding of the sum of squares method
+            squared_deviations = np.zeros((number_of_bands, matrix.shape[1]))
+            np.add.at(squared_deviations, labels, np.where(has_value, matrix - means[labels], 0) ** 2)
 
-                        band_channel_signal.append(point.create_ref1_decibel())
+            with np.errstate(divide="ignore", invalid="ignore"):
+                statistics["std"] = np.sqrt(squared_deviations / bin_counts)
 
-                    case "ref2_db":
-            
-                        band_channel_signal.append(point.create_ref2_decibel())
+            minimums = np.full((number_of_bands, matrix.shape[1]), np.inf)
+            maximums = np.full((number_of_bands, matrix.shape[1]), -np.inf)
+            np.minimum.at(minimums, labels, np.where(has_value, matrix, np.inf))
+            np.maximum.at(maximums, labels, np.where(has_value, matrix, -np.inf))
+            statistics["min"] = np.where(bin_counts > 0, minimums, np.nan)
+            statistics["max"] = np.where(bin_counts > 0, maximums, np.nan)
 
-                    case "ref3_db":
-            
-                        band_channel_signal.append(point.create_ref3_decibel())
+        return statistics
 
-                    case "h1vibref1_db":
-            
-                        band_channel_signal.append(point.create_h1vibref1_decibel())
+    def plot_band_averages(self, channel_signal_type, spread=False):
 
-                    case "h2vibref1_db":
-            
-                        band_channel_signal.append(point.create_h2vibref1_decibel())
+        '''Method to create average graph objects for each band, and store in a list and return the list. 
+        All the bands are averaged at once, see get_band_statistics. 
+        With spread the standard deviation and min/max envelope of each band are kept in self.band_spread 
+        so that get_band_averages_plot can draw them'''
 
-                    case "vibref1_db":
-            
-                        band_channel_signal.append(point.create_vibref1_decibel())
+        statistics = self.get_band_statistics(channel_signal_type, spread)
 
-                    case "vibref2_db":
-            
-                        band_channel_signal.append(point.create_vibref2_decibel())
-            
-                    case "vibref3_db":
-            
-                        band_channel_signal.append(point.create_vibref3_decibel())
-
-
-            #append the list of graph objects for this band into all_bands_channel_signal
-            all_bands_channel_signal.append(band_channel_signal)
+        #create a list of average graph objects for each band, no anomalous points in the bands, set scan name as Band (band number)
+        #one graph of the first point of each band supplies the x data and labels
+        band_averages = []
 
+        for index, band in enumerate(self.all_bands_points):
 
-        #create a list of average graph objects for each band, no anomalous points in the bands, set scan name as Band (band number)
-        band_averages = [Graph_average(all_bands_channel_signal[index], [], scan_name=f"Band {index+1}") for index in range(len(all_bands_channel_signal))]
+            first_graph = self.get_point_graph(band[0], channel_signal_type)
+            band_averages.append(Graph_average([first_graph], [], scan_name=f"Band {index+1}", y_data=statistics["mean"][index], scan_point_no=[point.scan_point_no for point in band]))
 
         #create a list of remarks, one for for each band
         #indicate color of band as shown on scan layout, as well as the scanpoints included in the band
@@ -2076,10 +2742,25 @@ class Measurement_Plane:
         #update attributes
         self.band_averages = band_averages
         self.band_remarks = remarks_list
+        self.band_spread = statistics if spread else None
 
         #return band_averages
         return band_averages
 
+    def get_point_graph(self, point, channel_signal_type):
+
+        '''Method to return the graph of one scan point for any channel signal type used by get_average'''
+
+        channel = channel_signal_type.replace("_db", "")
+
+        if channel_signal_type.endswith("_db"):
+            return getattr(point, f"create_{channel}_decibel")()
+
+        if channel in CHANNELS:
+            return getattr(point, channel)
+
+        return getattr(point, f"create_{channel}")()
+
     def get_band_averages(self, channel_signal_type, is_GUI=False):
         
         '''Initialise anomalous points and return list of band averages graph'''
@@ -2151,17 +2832,35 @@ class Measurement_Plane:
         #return just file name without folder directory and extension
         return file_name_without_extension
 
-    def get_band_averages_plot(self, channel_signal_type):
-        '''Returns matplotlib figure for band average comparison.'''
+    def get_band_averages_plot(self, channel_signal_type, envelope=None, figure=None):
+        '''Returns matplotlib figure for band average comparison. 
+        envelope "std" shades one standard deviation either side of each band average, 
+        "minmax" shades between the lowest and highest point of each band. 
+        The plot is drawn on figure, e.g. from graph_renderer.create_figure to save it, by default on a new pyplot figure'''
 
         tick_locations = [100, 200, 500, 1000, 2000, 5000, 10000]
-        fig, ax = plt.subplots()
+
+        if figure is None:
+            fig, ax = plt.subplots()
+        else:
+            fig, ax = figure, figure.add_subplot()
+
+        # Spread of the bands is only computed when an envelope is drawn
+        if envelope is not None and self.band_spread is None:
+            self.band_spread = self.get_band_statistics(channel_signal_type, spread=True)
 
         for index in range(len(self.band_averages)):
             band = self.band_averages[index]
-            ax.plot(band.x_data, band.y_data,
-                    label=f"{band.scan_name} Average",
-                    color=self.band_colours[index])
+            plot_decimated(ax, band.x_data, band.y_data,
+                           label=f"{band.scan_name} Average",
+                           color=self.band_colours[index])
+
+            if envelope == "std":
+                ax.fill_between(band.x_data, band.y_data - self.band_spread["std"][index], band.y_data + self.band_spread["std"][index],
+                                color=self.band_colours[index], alpha=0.2, linewidth=0)
+            elif envelope == "minmax":
+                ax.fill_between(band.x_data, self.band_spread["min"][index], self.band_spread["max"][index],
+                                color=self.band_colours[index], alpha=0.2, linewidth=0)
 
         ax.set_xscale("log", base=2)
         ax.xaxis.set_major_locator(tick.FixedLocator(tick_locations))
@@ -2219,17 +2918,133 @@ class Measurement_Plane:
                 #repeat the prompt for user to choose a filename
                 valid_filename = False
 
-        fig, _ = self.get_band_averages_plot(channel_signal_type)
-        fig.savefig(user_photo_filename, dpi=300, bbox_inches="tight")
+        # Save the photo from an Agg figure, the pyplot figure is only made to display the plot
+        fig, _ = self.get_band_averages_plot(channel_signal_type, figure=create_figure())
+        save_figure(fig, user_photo_filename)
         if not is_GUI:
+            self.get_band_averages_plot(channel_signal_type)
             plt.show()
         return fig
 
 
 
+#default number of worker processes used by load_measurement_planes
+#None uses one worker per CPU, 1 loads the files one after another in this process
+DEFAULT_LOAD_WORKERS = None
+
+#process pool kept for the life of the program by get_load_pool, so that starting the workers is only paid once. 
+#on windows each worker imports the main script again, e.g. all of gui.py with tkinter and matplotlib, which takes about a second
+_load_pool = None
+_load_pool_workers = None
+
+
+def get_load_pool(max_workers = DEFAULT_LOAD_WORKERS):
+
+    '''Return the process pool of load_measurement_planes, started on first use and reused afterwards. 
+    A pool with a different number of workers replaces the old one'''
+
+    global _load_pool, _load_pool_workers
+
+    if _load_pool is None or _load_pool_workers != max_workers:
+
+        shutdown_load_pool()
+
+        _load_pool = ProcessPoolExecutor(max_workers = max_workers)
+        _load_pool_workers = max_workers
+
+    return _load_pool
+
+
+def start_load_pool(max_workers = DEFAULT_LOAD_WORKERS):
+
+    '''Start the workers of the load pool in the background, e.g. when the GUI opens, 
+    so that they have started by the time files are chosen. Does nothing on a single CPU'''
+
+    if max_workers == 1 or (os.cpu_count() or 1) == 1:
+        return
+
+    pool = get_load_pool(max_workers)
+
+    #the pool only starts a worker when a task is waiting, so give each worker a task that does nothing
+    for _ in range(max_workers or os.cpu_count()):
+        pool.submit(os.getpid)
+
+
+def shutdown_load_pool():
+
+    '''Stop the workers of the load pool, if it was started'''
+
+    global _load_pool, _load_pool_workers
+
+    if _load_pool is not None:
+        _load_pool.shutdown(cancel_futures = True)
+
+    _load_pool = None
+    _load_pool_workers = None
+
+
+def load_measurement_planes(filepaths, number_graphs = 8, use_cache = True, max_workers = DEFAULT_LOAD_WORKERS, progress_callback = None):
+
+    '''Load one Measurement_Plane per filepath and return them in the same order as filepaths. 
+    Files that are not in the scan cache are read concurrently in the pool of max_workers processes from get_load_pool. 
+    progress_callback(number_loaded, number_of_files, filepath) is called in this process after each file is loaded'''
+
+    planes = [None] * len(filepaths)
+    number_loaded = 0
+
+    def plane_loaded(index, plane):
+
+        nonlocal number_loaded
+
+        planes[index] = plane
+        number_loaded += 1
+
+        if progress_callback is not None:
+            progress_callback(number_loaded, len(filepaths), filepaths[index])
+
+    #files already in the scan cache are memory-mapped in a few milliseconds, only parse the rest in the pool
+    to_parse = []
+
+    for index, filepath in enumerate(filepaths):
+
+        if use_cache and scan_cache.default_cache.contains(filepath, number_graphs):
+            plane_loaded(index, Measurement_Plane(filepath, number_graphs, use_cache))
+
+        else:
+            to_parse.append(index)
+
+    #nothing runs in parallel for a single file or a single CPU
+    if max_workers == 1 or (os.cpu_count() or 1) == 1 or len(to_parse) < 2:
+
+        for index in to_parse:
+            plane_loaded(index, Measurement_Plane(filepaths[index], number_graphs, use_cache))
+
+        return planes
+
+    #workers only read the datasets, the planes are built and saved to the scan cache in this process
+    pool = get_load_pool(max_workers)
+
+    futures = {pool.submit(read_uff_sets, filepaths[index]): index for index in to_parse}
+
+    for future in as_completed(futures):
+
+        index = futures[future]
+        plane_loaded(index, Measurement_Plane(filepaths[index], number_graphs, use_cache, uff_sets = future.result()))
+
+    return planes
+
+
+
 #tester code for displaying scan point locations
 if __name__ == "__main__":
 
     measurement_plane = Measurement_Plane("Measurement\\LaserVibrometerPythonAnalyser\\laser_vibrometer_scans\\RAI-DU Top.uff")
 
-    measurement_plane.compare_band_averages_plot("vibref1_db")
\ No newline at end of file
+    measurement_plane.compare_band_averages_plot("vibref1_db")
+
+    #check the octave reduction of the whole plane against Graph_octave of each scan point graph
+    octave_x, octave_matrix = measurement_plane.get_octave_matrix("vibref1_db", 3, "smooth")
+
+    for scan_point, octave_row in zip(measurement_plane.scanpoints, octave_matrix):
+        octave_graph = Graph_octave(scan_point.create_vibref1_decibel(), 3, "smooth")
+        print(scan_point.scan_point_no, np.array_equal(octave_graph.x_data, octave_x) and np.allclose(octave_graph.y_data, octave_row, equal_nan = True))
\ No newline at end of file
@@ -0,0 +1,152 @@
+import numpy as np
+from matplotlib.path import Path
+
+
+#class for a uniform grid index over 2D scan point coordinates
+#built once per plane so that picking points does not scan every point on each mouse event
+class Point_Index:
+
+    def __init__(self, x_coords, y_coords, cell_size = None):
+        '''Points are sorted by the grid cell they fall in, so that the points of a row of cells are contiguous.
+        By default the cell size gives about one point per cell'''
+
+        self.x = np.asarray(x_coords, dtype = float)
+        self.y = np.asarray(y_coords, dtype = float)
+
+        self.number_of_points = len(self.x)
+
+        if self.number_of_points == 0:
+            self.x_min = self.y_min = 0.0
+            width = height = 0.0
+
+        else:
+            self.x_min, self.y_min = self.x.min(), self.y.min()
+            width, height = self.x.max() - self.x_min, self.y.max() - self.y_min
+
+        if cell_size is None:
+
+            #about one point per cell for points spread over an area
+            if width > 0 and height > 0:
+                cell_size = np.sqrt(width * height / self.number_of_points)
+
+            #points on a line or all at the same place
+            else:
+                cell_size = max(width, height) / max(self.number_of_points, 1) or 1.0
+
+        self.cell_size = float(cell_size)
+
+        self.number_columns = int(width // self.cell_size) + 1
+        self.number_rows = int(height // self.cell_size) + 1
+
+        #grid cell of every point
+        cell_columns, cell_rows = self._get_cells(self.x, self.y)
+        cell_ids = cell_rows * self.number_columns + cell_columns
+
+        #point indices sorted by cell, the points of cell c are self.order[self.cell_start[c]:self.cell_start[c + 1]]
+        self.order = np.argsort(cell_ids, kind = "stable")
+        self.cell_start = np.searchsorted(cell_ids[self.order], np.arange(self.number_rows * self.number_columns + 1))
+
+
+    def _get_cells(self, x, y):
+
+        '''Return the (column, row) of the grid cells holding the coordinates, clipped to the grid'''
+
+        columns = np.clip(((np.asarray(x) - self.x_min) // self.cell_size).astype(int), 0, self.number_columns - 1)
+        rows = np.clip(((np.asarray(y) - self.y_min) // self.cell_size).astype(int), 0, self.number_rows - 1)
+
+        return columns, rows
+
+
+    def _get_points_in_cells(self, column_min, column_max, row_min, row_max):
+
+        '''Return the indices of the points in a block of cells, one contiguous slice per row of cells'''
+
+        column_min, row_min = max(column_min, 0), max(row_min, 0)
+        column_max, row_max = min(column_max, self.number_columns - 1), min(row_max, self.number_rows - 1)
+
+        if column_min > column_max or row_min > row_max:
+            return np.array([], dtype = int)
+
+        slices = [self.order[self.cell_start[row * self.number_columns + column_min]:self.cell_start[row * self.number_columns + column_max + 1]]
+                  for row in range(row_min, row_max + 1)]
+
+        return np.concatenate(slices)
+
+
+    def nearest(self, x, y):
+
+        '''Return the index of the point closest to (x, y), or None if there are no points.
+        Only the cells in growing squares around (x, y) are searched, the square doubles in size on each pass'''
+
+        if self.number_of_points == 0:
+            return None
+
+        column, row = self._get_cells(x, y)
+        radius = 0
+
+        while True:
+
+            column_min, column_max = column - radius, column + radius
+            row_min, row_max = row - radius, row + radius
+
+            candidates = self._get_points_in_cells(column_min, column_max, row_min, row_max)
+
+            #distance from (x, y) to the nearest side of the searched square that does not lie on the edge of the grid,
+            #every point that has not been searched is at least this far away
+            open_sides = []
+
+            if column_min > 0:
+                open_sides.append(x - (self.x_min + column_min * self.cell_size))
+            if column_max < self.number_columns - 1:
+                open_sides.append(self.x_min + (column_max + 1) * self.cell_size - x)
+            if row_min > 0:
+                open_sides.append(y - (self.y_min + row_min * self.cell_size))
+            if row_max < self.number_rows - 1:
+                open_sides.append(self.y_min + (row_max + 1) * self.cell_size - y)
+
+            if len(candidates) > 0:
+
+                distances = (self.x[candidates] - x) ** 2 + (self.y[candidates] - y) ** 2
+                best = np.argmin(distances)
+
+                if not open_sides or distances[best] <= min(open_sides) ** 2:
+                    return int(candidates[best])
+
+            #grow the square quickly so that clicks far from the points need only a few passes
+            radius = max(2 * radius, 1)
+
+
+    def within_rectangle(self, x0, y0, x1, y1):
+
+        '''Return the sorted indices of the points inside the rectangle with corners (x0, y0) and (x1, y1)'''
+
+        x_low, x_high = min(x0, x1), max(x0, x1)
+        y_low, y_high = min(y0, y1), max(y0, y1)
+
+        (column_min, column_max), (row_min, row_max) = self._get_cells([x_low, x_high], [y_low, y_high])
+
+        candidates = self._get_points_in_cells(column_min, column_max, row_min, row_max)
+
+        inside = (self.x[candidates] >= x_low) & (self.x[candidates] <= x_high) & (self.y[candidates] >= y_low) & (self.y[candidates] <= y_high)
+
+        return np.sort(candidates[inside])
+
+
+    def within_polygon(self, vertices):
+
+        '''Return the sorted indices of the points inside the polygon given as a list of (x, y) vertices, e.g. from a lasso'''
+
+        vertices = np.asarray(vertices, dtype = float)
+
+        if len(vertices) < 3:
+            return np.array([], dtype = int)
+
+        #only test the points inside the bounding box of the polygon
+        candidates = self.within_rectangle(vertices[:, 0].min(), vertices[:, 1].min(), vertices[:, 0].max(), vertices[:, 1].max())
+
+        if len(candidates) == 0:
+            return candidates
+
+        inside = Path(vertices).contains_points(np.column_stack([self.x[candidates], self.y[candidates]]))
+
+        return candidates[inside]
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+
+
+#bump when the layout of a cache entry changes so that old entries are parsed again
+CACHE_VERSION = 2
+
+#default folder for the cache, kept in the local app data folder on windows
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.environ.get("LOCALAPPDATA", os.path.join(os.path.expanduser("~"), ".cache")), "Laser Vibrometer Analyser", "scan_cache")
+
+#default size cap of the cache in megabytes
+DEFAULT_MAX_SIZE_MB = 1024
+
+
+#class for a persistent on-disk cache of parsed measurement planes
+#each entry is a folder of .npy arrays plus a metadata.json file, named after the content hash of the UFF file
+class Scan_Cache:
+
+    def __init__(self, cache_directory = DEFAULT_CACHE_DIRECTORY, max_size_mb = DEFAULT_MAX_SIZE_MB):
+        '''Cache entries are looked up by the content hash of the UFF file.
+        The content hash of a file is only recomputed when its size or modification time changes.
+        Least recently used entries are removed once the cache grows past max_size_mb'''
+
+        self.cache_directory = cache_directory
+        self.max_size_mb = max_size_mb
+
+        #file mapping UFF filepaths to their size, modification time and content hash
+        self.index_path = os.path.join(self.cache_directory, "index.json")
+
+
+    def _read_index(self):
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                return json.load(index_file)
+
+        #no index yet or index was corrupted, start a new one
+        except (OSError, ValueError):
+            return {}
+
+
+    def _write_index(self, index):
+
+        #write to a temporary file first so that a crash never leaves a half written index
+        temporary_path = self.index_path + f".{os.getpid()}.tmp"
+
+        with open(temporary_path, "w", encoding="utf-8") as index_file:
+            json.dump(index, index_file)
+
+        os.replace(temporary_path, self.index_path)
+
+
+    def get_key(self, filepath, number_graphs):
+
+        '''Return the name of the cache entry for a UFF file,
+        made from the content hash of the file and the number of graphs per scan point'''
+
+        filepath = os.path.abspath(filepath)
+        file_stat = os.stat(filepath)
+
+        index = self._read_index()
+        record = index.get(filepath)
+
+        #reuse the stored content hash if the file size and modification time have not changed
+        if record is not None and record["size"] == file_stat.st_size and record["mtime_ns"] == file_stat.st_mtime_ns:
+            content_hash = record["hash"]
+
+        else:
+
+            #hash the file contents in chunks
+            hasher = hashlib.sha1()
+
+            with open(filepath, "rb") as uff_file:
+                for chunk in iter(lambda: uff_file.read(1 << 20), b""):
+                    hasher.update(chunk)
+
+            content_hash = hasher.hexdigest()
+
+            #remember the hash for this file
+            index[filepath] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "hash": content_hash}
+
+            try:
+                os.makedirs(self.cache_directory, exist_ok = True)
+                self._write_index(index)
+
+            except OSError:
+                pass
+
+        return f"{content_hash}_{number_graphs}"
+
+
+    def load(self, filepath, number_graphs):
+
+        '''Return (arrays, metadata) stored for the UFF file, or None if the file is not in the cache.
+        Arrays are memory-mapped read-only, so their data is only read from disk when it is used'''
+
+        try:
+            entry_directory = os.path.join(self.cache_directory, self.get_key(filepath, number_graphs))
+
+            with open(os.path.join(entry_directory, "metadata.json"), "r", encoding="utf-8") as metadata_file:
+                metadata = json.load(metadata_file)
+
+            #entry was written by an older version of the cache
+            if metadata.get("cache_version") != CACHE_VERSION:
+                return None
+
+            arrays = {name: np.load(os.path.join(entry_directory, f"{name}.npy"), mmap_mode = "r") for name in metadata["arrays"]}
+
+            #mark the entry as recently used for LRU eviction
+            os.utime(entry_directory)
+
+        #entry is missing or incomplete
+        except (OSError, ValueError, KeyError):
+            return None
+
+        return arrays, metadata
+
+
+    def contains(self, filepath, number_graphs):
+
+        '''Return True if the UFF file has an up to date entry in the cache, without loading its arrays'''
+
+        try:
+            entry_directory = os.path.join(self.cache_directory, self.get_key(filepath, number_graphs))
+
+            with open(os.path.join(entry_directory, "metadata.json"), "r", encoding="utf-8") as metadata_file:
+                return json.load(metadata_file).get("cache_version") == CACHE_VERSION
+
+        except (OSError, ValueError):
+            return False
+
+
+    def store(self, filepath, number_graphs, arrays, metadata):
+
+        '''Save the arrays and metadata of a parsed UFF file, then evict old entries if the cache is too big'''
+
+        try:
+            key = self.get_key(filepath, number_graphs)
+            entry_directory = os.path.join(self.cache_directory, key)
+
+            #write into a temporary folder, then rename so that readers never see a half written entry
+            temporary_directory = entry_directory + f".{os.getpid()}.tmp"
+            os.makedirs(temporary_directory, exist_ok = True)
+
+            for name, array in arrays.items():
+                np.save(os.path.join(temporary_directory, f"{name}.npy"), array)
+
+            metadata = dict(metadata, cache_version = CACHE_VERSION, arrays = list(arrays))
+
+            with open(os.path.join(temporary_directory, "metadata.json"), "w", encoding="utf-8") as metadata_file:
+                json.dump(metadata, metadata_file)
+
+            #replace any previous entry for the same key
+            if os.path.isdir(entry_directory):
+                shutil.rmtree(entry_directory, ignore_errors = True)
+
+            os.replace(temporary_directory, entry_directory)
+
+        #caching is best effort, failing to write must never stop a file from loading
+        except OSError as e:
+            print(f"⚠️ Warning: Could not write scan cache entry for {os.path.basename(filepath)}: {e}")
+            return
+
+        self.evict(keep = key)
+
+
+    def get_entries(self):
+
+        '''Return a list of (last used time, size in bytes, entry folder) for all entries in the cache'''
+
+        entries = []
+
+        try:
+            names = os.listdir(self.cache_directory)
+
+        except OSError:
+            return entries
+
+        for name in names:
+
+            entry_directory = os.path.join(self.cache_directory, name)
+
+            #skip the index file and temporary folders still being written
+            if not os.path.isdir(entry_directory) or name.endswith(".tmp"):
+                continue
+
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_directory) if entry.is_file())
+            entries.append((os.stat(entry_directory).st_mtime, size, entry_directory))
+
+        return entries
+
+
+    def evict(self, keep = None):
+
+        '''Remove least recently used entries until the cache is within max_size_mb'''
+
+        entries = sorted(self.get_entries())
+        total_size = sum(size for _, size, _ in entries)
+        max_size = self.max_size_mb * 1024 * 1024
+
+        for _, size, entry_directory in entries:
+
+            if total_size <= max_size:
+                break
+
+            #never evict the entry that was just written
+            if os.path.basename(entry_directory) == keep:
+                continue
+
+            #entries still memory-mapped by an open plane cannot be removed on windows and are skipped
+            shutil.rmtree(entry_directory, ignore_errors = True)
+            total_size -= size
+
+
+    def clear(self):
+
+        '''Remove every entry and the index from the cache'''
+
+        shutil.rmtree(self.cache_directory, ignore_errors = True)
+
+
+#cache shared by all Measurement_Plane objects
+#replace with another Scan_Cache to change the folder or size cap
+default_cache = Scan_Cache()
@@ -2,23 +2,29 @@ import matplotlib.pyplot as plt
 import numpy as np
 from scan_point_graph import Graph, Graph_decibel, Graph_quotient
 import data_tools as dt
+from functools import cached_property
+
+#channel signal types stored for each scan point, in the order they appear in the UFF file
+CHANNELS = ["disp", "vib", "acc", "ref1", "ref2", "ref3", "h1vibref1", "h2vibref1"]
 
 #class for one scan point
 class Scan_Point:
 
-    def __init__(self, scan_point_all_graphs, disp_decibel_reference = 1, vib_decibel_reference = 1, acc_decibel_reference = 1, ref1_decibel_reference = 0.00002, ref2_decibel_reference = 1, ref3_decibel_reference = 1, h1vibref1_decibel_reference = 50000, h2vibref1_decibel_reference = 50000, vibref1_decibel_reference = 50000, vibref2_decibel_reference = 1, vibref3_decibel_reference = 1):
-        '''Take in a list of all graphs relating to one scan point in the order: 
+    def __init__(self, measurement_plane, point_index, disp_decibel_reference = 1, vib_decibel_reference = 1, acc_decibel_reference = 1, ref1_decibel_reference = 0.00002, ref2_decibel_reference = 1, ref3_decibel_reference = 1, h1vibref1_decibel_reference = 50000, h2vibref1_decibel_reference = 50000, vibref1_decibel_reference = 50000, vibref2_decibel_reference = 1, vibref3_decibel_reference = 1):
+        '''Take in the Measurement_Plane the scan point belongs to and the index of the scan point in the plane. 
+        The graphs of the scan point are views over row point_index of the plane's channel data in the order: 
         Vib Displacement (disp), Vib Velocity (vib), Vib Acceleration (acc), 
         Ref1, Ref2, Ref3, H1 Vib & Ref1, H2 Vib & Ref1. 
         Optional to specify decibel reference values. 
         Default decibel reference value is 1, except for ref1 sound pressure level which is 20 micro pascals'''
 
 
-        #attribute for list of all graph data for this scan point
-        self.scan_point_all_graphs = scan_point_all_graphs
+        #attributes for the plane holding the data and the row of this scan point in the plane
+        self.measurement_plane = measurement_plane
+        self.point_index = point_index
 
         #attribute storing number of graphs for this scan point
-        self.number_of_graphs = len(self.scan_point_all_graphs)
+        self.number_of_graphs = len(CHANNELS)
 
         #attributes for decibel reference values
         self.disp_decibel_reference = disp_decibel_reference
@@ -34,22 +40,17 @@ class Scan_Point:
         self.vibref3_decibel_reference = vibref3_decibel_reference
 
         #attribute for scan point number using scan point of disp graph
-        self.scan_point_no = int(self.scan_point_all_graphs[0]["rsp_node"])
-
-        #initialise a Graph object for each type of graph for the scan point
-        self.disp = Graph(self.scan_point_all_graphs[0])
-        self.vib = Graph(self.scan_point_all_graphs[1])
-        self.acc = Graph(self.scan_point_all_graphs[2])
-        self.ref1 = Graph(self.scan_point_all_graphs[3])
-        self.ref2 = Graph(self.scan_point_all_graphs[4])
-        self.ref3 = Graph(self.scan_point_all_graphs[5])
-        self.h1vibref1 = Graph(self.scan_point_all_graphs[6])
-        self.h2vibref1 = Graph(self.scan_point_all_graphs[7])
+        self.scan_point_no = int(self.measurement_plane.scan_point_numbers[self.point_index])
+
+        #Graph objects for each type of graph for the scan point (disp, vib, acc, ref1, ref2, ref3, h1vibref1, h2vibref1)
+        #are only created when the attribute is first accessed, see the cached properties below
+        #each Graph is a view over the plane's channel data, so only the channels used are read from the scan cache
         
         #attributes to store transfer function graph
         #the graph division is only done when the method for transfer function is called
         #only then will the converted graph be linked to these attributes
         #this is to reduce the processing needed as graph division will be only done on request
+        #once created the graph is reused by later calls since the raw graphs never change
         self.vibref1 = None
         self.vibref2 = None
         self.vibref3 = None
@@ -58,11 +59,13 @@ class Scan_Point:
         #the decibel conversion is only done when the method for conversion is called
         #only then will the converted graph be linked to these attributes
         #this is to reduce the processing needed as decibel conversion will be only done on request
+        #once created the graph is reused by later calls until the decibel reference of the channel changes
         self.disp_decibel = None
         self.vib_decibel = None
         self.acc_decibel = None
         self.ref1_decibel = None
         self.ref2_decibel = None
+        self.ref3_decibel = None
         self.h1vibref1_decibel = None
         self.h2vibref1_decibel = None
         self.vibref1_decibel = None
@@ -70,11 +73,102 @@ class Scan_Point:
         self.vibref3_decibel = None
 
 
+    def get_graph(self, channel_signal_type):
+
+        '''Return a Graph for one raw channel of this scan point, e.g. "vib",
+        using the channel labels shared by all the scan points of the plane'''
+
+        channel = CHANNELS.index(channel_signal_type)
+
+        return Graph(self.measurement_plane.channel_info[channel], self.measurement_plane.channel_data[self.point_index, channel], self.scan_point_no)
+
+
+    #raw graphs of the scan point, created on first access
+    @cached_property
+    def disp(self):
+        return self.get_graph("disp")
+
+    @cached_property
+    def vib(self):
+        return self.get_graph("vib")
+
+    @cached_property
+    def acc(self):
+        return self.get_graph("acc")
+
+    @cached_property
+    def ref1(self):
+        return self.get_graph("ref1")
+
+    @cached_property
+    def ref2(self):
+        return self.get_graph("ref2")
+
+    @cached_property
+    def ref3(self):
+        return self.get_graph("ref3")
+
+    @cached_property
+    def h1vibref1(self):
+        return self.get_graph("h1vibref1")
+
+    @cached_property
+    def h2vibref1(self):
+        return self.get_graph("h2vibref1")
+
+
+    @property
+    def scan_point_all_graphs(self):
+
+        #list of all the raw graphs for this scan point in channel order
+        return [self.disp, self.vib, self.acc, self.ref1, self.ref2, self.ref3, self.h1vibref1, self.h2vibref1]
+
+
+    def get_decibel_graph(self, channel_signal_type, decibel_type = 1):
+
+        '''Return the decibel graph of a channel, e.g. "vib" or "vibref1". 
+        The conversion is only done if there is no decibel graph for the channel yet 
+        or it was converted with a different decibel reference'''
+
+        reference = getattr(self, f"{channel_signal_type}_decibel_reference")
+        decibel_graph = getattr(self, f"{channel_signal_type}_decibel")
+
+        if decibel_graph is None or decibel_graph.reference != reference:
+
+            #initialise a new Graph_decibel object with the channel converted to decibel
+            #save the new object under the respective attribute
+            decibel_graph = Graph_decibel(getattr(self, channel_signal_type), decibel_type, reference)
+            setattr(self, f"{channel_signal_type}_decibel", decibel_graph)
+
+        return decibel_graph
+
+
+    def set_decibel_reference(self, channel_signal_type, reference):
+
+        '''Change the decibel reference of a channel, e.g. "vib", 
+        and drop its decibel graph so that the next create method converts it again'''
+
+        setattr(self, f"{channel_signal_type}_decibel_reference", reference)
+        setattr(self, f"{channel_signal_type}_decibel", None)
+
+
+    def get_transfer_function_graph(self, channel_signal_type):
+
+        '''Return a Graph_quotient for one transfer function of this scan point, e.g. "vibref1", 
+        as a view over row point_index of the transfer function of the whole plane'''
+
+        transfer_function = self.measurement_plane.get_transfer_function(channel_signal_type)
+
+        return Graph_quotient(self.vib, getattr(self, channel_signal_type.replace("vib", "")), y_data = transfer_function.data[self.point_index])
+
+
     def create_vibref1(self):
 
-        #initialise a new Graph_quotient object with vib as dividend and ref1 as divisor
+        #initialise a new Graph_quotient object with vib as dividend and ref1 as divisor if it was not created before
+        #the division was done for all the scan points of the plane at once
         #save the new object under the respective attribute
-        self.vibref1 = Graph_quotient(self.vib, self.ref1)
+        if self.vibref1 is None:
+            self.vibref1 = self.get_transfer_function_graph("vibref1")
 
         #return the created object
         return self.vibref1
@@ -82,9 +176,11 @@ class Scan_Point:
 
     def create_vibref2(self):
 
-        #initialise a new Graph_quotient object with vib as dividend and ref2 as divisor
+        #initialise a new Graph_quotient object with vib as dividend and ref2 as divisor if it was not created before
+        #the division was done for all the scan points of the plane at once
         #save the new object under the respective attribute
-        self.vibref2 = Graph_quotient(self.vib, self.ref2)
+        if self.vibref2 is None:
+            self.vibref2 = self.get_transfer_function_graph("vibref2")
 
         #return the created object
         return self.vibref2
@@ -92,9 +188,11 @@ class Scan_Point:
 
     def create_vibref3(self):
 
-        #initialise a new Graph_quotient object with vib as dividend and ref3 as divisor
+        #initialise a new Graph_quotient object with vib as dividend and ref3 as divisor if it was not created before
+        #the division was done for all the scan points of the plane at once
         #save the new object under the respective attribute
-        self.vibref3 = Graph_quotient(self.vib, self.ref3)
+        if self.vibref3 is None:
+            self.vibref3 = self.get_transfer_function_graph("vibref3")
 
         #return the created object
         return self.vibref3
@@ -102,128 +200,81 @@ class Scan_Point:
 
     def create_disp_decibel(self):
         
-        #initialise a new Graph_decibel object with disp converted to decibel
-        #save the new object under the respective attribute
-        self.disp_decibel = Graph_decibel(self.disp, 1, self.disp_decibel_reference)
-
-        #return the created object
-        return self.disp_decibel
+        #get the Graph_decibel object with disp converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("disp")
     
 
     def create_vib_decibel(self):
         
-        #initialise a new Graph_decibel object with vib converted to decibel
-        #save the new object under the respective attribute
-        self.vib_decibel = Graph_decibel(self.vib, 1, self.vib_decibel_reference)
-
-        #return the created object
-        return self.vib_decibel
+        #get the Graph_decibel object with vib converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("vib")
 
 
     def create_acc_decibel(self):
         
-        #initialise a new Graph_decibel object with acc converted to decibel
-        #save the new object under the respective attribute
+        #get the Graph_decibel object with acc converted to decibel, only converted again if the reference changed
         #for acceleration use decibel_type 2 to do decibel conversion since it has squared units
-        self.acc_decibel = Graph_decibel(self.acc, 2, self.acc_decibel_reference)
-
-        #return the created object
-        return self.acc_decibel
+        return self.get_decibel_graph("acc", 2)
     
 
     def create_ref1_decibel(self):
         
-        #initialise a new Graph_decibel object with ref1 converted to decibel
-        #save the new object under the respective attribute
-        self.ref1_decibel = Graph_decibel(self.ref1, 1, self.ref1_decibel_reference)
-
-        #return the created object
-        return self.ref1_decibel
+        #get the Graph_decibel object with ref1 converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("ref1")
 
 
     def create_ref2_decibel(self):
         
-        #initialise a new Graph_decibel object with ref2 converted to decibel
-        #save the new object under the respective attribute
-        self.ref2_decibel = Graph_decibel(self.ref2, 1, self.ref2_decibel_reference)
-
-        #return the created object
-        return self.ref2_decibel
+        #get the Graph_decibel object with ref2 converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("ref2")
 
 
     def create_ref3_decibel(self):
         
-        #initialise a new Graph_decibel object with ref3 converted to decibel
-        #save the new object under the respective attribute
-        self.ref3_decibel = Graph_decibel(self.ref3, 1, self.ref3_decibel_reference)
-
-        #return the created object
-        return self.ref3_decibel
+        #get the Graph_decibel object with ref3 converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("ref3")
 
 
     def create_h1vibref1_decibel(self):
         
-        #initialise a new Graph_decibel object with h1vibref1_decibel converted to decibel
-        #save the new object under the respective attribute
-        self.h1vibref1_decibel = Graph_decibel(self.h1vibref1, 1, self.h1vibref1_decibel_reference)
-
-        #return the created object
-        return self.h1vibref1_decibel
+        #get the Graph_decibel object with h1vibref1 converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("h1vibref1")
 
 
     def create_h2vibref1_decibel(self):
         
-        #initialise a new Graph_decibel object with h2vibref1_decibel converted to decibel
-        #save the new object under the respective attribute
-        self.h2vibref1_decibel = Graph_decibel(self.h2vibref1, 1, self.h2vibref1_decibel_reference)
-
-        #return the created object
-        return self.h2vibref1_decibel
+        #get the Graph_decibel object with h2vibref1 converted to decibel, only converted again if the reference changed
+        return self.get_decibel_graph("h2vibref1")
 
 
     def create_vibref1_decibel(self):
         
         #this method will create both transfer graph and transfer graph converted to decibel
 
-        #initialise a new Graph_quotient object with vib as dividend and ref1 as divisor
-        #save the new object under the respective attribute
-        self.vibref1 = Graph_quotient(self.vib, self.ref1)
-
-        #initialise a new Graph_decibel object with vibref1 converted to decibel
-        #save the new object under the respective attribute
-        self.vibref1_decibel = Graph_decibel(self.vibref1, 1, self.vibref1_decibel_reference)
+        #get the Graph_quotient object with vib as dividend and ref1 as divisor
+        self.create_vibref1()
 
-        #return the created object
-        return self.vibref1_decibel
+        #get the Graph_decibel object with vibref1 converted to decibel
+        return self.get_decibel_graph("vibref1")
 
 
     def create_vibref2_decibel(self):
         
         #this method will create both transfer graph and transfer graph converted to decibel
 
-        #initialise a new Graph_quotient object with vib as dividend and ref2 as divisor
-        #save the new object under the respective attribute
-        self.vibref2 = Graph_quotient(self.vib, self.ref2)
-
-        #initialise a new Graph_decibel object with vibref2 converted to decibel
-        #save the new object under the respective attribute
-        self.vibref2_decibel = Graph_decibel(self.vibref2, 1, self.vibref2_decibel_reference)
+        #get the Graph_quotient object with vib as dividend and ref2 as divisor
+        self.create_vibref2()
 
-        #return the created object
-        return self.vibref2_decibel
+        #get the Graph_decibel object with vibref2 converted to decibel
+        return self.get_decibel_graph("vibref2")
 
     
     def create_vibref3_decibel(self):
         
         #this method will create both transfer graph and transfer graph converted to decibel
 
-        #initialise a new Graph_quotient object with vib as dividend and ref3 as divisor
-        #save the new object under the respective attribute
-        self.vibref3 = Graph_quotient(self.vib, self.ref3)
-
-        #initialise a new Graph_decibel object with vibref3 converted to decibel
-        #save the new object under the respective attribute
-        self.vibref3_decibel = Graph_decibel(self.vibref3, 1, self.vibref3_decibel_reference)
+        #get the Graph_quotient object with vib as dividend and ref3 as divisor
+        self.create_vibref3()
 
-        #return the created object
-        return self.vibref3_decibel
\ No newline at end of file
+        #get the Graph_decibel object with vibref3 converted to decibel
+        return self.get_decibel_graph("vibref3")
\ No newline at end of file
@@ -6,20 +6,153 @@ import os
 from tkinter import filedialog, messagebox, Tk
 from data_tools import array_to_decibel_1, array_to_decibel_2
 from graph_plotter import graph_plotter
+from graph_renderer import render_figure
 from hxml_writer import HXMLGenerator
+from frequency_grid import align_y_data, get_grid_key
+
+
+#averaging modes for Graph_average, Graph_average_all and Measurement_Plane.get_average
+#"log" is the mean of the y data as given, which for decibel graphs is the mean of the dB values
+#"linear" is the mean of the linear magnitudes, "power" is the root mean square of the linear magnitudes (energy average)
+AVERAGING_MODES = ("log", "linear", "power")
+
+#remarks added to averages that are not the default log-mean
+AVERAGING_MODE_REMARKS = {"log": "", "linear": "Linear magnitude average. ", "power": "Power (RMS) average. "}
+
+#how the values of the points are combined in each bin, in the domain of the averaging mode
+#"median" and "trimmed" are robust to a few bad points, "weighted" uses per-point weights such as coherence
+AGGREGATIONS = ("mean", "median", "trimmed", "weighted")
+
+#remark added to averages of graphs that were resampled to a common frequency grid
+RESAMPLED_REMARK = "Resampled to a common frequency grid. "
+
+#fraction of the points cut from each end of every bin for a trimmed mean
+TRIM_FRACTION = 0.1
+
+#remarks added to averages that do not use the plain mean
+AGGREGATION_REMARKS = {"mean": "", "median": "Median average. ", "trimmed": f"Trimmed mean ({TRIM_FRACTION:.0%} cut from each end). ", "weighted": "Weighted average. "}
+
+
+def aggregate_y_data(y_data_array, aggregation = "mean", weights = None, trim_fraction = TRIM_FRACTION):
+
+    '''Return the element-wise mean, median, trimmed mean or weighted mean over the first axis of stacked y data. 
+    The median and trimmed mean sort every bin along the point axis in one call, which is faster than 
+    np.partition along that axis for (points x bins) arrays. 
+    nan marks a point without a value in that bin, e.g. a masked bin of a transfer function, 
+    so every aggregation of a bin only uses the points that are not nan there, and is nan where every point is. 
+    weights are (points x bins) or one weight per point, bins where all the weights are 0 use the plain mean'''
+
+    if aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {aggregation}, choose one of {', '.join(AGGREGATIONS)}")
+
+    number_of_graphs = len(y_data_array)
+
+    if aggregation in ("median", "trimmed"):
+
+        #the sort puts nan values at the end of each bin, after the values that are counted
+        sorted_y_data = np.sort(y_data_array, axis = 0)
+        counts = np.count_nonzero(~np.isnan(sorted_y_data), axis = 0)
+
+    if aggregation == "median":
+
+        #mean of the two middle values of each bin for an even number of points, counts of 0 take the nan in the first row
+        middle = np.stack([np.maximum(counts - 1, 0) // 2, counts // 2])
+        middle_values = np.take_along_axis(sorted_y_data, middle, axis = 0)
+
+        median = np.divide(middle_values[0] + middle_values[1], 2)
+
+        return np.where(counts > 0, median, np.nan)
+
+    if aggregation == "trimmed":
+
+        numbers_cut = (counts * trim_fraction).astype(int)
+
+        #rank of each sorted value in its bin, only the values between the cut ends are summed
+        ranks = np.arange(number_of_graphs).reshape((-1,) + (1,) * (sorted_y_data.ndim - 1))
+        kept = (ranks >= numbers_cut) & (ranks < counts - numbers_cut)
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            trimmed_mean = np.divide(np.sum(np.where(kept, sorted_y_data, 0), axis = 0), counts - 2 * numbers_cut)
+
+        return np.where(counts > 0, trimmed_mean, np.nan)
+
+    #points without a value add nothing to the sums and are not counted
+    is_missing = np.isnan(y_data_array)
+    counts = number_of_graphs - np.count_nonzero(is_missing, axis = 0)
+
+    if is_missing.any():
+        y_data_array = np.where(is_missing, 0, y_data_array)
+
+    #bins where every point is missing are 0 / 0
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        mean = np.divide(np.sum(y_data_array, axis = 0), counts)
+
+    if aggregation == "weighted":
+
+        if weights is None:
+            raise ValueError("Weighted aggregation needs weights")
+
+        weights = np.asarray(weights, dtype = float)
+
+        #one weight per point applies to every bin
+        if weights.ndim == 1:
+            weights = weights[:, None]
+
+        weights = np.where(is_missing, 0.0, np.broadcast_to(weights, np.shape(y_data_array)))
+        total_weights = np.sum(weights, axis = 0)
+
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            weighted_average = np.divide(np.sum(weights * y_data_array, axis = 0), total_weights)
+
+        return np.where(total_weights > 0, weighted_average, mean)
+
+    return mean
+
+
+def average_y_data(y_data_array, averaging_mode = "log", decibel_factor = None, aggregation = "mean", weights = None):
+
+    '''Return the element-wise average over the first axis of stacked y data, in one vectorised pass. 
+    decibel_factor is 20 or 10 for y data in dB (see Graph_decibel), None for y data that is not in dB. 
+    For y data in dB, "linear" and "power" convert back to linear ratios, average them, and convert to dB once per bin. 
+    aggregation and weights are as for aggregate_y_data, applied in the domain of the averaging mode'''
+
+    if averaging_mode not in AVERAGING_MODES:
+        raise ValueError(f"Unknown averaging mode {averaging_mode}, choose one of {', '.join(AVERAGING_MODES)}")
+
+    #element-wise average of the y data as given
+    if averaging_mode == "log":
+        return aggregate_y_data(y_data_array, aggregation, weights)
+
+    #power averages the squares of the magnitudes
+    exponent = 1 if averaging_mode == "linear" else 2
+
+    #linear y data
+    if decibel_factor is None:
+        return np.power(aggregate_y_data(np.abs(y_data_array) ** exponent, aggregation, weights), 1 / exponent)
+
+    #y data in dB, the reference cancels out so the ratios to the reference are averaged directly
+    linear_ratios = np.power(10.0, np.multiply(y_data_array, exponent / decibel_factor))
+
+    return (decibel_factor / exponent) * np.log10(aggregate_y_data(linear_ratios, aggregation, weights))
 
 #class for an individual graph for one channel type, one signal type, and one scan point
 #takes in a dictionary of data as input parameter
+#when y_data and scan_point_no are given, the dictionary only holds the labels of the channel
+#and the graph is a view over the y data array of a Measurement_Plane
 class Graph:
 
-    def __init__(self, graph):
+    def __init__(self, graph, y_data = None, scan_point_no = None):
         
         #attributes for graph data
         self.x_data = graph["x"]
+
+        #graph is a view over y data already converted to absolute by Measurement_Plane
+        if y_data is not None:
+            self.y_data = y_data
         
         #if first element in array of y data is complex, convert all elements in the array to absolute
         #and store as attribute
-        if isinstance(graph["data"][0], complex):
+        elif isinstance(graph["data"][0], complex):
             self.y_data = np.abs(graph["data"])
 
         else:
@@ -33,18 +166,35 @@ class Graph:
         #attributes for graph name
         self.scan_name = str(graph["id4"])
         self.channel_signal = str(graph["id2"])
-        self.scan_point_no = int(graph["rsp_node"])      #scan point number attribute as integer
-        self.plot_title = self.scan_name[:-4] + ", " + self.channel_signal + ", Scan Point " + str(self.scan_point_no)
+
+        #scan point number attribute as integer
+        if scan_point_no is not None:
+            self.scan_point_no = int(scan_point_no)
+
+        else:
+            self.scan_point_no = int(graph["rsp_node"])
 
         #attributes for x-axis
         self.x_label = str(graph["abscissa_axis_lab"])
         self.x_label_unit = str(graph["abscissa_axis_units_lab"])
-        self.x_label_with_unit = self.x_label + " [" + self.x_label_unit + "]" 
 
         #attributes for y-axis
         self.y_label = str(graph["ordinate_axis_lab"])
         self.y_label_unit = str(graph["ordinate_axis_units_lab"])
-        self.y_label_with_unit = self.y_label + " [" + self.y_label_unit + "]"
+
+
+    #combined labels are only built when a graph is plotted or exported
+    @property
+    def plot_title(self):
+        return self.scan_name[:-4] + ", " + self.channel_signal + ", Scan Point " + str(self.scan_point_no)
+
+    @property
+    def x_label_with_unit(self):
+        return self.x_label + " [" + self.x_label_unit + "]"
+
+    @property
+    def y_label_with_unit(self):
+        return self.y_label + " [" + self.y_label_unit + "]"
 
 
     def export_graph(self):
@@ -141,16 +291,16 @@ class Graph:
                 valid_filename = False
 
 
-        #plot the graph using imported graph_plotter functions
-        graph_plotter(self)
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
 
         self.gui_export()
 
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
         plt.show()
 
@@ -165,6 +315,9 @@ class Graph_decibel:
 
         #attribute for reference value used for decibel conversion
         self.reference = reference
+
+        #attribute for the factor of the decibel conversion, 20log10 without squared units and 10log10 with squared units
+        self.decibel_factor = 20 if decibel_type == 1 else 10
         
         #if decibel type is 1, meaning no squared units
         if decibel_type == 1:
@@ -313,15 +466,15 @@ class Graph_decibel:
                 valid_filename = False
 
 
-        #plot the graph using imported graph_plotter functions
-        graph_plotter(self)
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
         self.gui_export()
 
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
         plt.show()
 
@@ -332,12 +485,26 @@ class Graph_decibel:
 #takes in two Graph objects as input parameters
 class Graph_quotient:
 
-    def __init__(self, graph_dividend, graph_divisor):
+    def __init__(self, graph_dividend, graph_divisor, target_x = None, y_data = None):
+        '''Graphs are resampled to target_x if given, or to a common grid if their x data differ, see frequency_grid.align_y_data. 
+        y_data is the quotient already computed by Measurement_Plane for the whole plane, see get_transfer_function'''
         
         #store attributes
         self.graph_dividend = graph_dividend
         self.graph_divisor = graph_divisor
 
+        #quotient was computed for all the scan points of a plane at once, the graph is a view over one row of it
+        #the dividend and divisor graphs are of the same scan point and plane, so they share x data and labels
+        if y_data is not None:
+
+            self.x_data = self.graph_dividend.x_data
+            self.y_data = y_data
+            self.resampled = False
+
+            self.set_labels()
+
+            return
+
         #attribute for dividend graph x data
         self.graph_dividend_x = self.graph_dividend.x_data
 
@@ -366,106 +533,61 @@ class Graph_quotient:
             self.graph_divisor_y = self.graph_divisor.y_data
 
 
-        #check if dividend graph and divisor graph have exact same x values
-        if np.array_equal(self.graph_dividend_x, self.graph_divisor_x):
-            
-            #attribute for x data of quotient graph, using the x data of dividend graph
-            self.x_data = self.graph_dividend_x
-
-            #attribute which is the result of element-wise division of array of dividend y data with array of divisor y data
-            self.y_data = np.divide(self.graph_divident_y, self.graph_divisor_y)
-        
-        else: 
-
-            #else return an error as the x arrays are different for graph1 and graph2
-            print("x values do not match for the dividend and divisor graphs")
-            
-            return False
-            
-
-        #attributes for graph name
-        
-        #check if scan names for dividend graph and divisor graph match
-        if self.graph_dividend.scan_name == self.graph_divisor.scan_name:
+        #attribute for x data of quotient graph, using the x data of dividend graph if dividend graph and divisor graph have exact same x values
+        #else both graphs are resampled to a common grid, e.g. scans at different resolutions or bandwidths
+        self.x_data, (dividend_y, divisor_y) = align_y_data([self.graph_dividend_x, self.graph_divisor_x], [self.graph_divident_y, self.graph_divisor_y], target_x)
 
-            #attribute for quotient graph scan name
-            self.scan_name = str(self.graph_dividend.scan_name)
+        self.resampled = self.x_data is not self.graph_dividend_x
 
-        else:
+        #attribute which is the result of element-wise division of array of dividend y data with array of divisor y data
+        self.y_data = np.divide(dividend_y, divisor_y)
             
-            #else return an error as scan point numbers do not match
-            print("Scan names do not match for the graphs being divided")
 
-            return False
-        
-        self.dividend_channel_signal = str(self.graph_dividend.channel_signal)
+        #check that the dividend graph and divisor graph are of the same scan point and have the same x labels
+        for attribute, attribute_name in (("scan_name", "Scan names"), ("scan_point_no", "Scan point numbers"), ("x_label", "x labels"), ("x_label_unit", "x label units")):
 
-        self.divisor_channel_signal = str(self.graph_divisor.channel_signal)
+            if getattr(self.graph_dividend, attribute) != getattr(self.graph_divisor, attribute):
 
-        self.channel_signal = self.dividend_channel_signal + " and " + self.divisor_channel_signal
+                #else raise an error as the attribute does not match
+                raise ValueError(f"{attribute_name} do not match for the graphs being divided")
 
-
-        #check if scan point numbers for dividend graph and divisor graph match
-        if self.graph_dividend.scan_point_no == self.graph_divisor.scan_point_no:
-
-            #attribute for scan point number for quotient graph
-            self.scan_point_no = int(self.graph_dividend.scan_point_no)      #scan point number attribute as integer
-
-        else:
+        #check if x min for dividend graph and divisor graph match, resampled graphs start at the first frequency of the common grid
+        if not self.resampled and self.graph_dividend.x_min != self.graph_divisor.x_min:
             
-            #else return an error as scan point numbers do not match
-            print("Scan point numbers do not match for the graphs being divided")
+            #else raise an error as x min do not match
+            raise ValueError("x min do not match for the graphs being divided")
 
-            return False
-        
+        self.set_labels()
 
-        self.plot_title = self.scan_name[:-4] + ", " + self.channel_signal + ", Scan Point " + str(self.scan_point_no)
 
+    def set_labels(self):
 
-        #check if x labels for dividend graph and divisor graph match
-        if self.graph_dividend.x_label == self.graph_divisor.x_label:
+        #set the name and axis attributes from the dividend and divisor graphs, which are of the same scan point
 
-            #attribute for x label for quotient graph
-            self.x_label = str(self.graph_dividend.x_label)
+        #attribute for quotient graph scan name
+        self.scan_name = str(self.graph_dividend.scan_name)
 
-        else:
-            
-            #else return an error as x labels do not match
-            print("x labels do not match for the graphs being divided")
+        self.dividend_channel_signal = str(self.graph_dividend.channel_signal)
 
-            return False
+        self.divisor_channel_signal = str(self.graph_divisor.channel_signal)
 
+        self.channel_signal = self.dividend_channel_signal + " and " + self.divisor_channel_signal
 
-        #check if x label units for dividend graph and divisor graph match
-        if self.graph_dividend.x_label_unit == self.graph_divisor.x_label_unit:
+        #attribute for scan point number for quotient graph
+        self.scan_point_no = int(self.graph_dividend.scan_point_no)      #scan point number attribute as integer
 
-            #attribute for x label unit for quotient graph
-            self.x_label_unit = str(self.graph_dividend.x_label_unit)
+        self.plot_title = self.scan_name[:-4] + ", " + self.channel_signal + ", Scan Point " + str(self.scan_point_no)
 
-        else:
-            
-            #else return an error as x label units do not match
-            print("x label units do not match for the graphs being divided")
+        #attribute for x label for quotient graph
+        self.x_label = str(self.graph_dividend.x_label)
 
-            return False
+        #attribute for x label unit for quotient graph
+        self.x_label_unit = str(self.graph_dividend.x_label_unit)
 
-        
         self.x_label_with_unit = self.x_label + " [" + self.x_label_unit + "]" 
 
-
-        #check if x min for dividend graph and divisor graph match
-        if self.graph_dividend.x_min == self.graph_divisor.x_min:
-
-            #attribute for x min for quotient graph
-            self.x_min = self.graph_dividend.x_min
-
-        else:
-            
-            #else return an error as x min do not match
-            print("x min do not match for the graphs being divided")
-
-            return False
-
+        #attribute for x min for quotient graph, resampled graphs start at the first frequency of the common grid
+        self.x_min = self.x_data[0] if self.resampled else self.graph_dividend.x_min
 
         self.dividend_y_label = str(self.graph_dividend.y_label)
         self.divisor_y_label = str(self.graph_divisor.y_label)
@@ -581,15 +703,15 @@ class Graph_quotient:
                 valid_filename = False
 
 
-        #plot the graph using imported graph_plotter functions
-        graph_plotter(self)
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
         self.gui_export()
 
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
         plt.show()
 
@@ -597,13 +719,24 @@ class Graph_quotient:
 #class for an individual graph which is the result of the division of 2 input graph data
 #for calculating transfer function of vib of a scan point with its ref1, ref2 or ref3
 #takes in a list of graph objects as input parameters
+#when y_data and scan_point_no are given, the average was already computed by Measurement_Plane
+#and the graphs list only holds one graph of the channel for the x data and labels
 class Graph_average:
 
-    def __init__(self, graphs_list, anomalous_points_list, scan_name = None):
+    def __init__(self, graphs_list, anomalous_points_list, scan_name = None, y_data = None, scan_point_no = None, averaging_mode = "log", aggregation = "mean", weights = None, target_x = None):
+        '''averaging_mode is one of AVERAGING_MODES and aggregation one of AGGREGATIONS, see average_y_data. 
+        weights are for the "weighted" aggregation, one row or weight per graph in graphs_list. 
+        Graphs are resampled to target_x if given, or to a common grid if their x data differ, see frequency_grid.align_y_data. 
+        y_data is the average already computed by Measurement_Plane with averaging_mode and aggregation'''
         
         #store attributes
         self.graphs_list = graphs_list
         self.anomalous_points_list = anomalous_points_list
+        self.averaging_mode = averaging_mode
+        self.aggregation = aggregation
+
+        #decibel graphs stay decibel graphs when averaged
+        self.decibel_factor = getattr(self.graphs_list[0], "decibel_factor", None)
 
         #no anomalous points
         if len(self.anomalous_points_list) == 0:
@@ -616,31 +749,22 @@ class Graph_average:
             remarks = f"Anomalous point(s) excluded: {(str(self.anomalous_points_list))[1:-1]}. "
         
         #attribute for remarks
-        self.remarks = remarks
+        self.remarks = remarks + AVERAGING_MODE_REMARKS[self.averaging_mode] + AGGREGATION_REMARKS[self.aggregation]
 
+        #average was computed over the whole plane at once
+        if y_data is not None:
 
-        #loop through all the graphs in the graph list and check if they all have the same x data
-        #by comparing each of their x data to the first graph's x data
-        #start from second graph
-        for index in range(len(self.graphs_list)-1):
+            #all the scan points of a plane share the same x data
+            self.x_data = self.graphs_list[0].x_data
+            self.y_data = y_data
 
-            #index to access the current graph in the list of graphs
-            graph_index = index + 1
+            #attribute storing a list of scan point numbers of all the averaged points
+            self.scan_point_no = [int(point_no) for point_no in scan_point_no]
 
-            #if the x data do not match
-            if not np.array_equal(self.graphs_list[0].x_data, self.graphs_list[graph_index].x_data):
-                
-                #error as x data do not match
-                print("x data do not match for the graphs being averaged")
+            self.set_labels(self.graphs_list[0], scan_name)
 
-                return False
-            
-            else:
-                pass
+            return
 
-        #x data matches for all the graphs
-        #store x data from first graph as attribute
-        self.x_data = self.graphs_list[0].x_data
 
         #store a list of all the y data arrays for all the graphs
         y_data_list = []
@@ -660,25 +784,30 @@ class Graph_average:
                 #else just append the array of y data to y_data_list
                 y_data_list.append(graph.y_data)
 
-        
-        #element-wise addition of y data for all the graphs 
-        summed_y_data_list = np.sum(y_data_list, axis = 0)
-        
-        #element-wise division of summed y data
-        average_y_data = np.divide(summed_y_data_list, len(y_data_list))
+        #graphs with different x data, e.g. scans at different resolutions or bandwidths, are resampled to a common grid
+        #the x data of the first graph is used when all the graphs have the same x data
+        x_data_list = [graph.x_data for graph in self.graphs_list]
+        self.x_data, y_data_list = align_y_data(x_data_list, y_data_list, target_x)
+
+        if self.x_data is not x_data_list[0]:
+            self.remarks += RESAMPLED_REMARK
 
         #attribute for averaged y data of all the graphs using element-wise averaging
-        self.y_data = average_y_data
+        self.y_data = average_y_data(y_data_list, self.averaging_mode, self.decibel_factor, self.aggregation, weights)
 
         #attribute storing a list of scan point numbers of all the graphs
         self.scan_point_no = [int(graph.scan_point_no) for graph in self.graphs_list]      #scan point numbers as integer
 
-        first_graph = self.graphs_list[0]
-
         #assuming that all other attributes are the same across all the graphs
+        self.set_labels(self.graphs_list[0], scan_name)
 
-        #attribute for minimum x value in the graph
-        self.x_min = first_graph.x_min
+
+    def set_labels(self, first_graph, scan_name):
+
+        #set the name and axis attributes from one of the averaged graphs
+
+        #attribute for minimum x value in the graph, resampled graphs start at the first frequency of the common grid
+        self.x_min = first_graph.x_min if self.x_data is first_graph.x_data else self.x_data[0]
 
         #attributes for graph name
 
@@ -807,15 +936,15 @@ class Graph_average:
                 valid_filename = False
 
 
-        #plot the graph using imported graph_plotter functions
-        graph_plotter(self)
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
         self.gui_export()
 
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
         plt.show()
 
@@ -826,10 +955,17 @@ class Graph_average:
 #takes in a list of graph objects as input parameters
 class Graph_average_all:
 
-    def __init__(self, graphs_list):
+    def __init__(self, graphs_list, averaging_mode = "log", aggregation = "mean", weights = None, target_x = None):
+        '''averaging_mode is one of AVERAGING_MODES and aggregation one of AGGREGATIONS, see average_y_data. 
+        Graphs are resampled to target_x if given, or to a common grid if their x data differ, see frequency_grid.align_y_data'''
         
         #store attributes
         self.graphs_list = graphs_list
+        self.averaging_mode = averaging_mode
+        self.aggregation = aggregation
+
+        #decibel graphs stay decibel graphs when averaged
+        self.decibel_factor = getattr(self.graphs_list[0], "decibel_factor", None)
 
         #placeholder string for full remarks
         self.remarks = ""
@@ -840,29 +976,6 @@ class Graph_average_all:
             self.remarks += f"{graph.scan_name[:-4]}: {graph.remarks}"
 
 
-        #loop through all the graphs in the graph list and check if they all have the same x data
-        #by comparing each of their x data to the first graph's x data
-        #start from second graph
-        for index in range(len(self.graphs_list)-1):
-
-            #index to access the current graph in the list of graphs
-            graph_index = index + 1
-
-            #if the x data do not match
-            if not np.array_equal(self.graphs_list[0].x_data, self.graphs_list[graph_index].x_data):
-                
-                #error as x data do not match
-                print("x data do not match for the graphs being averaged")
-
-                return False
-            
-            else:
-                pass
-
-        #x data matches for all the graphs
-        #store x data from first graph as attribute
-        self.x_data = self.graphs_list[0].x_data
-
         #store a list of all the y data arrays for all the graphs
         y_data_list = []
 
@@ -881,15 +994,16 @@ class Graph_average_all:
                 #else just append the array of y data to y_data_list
                 y_data_list.append(graph.y_data)
 
-        
-        #element-wise addition of y data for all the graphs 
-        summed_y_data_list = np.sum(y_data_list, axis = 0)
-        
-        #element-wise division of summed y data
-        average_y_data = np.divide(summed_y_data_list, len(y_data_list))
+        #graphs with different x data, e.g. scans at different resolutions or bandwidths, are resampled to a common grid
+        #the x data of the first graph is used when all the graphs have the same x data
+        x_data_list = [graph.x_data for graph in self.graphs_list]
+        self.x_data, y_data_list = align_y_data(x_data_list, y_data_list, target_x)
+
+        if self.x_data is not x_data_list[0]:
+            self.remarks += RESAMPLED_REMARK
 
         #attribute for averaged y data of all the graphs using element-wise averaging
-        self.y_data = average_y_data
+        self.y_data = average_y_data(y_data_list, self.averaging_mode, self.decibel_factor, self.aggregation, weights)
 
         #graphs in the input are already surface average graphs e.g. for use in full device ref1 average
         #attribute storing a list of lists of scan point numbers of all the graphs
@@ -899,8 +1013,8 @@ class Graph_average_all:
 
         #assuming that all other attributes are the same across all the graphs
 
-        #attribute for minimum x value in the graph
-        self.x_min = first_graph.x_min
+        #attribute for minimum x value in the graph, resampled graphs start at the first frequency of the common grid
+        self.x_min = first_graph.x_min if self.x_data is first_graph.x_data else self.x_data[0]
 
         #get device name
         match_object = re.search("top|left|right|ear", first_graph.scan_name.lower())
@@ -1025,15 +1139,15 @@ class Graph_average_all:
                 valid_filename = False
 
 
-        #plot the graph using imported graph_plotter functions
-        graph_plotter(self)
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
         self.gui_export()
 
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
         plt.show()
 
@@ -1044,7 +1158,8 @@ class Graph_average_all:
 #takes in two Graph objects as input parameters
 class Graph_perc_change:
 
-    def __init__(self, graph_before, graph_after):
+    def __init__(self, graph_before, graph_after, target_x = None):
+        '''Graphs are resampled to target_x if given, or to a common grid if their x data differ, see frequency_grid.align_y_data'''
         
         #store attributes
         self.graph_before = graph_before
@@ -1078,23 +1193,16 @@ class Graph_perc_change:
             self.graph_after_y = self.graph_after.y_data
 
 
-        #check if before graph and before graph have exact same x values
-        if np.array_equal(self.graph_before_x, self.graph_after_x):
-            
-            #attribute for x data of output graph, using the x data of before graph
-            self.x_data = self.graph_before_x
+        #attribute for x data of output graph, using the x data of before graph if before graph and after graph have exact same x values
+        #else both graphs are resampled to a common grid, e.g. scans at different resolutions or bandwidths
+        self.x_data, (before_y, after_y) = align_y_data([self.graph_before_x, self.graph_after_x], [self.graph_before_y, self.graph_after_y], target_x)
 
-            #attribute which is the result of element-wise division of array of before y data with array of before y data
-            self.y_difference = np.subtract(self.graph_after_y, self.graph_before_y)
-            #self.y_data = np.multiply((np.divide(self.y_difference, self.graph_before_y)), 100)
-            self.y_data = self.y_difference
-        
-        else: 
+        self.resampled = self.x_data is not self.graph_before_x
 
-            #else return an error as the x arrays are different for graph1 and graph2
-            print("x values do not match for the before and before graphs")
-            
-            return False
+        #attribute which is the result of element-wise division of array of before y data with array of before y data
+        self.y_difference = np.subtract(after_y, before_y)
+        #self.y_data = np.multiply((np.divide(self.y_difference, before_y)), 100)
+        self.y_data = self.y_difference
         
         #attribute for output graph scan name
         self.scan_name = str(self.graph_before.scan_name)
@@ -1114,10 +1222,8 @@ class Graph_perc_change:
 
         else:
             
-            #else return an error as x labels do not match
-            print("x labels do not match for the graphs being divided")
-
-            return False
+            #else raise an error as x labels do not match
+            raise ValueError("x labels do not match for the graphs being compared")
 
 
         #check if x label units for before graph and after graph match
@@ -1128,27 +1234,28 @@ class Graph_perc_change:
 
         else:
             
-            #else return an error as x label units do not match
-            print("x label units do not match for the graphs being divided")
-
-            return False
+            #else raise an error as x label units do not match
+            raise ValueError("x label units do not match for the graphs being compared")
 
         
         self.x_label_with_unit = self.x_label + " [" + self.x_label_unit + "]" 
 
 
+        #resampled graphs start at the first frequency of the common grid
+        if self.resampled:
+
+            self.x_min = self.x_data[0]
+
         #check if x min for before graph and before graph match
-        if self.graph_before.x_min == self.graph_after.x_min:
+        elif self.graph_before.x_min == self.graph_after.x_min:
 
             #attribute for x min for output graph
             self.x_min = self.graph_before.x_min
 
         else:
             
-            #else return an error as x min do not match
-            print("x min do not match for the graphs being divided")
-
-            return False
+            #else raise an error as x min do not match
+            raise ValueError("x min do not match for the graphs being compared")
 
 
         #attribute for y label for output graph
@@ -1259,14 +1366,350 @@ class Graph_perc_change:
                 valid_filename = False
 
 
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
+
+    def plot_graph(self):
+        self.gui_export()
+
         #plot the graph using imported graph_plotter functions
         graph_plotter(self)
 
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_filename, dpi=300, bbox_inches="tight")
+        #display the graph
+        plt.show()
+
+
+
+#class for a graph read back from an HXML export by HXMLReader, e.g. a saved surface average
+#has the same data and label attributes and export methods as the other graph classes so it can be plotted with graph_plotter,
+#exported again with HXMLGenerator and compared with Compare_Surface_Average
+class Graph_hxml:
+
+    def __init__(self, curve_name, x_name, x_label_unit, x_data, y_label, y_label_unit, y_data, remarks):
+
+        #attributes for graph data
+        self.x_data = x_data
+        self.y_data = y_data
+
+        #attribute for minimum x value in the graph
+        self.x_min = x_data[0] if len(x_data) else 0
+
+        #attribute for remarks, e.g. anomalous points excluded from an average
+        self.remarks = remarks
+
+        #the curve name is the plot title of the exported graph, kept as it is so a re-export gives the same name
+        self.plot_title = curve_name
+
+        #plot titles are "<scan name>, <channel signal>, Scan Point <n>" or "<scan name>, <channel signal>, <Surface> Average"
+        title_parts = curve_name.split(", ")
+
+        if len(title_parts) >= 3:
+
+            #scan name is stored with the .uff extension like the other graph classes
+            self.scan_name = title_parts[0] + ".uff"
+            self.channel_signal = ", ".join(title_parts[1:-1])
+
+            #scan point number only for graphs of a single scan point
+            if title_parts[-1].startswith("Scan Point "):
+                self.scan_point_no = int(title_parts[-1][len("Scan Point "):])
+
+            else:
+                self.scan_point_no = None
+
+        #title in another format, e.g. percentage change
+        else:
+
+            self.scan_name = curve_name + ".uff"
+            self.channel_signal = str(y_label)
+            self.scan_point_no = None
+
+        #attributes for x-axis
+        #exports always name the x curve "f" because the HXML viewer needs it, all graphs in the analyser are over frequency
+        self.x_label = "Frequency" if x_name == "f" else str(x_name)
+        self.x_label_unit = str(x_label_unit)
+        self.x_label_with_unit = self.x_label + " [" + self.x_label_unit + "]"
+
+        #attributes for y-axis
+        self.y_label = str(y_label)
+        self.y_label_unit = str(y_label_unit)
+        self.y_label_with_unit = self.y_label + " [" + self.y_label_unit + "]"
+
+
+    def export_graph(self):
+
+        '''Method to export the current graph as HXML.
+        Returns filename to be reused for graph photo name'''
+        
+        #use this to get the message box and file dialog to show as top windows later
+        window = Tk()
+        window.wm_attributes('-topmost', 1)
+
+        #suppress the Tk window
+        window.withdraw()
+
+        #loop until user chooses a filename
+        valid_filename = False
+
+        while not valid_filename:
+
+            #display a message box
+            messagebox.showinfo("Save HXML Export", "Choose Folder to Save HXML Export in", parent =window)
+
+            #get user to choose name and folder location to save HXML file in
+            user_filename = filedialog.asksaveasfilename(parent = window, initialdir = "C:\\", initialfile = f"{self.plot_title}.hxml", filetypes = [(".hxml", "*.hxml")], defaultextension = ".hxml", confirmoverwrite = True)
+
+            #valid filename that is not empty
+            if user_filename != "":
+                
+                #exit loop
+                valid_filename = True
+
+            #invalid filename
+            else:
+                
+                #display error message
+                print("Please provide a filename to save as")
+
+                #repeat the prompt for user to choose a filename
+                valid_filename = False
+
+
+        #create the HXML file with the plot title as the filename in the HXML_exports subfolder
+        hxml_object = HXMLGenerator(user_filename)
+    
+        #create a list containing the current graph object
+        graphs_list = [self]
+
+        #write the current graph object's data to the HXML file
+        hxml_object.graphs_to_hxml(graphs_list, remarks_list = [self.remarks])
+
+        #get file name without folder directory and extension
+        file_name_without_extension = os.path.splitext(os.path.basename(user_filename))[0]
+
+        #return just file name without folder directory and extension
+        return file_name_without_extension
+    
+
+    def gui_export(self):
+
+        '''Method to save as HXML file, save as png and also display the current graph'''
+
+        #export as HXML and get the user chosen file name
+        default_file_name = self.export_graph()
+
+
+        #use this to get the message box and file dialog to show as top windows later
+        window = Tk()
+        window.wm_attributes('-topmost', 1)
+
+        #suppress the Tk window
+        window.withdraw()
+
+        #loop until user chooses a filename
+        valid_filename = False
+
+        while not valid_filename:
+
+            #display a message box
+            messagebox.showinfo("Save Graph as Photo", "Choose Folder to Save Graph Photo in", parent =window)
+
+            #get user to choose name and folder location to save photo file in
+            user_filename = filedialog.asksaveasfilename(parent = window, initialdir = "C:\\", initialfile = default_file_name, filetypes = [(".png", "*.png")], defaultextension = ".png", confirmoverwrite = True)
+
+            #valid filename that is not empty
+            if user_filename != "":
+                
+                #exit loop
+                valid_filename = True
+
+            #invalid filename
+            else:
+                
+                #display error message
+                print("Please provide a filename to save as")
+
+                #repeat the prompt for user to choose a filename
+                valid_filename = False
+
+
+        #save the plot as a png image, drawn with the graph_plotter styling on an Agg figure instead of pyplot
+        render_figure([self], os.path.splitext(user_filename)[0])
 
     def plot_graph(self):
         self.gui_export()
-        
+
+        #plot the graph using imported graph_plotter functions
+        graph_plotter(self)
+
         #display the graph
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+
+
+#octave reductions for Graph_octave
+#"smooth" is the power average of a fractional-octave window around every bin, "energy" is the sum of the power in each fractional-octave band
+OCTAVE_REDUCTIONS = ("smooth", "energy")
+
+#centre frequency that the fractional-octave bands are aligned to, the bands are base 2 like the log2 plot axis
+OCTAVE_REFERENCE_FREQUENCY = 1000.0
+
+#number of (grid, fraction, reduction) bin ranges that are kept, the oldest are dropped first
+OCTAVE_RANGES_CACHE_SIZE = 64
+
+#bin ranges keyed by the bytes of the grid, the octave fraction and the reduction
+_octave_ranges_cache = {}
+
+
+def get_octave_bin_ranges(x_data, fraction = 3, reduction = "smooth"):
+
+    '''Return (x data, lower bins, upper bins) of the 1/fraction-octave reduction of the x_data grid: 
+    output value i is reduced from the bins lower[i] up to but not including upper[i]. 
+    "smooth" keeps the grid, the window of every bin runs 1/(2 fraction) octave either side of it and always holds the bin itself, 
+    windows at the ends of the grid are cut short. 
+    "energy" has one value per band centre, only bands that lie fully inside the grid and hold at least one bin are kept, 
+    so partly covered edge bands are left out. Ranges are computed once per grid and cached'''
+
+    if reduction not in OCTAVE_REDUCTIONS:
+        raise ValueError(f"Unknown octave reduction {reduction}, choose one of {', '.join(OCTAVE_REDUCTIONS)}")
+
+    key = (get_grid_key(x_data), fraction, reduction)
+
+    if key in _octave_ranges_cache:
+        return _octave_ranges_cache[key]
+
+    x_data = np.asarray(x_data, dtype = float)
+
+    if reduction == "smooth":
+
+        #window edges half a band either side of every bin, a 0 Hz bin is its own window
+        reduced_x = x_data
+        lower_bins = np.searchsorted(x_data, x_data * 2.0 ** (-0.5 / fraction), side = "left")
+        upper_bins = np.searchsorted(x_data, x_data * 2.0 ** (0.5 / fraction), side = "right")
+
+    else:
+
+        positive_x = x_data[x_data > 0]
+
+        #band numbers counted from the reference frequency, centres inside the positive frequencies of the grid
+        first_band = int(np.ceil(fraction * np.log2(positive_x[0] / OCTAVE_REFERENCE_FREQUENCY)))
+        last_band = int(np.floor(fraction * np.log2(positive_x[-1] / OCTAVE_REFERENCE_FREQUENCY)))
+        centres = OCTAVE_REFERENCE_FREQUENCY * 2.0 ** (np.arange(first_band, last_band + 1) / fraction)
+
+        #band edges half a band either side of the centres, bins from lower edge up to but not including the upper edge
+        lower_edges, upper_edges = centres * 2.0 ** (-0.5 / fraction), centres * 2.0 ** (0.5 / fraction)
+        lower_bins = np.searchsorted(x_data, lower_edges, side = "left")
+        upper_bins = np.searchsorted(x_data, upper_edges, side = "left")
+
+        #a band that runs past the ends of the data or falls between two bins has no full energy to sum
+        kept = (lower_edges >= positive_x[0]) & (upper_edges <= positive_x[-1]) & (upper_bins > lower_bins)
+        reduced_x, lower_bins, upper_bins = centres[kept], lower_bins[kept], upper_bins[kept]
+
+    ranges_entry = (reduced_x, lower_bins, upper_bins)
+
+    #drop the oldest ranges when the cache is full
+    if len(_octave_ranges_cache) >= OCTAVE_RANGES_CACHE_SIZE:
+        del _octave_ranges_cache[next(iter(_octave_ranges_cache))]
+
+    _octave_ranges_cache[key] = ranges_entry
+
+    return ranges_entry
+
+
+def reduce_to_octave_bands(y_data, x_data, fraction = 3, reduction = "smooth", decibel_factor = None):
+
+    '''Return (x data, reduced y data) of y data on the x_data grid reduced to 1/fraction-octave bands, see get_octave_bin_ranges. 
+    y_data is one curve or a (curves x bins) array, e.g. a whole plane from Measurement_Plane.get_channel_matrix, 
+    which is reduced at once from one cumulative sum of the bin powers. Bins are combined in power: for y data in dB 
+    (decibel_factor 20 or 10, see Graph_decibel) the result is in dB, otherwise it is a magnitude. 
+    Nan bins are left out of a smoothed window, a band energy with a nan bin is nan'''
+
+    reduced_x, lower_bins, upper_bins = get_octave_bin_ranges(x_data, fraction, reduction)
+
+    y_data = np.asarray(y_data)
+
+    #power of every bin relative to the reference of the y data
+    if decibel_factor is None:
+        power = np.abs(y_data) ** 2
+
+    else:
+        power = np.power(10.0, np.multiply(y_data, 2 / decibel_factor))
+
+    is_missing = np.isnan(power)
+
+    #the reduction is a multiply by a banded (outputs x bins) weight matrix, done as differences of running sums
+    #instead of storing the weights as a sparse matrix: a smoothing window 1/3 octave wide holds hundreds of bins
+    #at high frequencies on a fine linear grid, while the running sums cost one pass over the bins for any window
+    #running sums of the power and of the bins with a value, starting from 0 so a range sum is a difference
+    zeros = np.zeros(power.shape[:-1] + (1,))
+    power_sums = np.concatenate([zeros, np.cumsum(np.where(is_missing, 0.0, power), axis = -1)], axis = -1)
+    value_counts = np.concatenate([zeros, np.cumsum(~is_missing, axis = -1)], axis = -1)
+
+    #rounding in the running sum can leave a tiny negative power
+    band_power = np.maximum(power_sums[..., upper_bins] - power_sums[..., lower_bins], 0.0)
+    band_counts = value_counts[..., upper_bins] - value_counts[..., lower_bins]
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+
+        if reduction == "smooth":
+            band_power = np.where(band_counts > 0, band_power / band_counts, np.nan)
+
+        else:
+            band_power = np.where(band_counts == upper_bins - lower_bins, band_power, np.nan)
+
+        if decibel_factor is None:
+            return reduced_x, np.sqrt(band_power)
+
+        return reduced_x, (decibel_factor / 2) * np.log10(band_power)
+
+
+#class for a graph reduced to fractional-octave bands, smoothed or summed into band energies
+#takes in any graph object, e.g. Graph, Graph_decibel, Graph_average or Graph_hxml, as input parameter
+#has the same data and label attributes as the other graph classes so it can be plotted with graph_plotter and exported with HXMLGenerator
+class Graph_octave:
+
+    def __init__(self, graph, fraction = 3, reduction = "smooth"):
+        '''fraction is the bands per octave, e.g. 3 for 1/3-octave and 12 for 1/12-octave bands. 
+        reduction is one of OCTAVE_REDUCTIONS, see reduce_to_octave_bands'''
+
+        #store attributes
+        self.graph = graph
+        self.fraction = fraction
+        self.reduction = reduction
+
+        #decibel graphs stay decibel graphs when reduced
+        self.decibel_factor = getattr(graph, "decibel_factor", None)
+
+        #attributes for graph data, on the frequencies of the graph when smoothed and on the band centre frequencies for band energies
+        self.x_data, self.y_data = reduce_to_octave_bands(graph.y_data, graph.x_data, fraction, reduction, self.decibel_factor)
+
+        #attribute for minimum x value in the graph
+        self.x_min = self.x_data[0] if reduction == "energy" and len(self.x_data) else graph.x_min
+
+        band_name = "Octave" if fraction == 1 else f"1/{fraction} Octave"
+        reduction_name = "Smoothed" if reduction == "smooth" else "Band Energy"
+
+        #attribute for remarks, keeping the remarks of the graph e.g. anomalous points excluded from an average
+        #band energies note the bands kept, bands only partly inside the data are left out
+        self.reduction_remark = f"{band_name} {reduction_name.lower()}. "
+
+        if reduction == "energy":
+            band_range = f"{self.x_data[0]:g} Hz to {self.x_data[-1]:g} Hz" if len(self.x_data) else "none"
+            self.reduction_remark += f"Bands fully inside the data: {band_range}. "
+        self.remarks = getattr(graph, "remarks", "") + self.reduction_remark
+
+        #attributes for graph name, the reduction is added to the end of the plot title so the title keeps its parts
+        #device averages have a device name instead of a scan name
+        self.scan_name = str(getattr(graph, "scan_name", getattr(graph, "device_name", "")))
+        self.channel_signal = str(graph.channel_signal)
+        self.scan_point_no = getattr(graph, "scan_point_no", None)
+        self.plot_title = f"{graph.plot_title} ({band_name} {reduction_name})"
+
+        #attributes for x-axis
+        self.x_label = str(graph.x_label)
+        self.x_label_unit = str(graph.x_label_unit)
+        self.x_label_with_unit = self.x_label + " [" + self.x_label_unit + "]"
+
+        #attributes for y-axis
+        self.y_label = str(graph.y_label)
+        self.y_label_unit = str(graph.y_label_unit)
+        self.y_label_with_unit = self.y_label + " [" + self.y_label_unit + "]"
\ No newline at end of file
@@ -4,30 +4,71 @@ import numpy as np
 import os
 from tkinter import filedialog, messagebox, Tk
 from data_tools import get_short_names, get_short_chan_signal
-from measurement_plane import Measurement_Plane
+from measurement_plane import Measurement_Plane, load_measurement_planes, DEFAULT_LOAD_WORKERS
 from scan_point_graph import Graph_perc_change
+from line_decimation import plot_decimated
+from graph_renderer import create_figure, save_figure
 from hxml_writer import HXMLGenerator
+from hxml_reader import HXMLReader
 
 
 class Compare_Surface_Average:
 
-    def __init__(self, list_filenames):
+    def __init__(self, list_filenames, max_workers = DEFAULT_LOAD_WORKERS, progress_callback = None):
         self.list_filenames = list_filenames
         
         #create a list of Measurement_Plane objects, one object for each scan file
-        self.measurement_list = [Measurement_Plane(f"{filename}") for filename in list_filenames]
+        #files are loaded in parallel but the list keeps the order of list_filenames
+        self.measurement_list = load_measurement_planes([f"{filename}" for filename in list_filenames], max_workers = max_workers, progress_callback = progress_callback)
         self.average_list = []
         self.remarks_list = []
         self.graph_names = []
         self.short_names = []
         self.short_chan_sig = None
 
+        #list of averages read back from HXML exports by load_saved_averages, compared as they are
+        self.saved_averages = []
+
         
+    def load_saved_averages(self, hxml_filename, curve_names=None):
+        '''Method to add averages saved in an HXML export to the comparison without the source UFF files. 
+        curve_names limits the averages added to curves with those names, by default every curve in the file is added. 
+        Returns the list of averages added'''
+
+        saved_averages = HXMLReader(hxml_filename).read_graphs()
+
+        if curve_names is not None:
+            saved_averages = [graph for graph in saved_averages if graph.plot_title in curve_names]
+
+        self.saved_averages.extend(saved_averages)
+
+        return saved_averages
+
+
+    def get_saved_averages(self, channel_signal):
+        '''Method to return the averages loaded by load_saved_averages that are of channel_signal, e.g. "Vib  Velocity [dB]". 
+        Raises ValueError if averages were loaded but none of them are of channel_signal'''
+
+        matching = [graph for graph in self.saved_averages if graph.channel_signal == channel_signal]
+
+        if self.saved_averages and not matching:
+            saved_channels = sorted({graph.channel_signal for graph in self.saved_averages})
+            raise ValueError(f"None of the saved averages are of {channel_signal}, they are of {', '.join(saved_channels)}")
+
+        return matching
+
+
     def initialize_from_files(self, channel_signal_type=None, is_GUI=False):
         if not is_GUI:
             #create a list of Graph_average objects, one for each surface average
             self.average_list = [measurement.get_average(channel_signal_type) for measurement in self.measurement_list]
 
+        #followed by the averages loaded from HXML exports of the same channel signal, only added once
+        surface_averages = [graph for graph in self.average_list if graph not in self.saved_averages]
+
+        if surface_averages:
+            self.average_list = surface_averages + self.get_saved_averages(surface_averages[0].channel_signal)
+
         #create a list of anomalous points remarks, one for each surface average
         self.remarks_list = [graph.remarks for graph in self.average_list]
 
@@ -98,18 +139,22 @@ class Compare_Surface_Average:
         #return just file name without folder directory and extension
         return file_name_without_extension
 
-    def create_combined_average_figure(self):
+    def create_combined_average_figure(self, figure=None):
         """
         Create and return a combined matplotlib figure that plots all averages in self.average_list.
+        The plot is drawn on figure, e.g. from graph_renderer.create_figure to save it, by default on a new pyplot figure.
         """
         tick_locations = [100, 200, 500, 1000, 2000, 5000, 10000]
 
-        fig, ax = plt.subplots()
+        if figure is None:
+            fig, ax = plt.subplots()
+        else:
+            fig, ax = figure, figure.add_subplot()
 
         # Plot each surface average line
         for surface_average in self.average_list:
-            ax.plot(surface_average.x_data, surface_average.y_data,
-                    label=f"{(surface_average.scan_name)[:-4]} Average")
+            plot_decimated(ax, surface_average.x_data, surface_average.y_data,
+                           label=f"{(surface_average.scan_name)[:-4]} Average")
 
         ax.set_xscale("log", base=2)
 
@@ -163,11 +208,11 @@ class Compare_Surface_Average:
             else:
                 print("Please provide a filename to save as")
 
-        # Generate the figure
-        fig = self.create_combined_average_figure()
+        # Generate the figure on the Agg canvas, without pyplot
+        fig = self.create_combined_average_figure(create_figure())
 
         # Save figure as PNG
-        fig.savefig(user_photo_filename, dpi=300, bbox_inches="tight")
+        save_figure(fig, user_photo_filename)
 
     def compare_surface_average_plot(self):
 
@@ -177,6 +222,7 @@ class Compare_Surface_Average:
         self.gui_export()
 
         #display the graph
+        self.create_combined_average_figure()
         plt.show()
 
 
@@ -272,39 +318,9 @@ class Compare_Surface_Average:
                 valid_filename = False
 
 
-        #list containing locations to place ticks
-        tick_locations = [100, 200, 500, 1000, 2000, 5000, 10000]
-
-        fig, ax = plt.subplots()
-
-        line_list = [ax.plot(surface_average.x_data, surface_average.y_data, label = f"{(surface_average.scan_name)[:-4]} Average") for surface_average in self.average_list]
-
-        plt.xscale("log", base = 2)
-
-        ax.xaxis.set_major_locator(tick.FixedLocator(tick_locations))
-
-        ax.xaxis.set_major_formatter(tick.FuncFormatter(lambda x, _: f'{int(x)}'))
-
-        plt.xlabel(self.average_list[0].x_label_with_unit)
-
-        plt.ylabel(self.average_list[0].y_label_with_unit)
-
-        plt.title(f"{self.average_list[0].channel_signal} Surface Average Comparison")
-
-        plt.xlim([self.average_list[0].x_min, 10000])
-
-        #display major grid
-        plt.grid(which="major", color="dimgrey", linewidth=0.5)
-
-        #display minor grid
-        plt.minorticks_on()
-        plt.grid(which="minor", linestyle=":", color="lightgrey", linewidth=1)
-
-        #display a legend for the plot
-        plt.legend(loc = "best")        #change loc to a fixed location eg lower right for faster speed
-
-        #save the plot as a png image, adapted from Kuan Hsien code line for savefig
-        plt.savefig(user_photo_filename, dpi=300, bbox_inches="tight")
+        #save the plot as a png image, drawn on an Agg figure instead of pyplot
+        save_figure(self.create_combined_average_figure(create_figure()), user_photo_filename)
 
         #display the plot
+        self.create_combined_average_figure()
         plt.show()
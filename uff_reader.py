@@ -0,0 +1,332 @@
+import numpy as np
+
+
+#a dataset delimiter is a line holding only -1 right aligned in the first 6 columns
+DELIMITER = b"    -1"
+
+
+#class for reading a UFF file exported from the vibrometer
+#drop-in replacement for the parts of pyuff.UFF used by Measurement_Plane
+class UFF_Reader:
+
+    def __init__(self, filepath):
+        '''Read through the ASCII UFF file once and split it into dataset blocks.
+        Only the dataset types used by the analyser (151, 164, 2411, 82, 58) are parsed,
+        other dataset types are kept as a dictionary holding only their type'''
+
+        self.filepath = filepath
+
+        #read the whole file as bytes in one go
+        with open(self.filepath, "rb") as uff_file:
+            self.buffer = uff_file.read()
+
+        #list of (set type, start of block body, end of block body) for every dataset in the file
+        self.blocks = self._find_blocks()
+
+        #array of set types in the order they appear in the file, same as pyuff get_set_types()
+        self.set_types = np.array([set_type for set_type, _, _ in self.blocks])
+
+        #parsed datasets, only filled when read_sets is called
+        self.data = None
+
+
+    def _find_blocks(self):
+
+        '''Return a list of (set type, body start, body end) for every dataset in the buffer'''
+
+        blocks = []
+
+        #positions of all delimiter lines, datasets lie between consecutive pairs of delimiters
+        delimiters = self._find_delimiters()
+
+        for index in range(0, len(delimiters) - 1, 2):
+
+            #block starts on the line after the opening delimiter
+            start = self.buffer.find(b"\n", delimiters[index]) + 1
+            end = delimiters[index + 1]
+
+            #first line of the block is the set type, e.g. "    58" or "    58b"
+            line_end = self.buffer.find(b"\n", start, end)
+            set_type_line = self.buffer[start:line_end].strip()
+
+            #binary dataset 58b is not supported by this reader
+            if set_type_line.lower().endswith(b"b"):
+                raise ValueError(f"Binary dataset {set_type_line.decode()} is not supported by UFF_Reader")
+
+            blocks.append((int(set_type_line), line_end + 1, end))
+
+        return blocks
+
+
+    def _find_delimiters(self):
+
+        '''Return the start positions of all delimiter lines in the buffer.
+        Uses bytes.find instead of a line by line scan so that large files are searched at C speed'''
+
+        delimiters = []
+        position = self.buffer.find(DELIMITER)
+
+        while position != -1:
+
+            line_end = position + len(DELIMITER)
+
+            #delimiter must take up a whole line, allowing for unix and windows line endings
+            at_line_start = position == 0 or self.buffer[position - 1:position] == b"\n"
+            at_line_end = self.buffer[line_end:line_end + 1] in (b"\n", b"\r", b"")
+
+            if at_line_start and at_line_end:
+                delimiters.append(position)
+
+            position = self.buffer.find(DELIMITER, line_end)
+
+        return delimiters
+
+
+    def get_set_types(self):
+
+        #return array of set types in the file
+        return self.set_types
+
+
+    def read_sets(self):
+
+        '''Parse all datasets and return a list of dictionaries
+        with the same keys pyuff uses for the fields read by the analyser'''
+
+        if self.data is None:
+
+            self.data = [self._read_set(set_type, start, end) for set_type, start, end in self.blocks]
+
+        return self.data
+
+
+    def _read_set(self, set_type, start, end):
+
+        #choose the parser for the set type
+        match set_type:
+
+            case 151:
+                return self._extract_151(start, end)
+
+            case 164:
+                return self._extract_164(start, end)
+
+            case 2411:
+                return self._extract_2411(start, end)
+
+            case 82:
+                return self._extract_82(start, end)
+
+            case 58:
+                return self._extract_58(start, end)
+
+            case _:
+                #dataset is not used by the analyser, keep only its type
+                return {"type": set_type}
+
+
+    def _header_lines(self, start, end, number_of_lines):
+
+        '''Return the first number_of_lines lines of the block decoded as strings without line endings,
+        as well as the position in the buffer where the rest of the block starts'''
+
+        lines = []
+        position = start
+
+        for _ in range(number_of_lines):
+
+            line_end = self.buffer.find(b"\n", position, end)
+
+            #block shorter than expected, take the rest of the block as the last line
+            if line_end == -1:
+                line_end = end
+
+            lines.append(self.buffer[position:line_end].decode("utf-8", errors="replace").rstrip("\r"))
+            position = line_end + 1
+
+        return lines, min(position, end)
+
+
+    def _values(self, start, end):
+
+        '''Parse all whitespace separated numbers in the buffer between start and end into a float array
+        in a single vectorised call, without creating a Python object per value'''
+
+        body = self.buffer[start:end]
+
+        #support D notation for exponents written by some exporters
+        if b"D" in body or b"d" in body:
+            body = body.replace(b"D", b"E").replace(b"d", b"E")
+
+        return np.fromstring(body, dtype=float, sep=" ")
+
+
+    def _extract_151(self, start, end):
+
+        '''Header dataset with file and database information'''
+
+        lines, _ = self._header_lines(start, end, 7)
+
+        return {
+            "type": 151,
+            "model_name": lines[0].strip(),
+            "description": lines[1].strip(),
+            "db_app": lines[2].strip(),
+            "date_db_created": lines[3][0:10].strip(),
+            "time_db_created": lines[3][10:20].strip(),
+            "date_db_saved": lines[4][0:10].strip(),
+            "time_db_saved": lines[4][10:20].strip(),
+            "program": lines[5].strip(),
+            "date_file_written": lines[6][0:10].strip(),
+            "time_file_written": lines[6][10:20].strip(),
+        }
+
+
+    def _extract_164(self, start, end):
+
+        '''Units dataset'''
+
+        lines, position = self._header_lines(start, end, 1)
+
+        #unit conversion factors follow the first line
+        factors = self._values(position, end)
+
+        return {
+            "type": 164,
+            "units_code": int(lines[0][0:10]),
+            "units_description": lines[0][10:30].strip(),
+            "temp_mode": int(lines[0][30:40]) if lines[0][30:40].strip() else 0,
+            "length": factors[0],
+            "force": factors[1],
+            "temp": factors[2],
+            "temp_offset": factors[3],
+        }
+
+
+    def _extract_2411(self, start, end):
+
+        '''Node coordinates dataset, each node is 4 integers followed by 3 coordinates'''
+
+        values = self._values(start, end).reshape(-1, 7)
+
+        return {
+            "type": 2411,
+            "node_nums": values[:, 0].copy(),
+            "def_cs": values[:, 1].copy(),
+            "disp_cs": values[:, 2].copy(),
+            "color": values[:, 3].copy(),
+            "x": values[:, 4].copy(),
+            "y": values[:, 5].copy(),
+            "z": values[:, 6].copy(),
+        }
+
+
+    def _extract_82(self, start, end):
+
+        '''Trace line dataset'''
+
+        lines, position = self._header_lines(start, end, 2)
+
+        return {
+            "type": 82,
+            "trace_num": int(lines[0][0:10]),
+            "n_nodes": int(lines[0][10:20]),
+            "color": int(lines[0][20:30]),
+            "id": lines[1].strip(),
+            "nodes": self._values(position, end),
+        }
+
+
+    def _extract_58(self, start, end):
+
+        '''Function at nodal DOF dataset, 11 header lines followed by the ordinate data'''
+
+        lines, position = self._header_lines(start, end, 11)
+
+        dataset = {"type": 58, "binary": 0}
+
+        #id lines
+        dataset["id1"] = lines[0].strip()
+        dataset["id2"] = lines[1].strip()
+        dataset["id3"] = lines[2].strip()
+        dataset["id4"] = lines[3].strip()
+        dataset["id5"] = lines[4].strip()
+
+        #function and node information, fixed width fields (I5, I10, I5, I10, 1X A10, I10, I4, 1X A10, I10, I4)
+        line = lines[5]
+        dataset["func_type"] = int(line[0:5])
+        dataset["func_id"] = int(line[5:15])
+        dataset["ver_num"] = int(line[15:20])
+        dataset["load_case_id"] = int(line[20:30])
+        dataset["rsp_ent_name"] = line[30:41].strip()
+        dataset["rsp_node"] = int(line[41:51])
+        dataset["rsp_dir"] = int(line[51:55])
+        dataset["ref_ent_name"] = line[55:66].strip()
+        dataset["ref_node"] = int(line[66:76])
+        dataset["ref_dir"] = int(line[76:80])
+
+        #data form
+        fields = lines[6].split()
+        dataset["ord_data_type"] = int(fields[0])
+        dataset["num_pts"] = int(fields[1])
+        dataset["abscissa_spacing"] = int(fields[2])
+        dataset["abscissa_min"] = float(fields[3])
+        dataset["abscissa_inc"] = float(fields[4])
+        dataset["z_axis_value"] = float(fields[5])
+
+        #axis characteristics, fixed width fields (I10, 3I5, 1X A20, 1X A20)
+        for line, axis in zip(lines[7:11], ["abscissa", "ordinate", "orddenom", "z_axis"]):
+            dataset[f"{axis}_spec_data_type"] = int(line[0:10])
+            dataset[f"{axis}_len_unit_exp"] = int(line[10:15])
+            dataset[f"{axis}_force_unit_exp"] = int(line[15:20])
+            dataset[f"{axis}_temp_unit_exp"] = int(line[20:25])
+            dataset[f"{axis}_axis_lab"] = line[25:46].strip()
+            dataset[f"{axis}_axis_units_lab"] = line[46:67].strip()
+
+        #ordinate data, every field in the E13.5 and E20.12 formats is preceded by at least one space
+        values = self._values(position, end)
+
+        #ordinate data type 5 and 6 are complex, 2 and 4 are real
+        is_complex = dataset["ord_data_type"] in (5, 6)
+
+        #abscissa spacing 1 is even spacing, 0 is uneven spacing with x values stored in the data
+        if dataset["abscissa_spacing"] == 1:
+
+            if is_complex:
+                values = values.reshape(-1, 2)
+                dataset["data"] = values[:, 0] + 1j * values[:, 1]
+
+            else:
+                dataset["data"] = values
+
+            dataset["x"] = dataset["abscissa_min"] + np.arange(len(dataset["data"])) * dataset["abscissa_inc"]
+
+        else:
+
+            if is_complex:
+                values = values.reshape(-1, 3)
+                dataset["data"] = values[:, 1] + 1j * values[:, 2]
+
+            else:
+                values = values.reshape(-1, 2)
+                dataset["data"] = values[:, 1].copy()
+
+            dataset["x"] = values[:, 0].copy()
+
+        return dataset
+
+
+def read_uff_sets(filepath):
+
+    '''Return (set types, datasets) of a UFF file.
+    Kept at module level and free of plotting imports so that it is cheap to run in a worker process'''
+
+    try:
+        reader = UFF_Reader(filepath)
+
+    #fall back to pyuff for files this reader does not support e.g. binary dataset 58b
+    except ValueError:
+        import pyuff
+        reader = pyuff.UFF(filepath)
+
+    return reader.get_set_types(), reader.read_sets()